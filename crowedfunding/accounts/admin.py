@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User
+from .models import User, AccountDeletionJob, AccountToken
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('email', 'first_name', 'last_name', 'mobile_phone', 'is_active', 'is_staff')
@@ -22,4 +22,19 @@ class CustomUserAdmin(UserAdmin):
         }),
     )
 
-admin.site.register(User, CustomUserAdmin)
\ No newline at end of file
+admin.site.register(User, CustomUserAdmin)
+
+@admin.register(AccountDeletionJob)
+class AccountDeletionJobAdmin(admin.ModelAdmin):
+    list_display = ('email', 'status', 'stage', 'processed', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('email',)
+    readonly_fields = ('user', 'email', 'status', 'stage', 'processed', 'error', 'created_at', 'updated_at', 'finished_at')
+
+@admin.register(AccountToken)
+class AccountTokenAdmin(admin.ModelAdmin):
+    # Only the hash is stored, so tokens can be inspected and revoked but never recovered
+    list_display = ('user', 'purpose', 'created_at', 'expires_at')
+    list_filter = ('purpose',)
+    search_fields = ('user__email',)
+    readonly_fields = ('user', 'purpose', 'token_hash', 'created_at', 'expires_at')
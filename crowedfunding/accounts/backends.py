@@ -0,0 +1,60 @@
+"""
+Email login backend.
+
+Looks the account up with ``User.objects.by_email`` (the LOWER(email) unique
+index) instead of ``ModelBackend``'s username lookup.  Emails that match no
+account are remembered in the cache for ``LOGIN_NEGATIVE_CACHE_SECONDS`` so
+repeated guesses against unknown addresses (credential stuffing) skip the
+database; a dummy hash is still computed so both paths take the same time.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+
+from .models import User
+
+_dummy_password = None
+
+
+def _missing_key(email):
+    return 'login:missing:' + hashlib.sha256(email.lower().encode()).hexdigest()
+
+
+def forget_missing(email):
+    """Drop the negative-lookup entry for ``email`` (called when an account gets that address)."""
+    if email:
+        cache.delete(_missing_key(email))
+
+
+def _hash_dummy_password(password):
+    # Same cost as a real check_password, so unknown emails cannot be told apart by timing
+    global _dummy_password
+    if _dummy_password is None:
+        _dummy_password = make_password(None)
+    User(password=_dummy_password).check_password(password)
+
+
+class EmailBackend(ModelBackend):
+    def authenticate(self, request, username=None, password=None, email=None, **kwargs):
+        # Plain usernames (the admin login form) are left to ModelBackend
+        email = email or (username if username and '@' in username else None)
+        if not email or password is None:
+            return None
+        ttl = getattr(settings, 'LOGIN_NEGATIVE_CACHE_SECONDS', 30)
+        if ttl and cache.get(_missing_key(email)):
+            _hash_dummy_password(password)
+            return None
+        user = User.objects.by_email(email).first()
+        if user is None:
+            if ttl:
+                cache.set(_missing_key(email), True, ttl)
+            _hash_dummy_password(password)
+            return None
+        # Inactive accounts are returned too so user_login can tell them to activate;
+        # get_user() still refuses them, so they never hold a session.
+        if user.check_password(password):
+            return user
+        return None
@@ -0,0 +1,274 @@
+"""
+Chunked account deletion.
+
+``delete_account`` only deactivates the user and queues an
+``AccountDeletionJob``; ``process_account_deletions`` runs the job here.
+Instead of ``user.delete()`` (whose collector walks every related row in
+Python and holds locks on the hot tables for the whole cascade), each stage
+issues bulk DELETE/UPDATE statements over at most ``batch_size`` rows per
+transaction, recording progress on the job so an interrupted run resumes
+where it stopped.
+
+Stages:
+  projects   the user's own campaigns and everything hanging off them; other
+             donors' leaderboard and profile totals are reduced accordingly
+  ratings    deleted
+  reports    deleted
+  comments   anonymized (reassigned to the "deleted user" account) so reply
+             threads stay intact
+  donations  anonymized, so project totals do not change; the user's
+             leaderboard rows are merged into the "deleted user" rows
+  account    remaining per-user rows and finally the user
+
+Rows already moved to the archive tables by ``archive_campaigns`` get the
+same treatment in each stage.
+
+Media is never deleted here: uploads are content-addressed and may be
+shared with other rows, so files left unreferenced are reclaimed by
+``manage.py gc_media``.
+"""
+from collections import Counter
+
+from django.db import router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import User, UserStats, AccountDeletionJob, AccountToken
+
+STAGES = ['projects', 'ratings', 'reports', 'comments', 'donations', 'account']
+
+GHOST_USERNAME = 'deleted-user'
+
+
+def get_ghost_user():
+    """Placeholder account that anonymized comments and donations are reassigned to."""
+    ghost, _ = User.objects.get_or_create(
+        username=GHOST_USERNAME,
+        defaults={
+            'email': 'deleted-user@invalid',
+            'first_name': 'Deleted',
+            'last_name': 'user',
+            # Outside the Egyptian mobile format, so no real user can claim it
+            'mobile_phone': 'deleted',
+            'is_active': False,
+        },
+    )
+    return ghost
+
+
+def enqueue(user):
+    """Deactivate ``user`` immediately and queue the chunked deletion."""
+    User.objects.filter(pk=user.pk).update(is_active=False)
+    # An outstanding activation link must not revive an account queued for deletion
+    AccountToken.objects.filter(user=user).delete()
+    job, _ = AccountDeletionJob.objects.get_or_create(
+        user=user, status__in=['pending', 'running'],
+        defaults={'email': user.email},
+    )
+    return job
+
+
+def batches(queryset, size):
+    """Yield successive lists of primary keys until ``queryset`` stops matching rows."""
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:size])
+        if not ids:
+            return
+        yield ids
+
+
+def raw_delete(model, ids):
+    # Single DELETE ... WHERE id IN (...): no collector, no per-row signals.
+    # Callers adjust the denormalized totals themselves.
+    return model.objects.filter(pk__in=ids)._raw_delete(router.db_for_write(model))
+
+
+class DeletionRunner:
+    def __init__(self, job, batch_size=500, progress=None):
+        self.job = job
+        self.batch_size = batch_size
+        self.progress = progress or (lambda job: None)
+        self.user_id = job.user_id
+
+    def advance(self, rows):
+        AccountDeletionJob.objects.filter(pk=self.job.pk).update(processed=F('processed') + rows, updated_at=timezone.now())
+        self.job.processed += rows
+        self.progress(self.job)
+
+    def run(self):
+        job = self.job
+        if job.user_id is None:
+            # Account already removed by an earlier run
+            AccountDeletionJob.objects.filter(pk=job.pk).update(status='done', finished_at=timezone.now())
+            return
+        AccountDeletionJob.objects.filter(pk=job.pk).update(status='running')
+        start = STAGES.index(job.stage) if job.stage in STAGES else 0
+        for stage in STAGES[start:]:
+            job.stage = stage
+            AccountDeletionJob.objects.filter(pk=job.pk).update(stage=stage)
+            self.progress(job)
+            getattr(self, f'stage_{stage}')()
+        AccountDeletionJob.objects.filter(pk=job.pk).update(status='done', finished_at=timezone.now())
+        job.status = 'done'
+        self.progress(job)
+
+    # -- stages -------------------------------------------------------------
+
+    def stage_projects(self):
+        from projects.models import Project
+
+        project_ids = list(Project.objects.filter(creator_id=self.user_id).order_by('pk').values_list('pk', flat=True))
+        for project_id in project_ids:
+            self.delete_project(project_id)
+
+    def delete_project(self, project_id):
+        from projects import categories
+        from projects.models import (Project, ProjectPicture, Donation, DonorTotal, DonorGlobalTotal,
+                                     Comment, Rating, Report, ArchivedDonation, ArchivedComment, ArchivedRating,
+                                     ProjectRecommendation, UserRecommendation)
+
+        # Backers lose this project from their leaderboard and profile totals
+        for ids in batches(DonorTotal.objects.filter(project_id=project_id), self.batch_size):
+            with transaction.atomic():
+                for row in DonorTotal.objects.filter(pk__in=ids):
+                    DonorGlobalTotal.objects.filter(user_id=row.user_id).update(
+                        amount=F('amount') - row.amount, count=F('count') - row.count)
+                    UserStats.bump(row.user_id, create=False, total_donated=-row.amount,
+                                   projects_backed=-int(row.count > 0))
+                raw_delete(DonorTotal, ids)
+            self.advance(len(ids))
+
+        for queryset in (
+            Report.objects.filter(comment__project_id=project_id),
+            Report.objects.filter(project_id=project_id),
+            Rating.objects.filter(project_id=project_id),
+            Comment.objects.filter(project_id=project_id, parent__isnull=False),
+            Comment.objects.filter(project_id=project_id),
+            Donation.objects.filter(project_id=project_id),
+            Project.tags.through.objects.filter(project_id=project_id),
+            ProjectRecommendation.objects.filter(project_id=project_id),
+            ProjectRecommendation.objects.filter(recommended_id=project_id),
+            UserRecommendation.objects.filter(project_id=project_id),
+        ):
+            for ids in batches(queryset, self.batch_size):
+                with transaction.atomic():
+                    raw_delete(queryset.model, ids)
+                self.advance(len(ids))
+
+        for ids in batches(ProjectPicture.objects.filter(project_id=project_id), self.batch_size):
+            with transaction.atomic():
+                raw_delete(ProjectPicture, ids)
+            self.advance(len(ids))
+
+        for model in (ArchivedRating, ArchivedComment, ArchivedDonation):
+            self.delete_all(model.objects.filter(project_id=project_id))
+
+        with transaction.atomic():
+            # raw_delete skips the signal that keeps the category's active-project counter
+            category_id = (Project.objects.filter(pk=project_id, counted_active=True)
+                           .values_list('category_id', flat=True).first())
+            categories.adjust({category_id: -1})
+            raw_delete(Project, [project_id])
+        self.advance(1)
+
+    def stage_ratings(self):
+        from projects.models import Project, Rating, ArchivedRating
+        queryset = Rating.objects.filter(user_id=self.user_id)
+        for ids in batches(queryset, self.batch_size):
+            with transaction.atomic():
+                self.touch_projects(Rating, ids)
+                raw_delete(Rating, ids)
+            self.advance(len(ids))
+
+        # Archived ratings are also part of their project's archived rating totals
+        archived = ArchivedRating.objects.filter(user_id=self.user_id)
+        for ids in batches(archived, self.batch_size):
+            with transaction.atomic(), transaction.atomic(using=router.db_for_write(ArchivedRating)):
+                counts, sums = Counter(), Counter()
+                for project_id, value in ArchivedRating.objects.filter(pk__in=ids).values_list('project_id', 'value'):
+                    counts[project_id] += 1
+                    sums[project_id] += value
+                for project_id, count in counts.items():
+                    Project.objects.filter(pk=project_id).update(
+                        archived_rating_count=F('archived_rating_count') - count,
+                        archived_rating_sum=F('archived_rating_sum') - sums[project_id],
+                        last_modified=timezone.now(),
+                    )
+                raw_delete(ArchivedRating, ids)
+            self.advance(len(ids))
+
+    def stage_reports(self):
+        from projects.models import Report
+        self.delete_all(Report.objects.filter(user_id=self.user_id))
+
+    def stage_comments(self):
+        from projects.models import Comment, ArchivedComment
+        ghost = get_ghost_user()
+        for ids in batches(Comment.objects.filter(user_id=self.user_id), self.batch_size):
+            with transaction.atomic():
+                Comment.objects.filter(pk__in=ids).update(user=ghost)
+                self.touch_projects(Comment, ids)
+            self.advance(len(ids))
+        self.anonymize_archived(ArchivedComment, ghost)
+
+    def stage_donations(self):
+        from projects.models import Donation, DonorTotal, DonorGlobalTotal, ArchivedDonation, _upsert_increment
+        ghost = get_ghost_user()
+        for ids in batches(Donation.objects.filter(user_id=self.user_id), self.batch_size):
+            with transaction.atomic():
+                Donation.objects.filter(pk__in=ids).update(user=ghost)
+                self.touch_projects(Donation, ids)
+            self.advance(len(ids))
+        self.anonymize_archived(ArchivedDonation, ghost)
+
+        # Project totals are unchanged; the leaderboards move to the placeholder account
+        for ids in batches(DonorTotal.objects.filter(user_id=self.user_id), self.batch_size):
+            with transaction.atomic():
+                for row in DonorTotal.objects.filter(pk__in=ids):
+                    first = _upsert_increment(DonorTotal, {'user_id': ghost.pk, 'project_id': row.project_id},
+                                              row.amount, row.count)
+                    UserStats.bump(ghost.pk, total_donated=row.amount, projects_backed=int(first))
+                raw_delete(DonorTotal, ids)
+            self.advance(len(ids))
+        with transaction.atomic():
+            total = DonorGlobalTotal.objects.filter(user_id=self.user_id).first()
+            if total is not None:
+                _upsert_increment(DonorGlobalTotal, {'user_id': ghost.pk}, total.amount, total.count)
+                raw_delete(DonorGlobalTotal, [self.user_id])
+
+    def stage_account(self):
+        user = User.objects.get(pk=self.user_id)
+        with transaction.atomic():
+            UserStats.objects.filter(user_id=self.user_id).delete()
+            # Everything heavy is gone; the collector only finds a handful of rows now
+            user.delete()
+        self.advance(1)
+
+    def touch_projects(self, model, ids):
+        # The bulk statements skip the signal handlers that normally bump Project.last_modified
+        from projects.models import Project
+        Project.objects.filter(pk__in=model.objects.filter(pk__in=ids).values('project_id')).touch()
+
+    def delete_all(self, queryset):
+        for ids in batches(queryset, self.batch_size):
+            with transaction.atomic(using=router.db_for_write(queryset.model)):
+                raw_delete(queryset.model, ids)
+            self.advance(len(ids))
+
+    def anonymize_archived(self, model, ghost):
+        # The archive may be a separate database, so the projects are touched by id
+        from projects.models import Project
+        for ids in batches(model.objects.filter(user_id=self.user_id), self.batch_size):
+            project_ids = set(model.objects.filter(pk__in=ids).values_list('project_id', flat=True))
+            with transaction.atomic(using=router.db_for_write(model)):
+                model.objects.filter(pk__in=ids).update(user_id=ghost.pk)
+            Project.objects.filter(pk__in=project_ids).touch()
+            self.advance(len(ids))
+
+
+def process(job, batch_size=500, progress=None):
+    try:
+        DeletionRunner(job, batch_size=batch_size, progress=progress).run()
+    except Exception as exc:
+        AccountDeletionJob.objects.filter(pk=job.pk).update(status='failed', error=repr(exc))
+        raise
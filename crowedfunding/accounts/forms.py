@@ -22,6 +22,12 @@ class UserRegistrationForm(UserCreationForm):
             raise forms.ValidationError("Username already exists.")
         return cleaned_data
 
+    def clean_email(self):
+        email = self.cleaned_data.get('email')
+        if email and User.objects.by_email(email).exists():
+            raise forms.ValidationError("An account with this email already exists.")
+        return email
+
 class UserLoginForm(forms.Form):
     email = forms.EmailField()
     password = forms.CharField(widget=forms.PasswordInput)
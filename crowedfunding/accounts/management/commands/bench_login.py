@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+import time
+import uuid
+from accounts.models import User
+
+PASSWORD = 'Bench-login-1'
+
+
+class Command(BaseCommand):
+    help = "Benchmark POSTs to the login view (real password hasher) for valid, wrong-password and unknown-email attempts, with and without the negative-lookup cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attempts', type=int, default=40, help='Login attempts per scenario')
+        parser.add_argument('--users', type=int, default=20, help='Temporary accounts created for the run (rolled back afterwards)')
+
+    def handle(self, *args, **options):
+        attempts, users = max(1, options['attempts']), min(max(1, options['users']), 9999)
+        rows = []
+        with transaction.atomic():
+            tag = uuid.uuid4().hex[:8]
+            # One real hash shared by every bench account: creating them stays cheap, checking them does not
+            password = make_password(PASSWORD)
+            accounts = User.objects.bulk_create(
+                User(username=f'bench-{tag}-{i}', email=f'Bench.{tag}.{i}@Example.com', password=password,
+                     # Outside the Egyptian format, so it cannot collide with a real number
+                     mobile_phone=f'b{tag[:6]}{i:04d}')
+                for i in range(users)
+            )
+            # Stuffing lists repeat addresses, so unknown emails are drawn from a small pool
+            unknown = [f'nobody.{tag}.{i}@example.com' for i in range(max(1, users // 4))]
+            scenarios = [
+                ('valid', lambda i: (accounts[i % users].email.lower(), PASSWORD), 30),
+                ('wrong password', lambda i: (accounts[i % users].email, 'wrong'), 30),
+                ('unknown, no cache', lambda i: (unknown[i % len(unknown)], 'guess'), 0),
+                ('unknown, cached', lambda i: (unknown[i % len(unknown)], 'guess'), 30),
+            ]
+            for label, credentials, ttl in scenarios:
+                rows.append((label,) + self.run(credentials, attempts, ttl))
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'scenario':<18} | {'logins/s':>8} | {'p95 ms':>7} | {'queries/attempt':>15}")
+        for label, rate, p95, queries in rows:
+            self.stdout.write(f"{label:<18} | {rate:>8.1f} | {p95:>7.1f} | {queries:>15.2f}")
+
+    def run(self, credentials, attempts, ttl):
+        latencies = []
+        with override_settings(ALLOWED_HOSTS=['testserver'], LOGIN_NEGATIVE_CACHE_SECONDS=ttl), \
+                CaptureQueriesContext(connection) as queries:
+            for i in range(attempts):
+                email, password = credentials(i)
+                client = Client()
+                started = time.perf_counter()
+                response = client.post('/accounts/login/', {'email': email, 'password': password})
+                latencies.append(time.perf_counter() - started)
+                if response.status_code not in (200, 302):
+                    raise CommandError(f'login returned {response.status_code}')
+        latencies.sort()
+        return (
+            attempts / sum(latencies),
+            latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000,
+            len(queries.captured_queries) / attempts,
+        )
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from projects.models import Project
+from accounts.models import User
+
+# (label, SESSION_ENGINE suffix, MESSAGE_STORAGE)
+TIERS = [
+    ('db + fallback', 'db', 'django.contrib.messages.storage.fallback.FallbackStorage'),
+    ('cached_db + cookie', 'cached_db', 'django.contrib.messages.storage.cookie.CookieStorage'),
+    ('signed_cookies + cookie', 'signed_cookies', 'django.contrib.messages.storage.cookie.CookieStorage'),
+]
+WRITES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+PASSWORD = 'Bench-session-1'
+
+
+class Command(BaseCommand):
+    help = "Count SQL writes and session-table queries per request for anonymous and logged-in journeys under each session/message tier."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=5, help='Times each journey is repeated per tier')
+
+    def handle(self, *args, **options):
+        project = Project.objects.active().order_by('-created_at').first()
+        user = User.objects.filter(is_active=True, is_staff=False).exclude(pk=getattr(project, 'creator_id', None)).first()
+        if project is None or user is None:
+            raise CommandError('Need an active project and a user; run the seed command first.')
+        detail = f'/projects/{project.slug}/'
+        anonymous = [('GET', '/'), ('GET', '/projects/'), ('GET', detail),
+                     ('POST', '/accounts/login/', {'email': 'nobody@example.com', 'password': 'x'})]
+        member = [('GET', detail), ('POST', f'{detail}comment/', {'content': 'Benchmark comment'}),
+                  ('GET', detail), ('POST', f'{detail}rate/', {'value': 4}), ('GET', detail)]
+        sign_in = [('POST', '/accounts/login/', {'email': user.email, 'password': PASSWORD}),
+                   ('GET', detail), ('GET', '/accounts/logout/')]
+        journeys = [('anonymous', anonymous, False), ('member', member, True), ('login', sign_in, False)]
+
+        self.stdout.write(f"{'tier':<24} | {'journey':<9} | {'writes/req':>10} | {'session writes/req':>18} | {'session reads/req':>17}")
+        with transaction.atomic():
+            # Comments, ratings and the known password are rolled back at the end
+            user.set_password(PASSWORD)
+            user.save(update_fields=['password'])
+            for label, engine, storage in TIERS:
+                with override_settings(ALLOWED_HOSTS=['testserver'], SESSION_BACKEND=engine,
+                                       SESSION_ENGINE='django.contrib.sessions.backends.' + engine,
+                                       MESSAGE_STORAGE=storage):
+                    for journey, steps, logged_in in journeys:
+                        writes, session_writes, session_reads = self.measure(steps, logged_in and user, options['rounds'])
+                        self.stdout.write(f"{label:<24} | {journey:<9} | {writes:>10.2f} | {session_writes:>18.2f} | {session_reads:>17.2f}")
+            transaction.set_rollback(True)
+
+    def measure(self, steps, user, rounds):
+        writes = session_writes = session_reads = requests = 0
+        for _ in range(rounds):
+            client = Client()
+            if user:
+                client.force_login(user)
+            for method, path, *data in steps:
+                with CaptureQueriesContext(connection) as queries:
+                    response = getattr(client, method.lower())(path, *data)
+                    if response.status_code >= 400:
+                        raise CommandError(f'{method} {path} returned {response.status_code}')
+                requests += 1
+                for query in queries.captured_queries:
+                    sql = query['sql'].lstrip().upper()
+                    is_write = sql.startswith(WRITES)
+                    writes += is_write
+                    if 'DJANGO_SESSION' in sql:
+                        session_writes += is_write
+                        session_reads += not is_write
+        return writes / requests, session_writes / requests, session_reads / requests
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+import time
+from accounts.models import AccountDeletionJob
+from accounts import deletion
+
+
+class Command(BaseCommand):
+    help = "Process queued account deletions in bounded batches (run from cron, or with --loop as a worker)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows deleted/updated per transaction')
+        parser.add_argument('--retry-failed', action='store_true', help='Also resume jobs that previously failed')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new jobs')
+        parser.add_argument('--interval', type=int, default=30, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        statuses = ['pending', 'running'] + (['failed'] if options['retry_failed'] else [])
+        while True:
+            for job in AccountDeletionJob.objects.filter(status__in=statuses).order_by('created_at'):
+                self.stdout.write(f'Deleting account {job.email} (job {job.pk})')
+                deletion.process(job, batch_size=max(1, options['batch_size']), progress=self.report)
+                self.stdout.write(self.style.SUCCESS(f'  done: {job.processed} rows processed'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def report(self, job):
+        self.stdout.write(f'  [{job.stage}] {job.processed} rows processed')
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from accounts.models import User, AccountToken, AccountDeletionJob
+from accounts.deletion import GHOST_USERNAME, batches
+
+
+class Command(BaseCommand):
+    help = "Delete expired activation/reset tokens and stale never-activated accounts in batched DELETEs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per transaction')
+        parser.add_argument('--inactive-days', type=int, default=7,
+                            help='Remove never-activated accounts that registered more than this many days ago (0 disables)')
+
+    def handle(self, *args, **options):
+        size = max(1, options['batch_size'])
+        now = timezone.now()
+
+        tokens = 0
+        # Range scan on the expires_at index; tokens have no dependents, so a plain DELETE is enough
+        for ids in batches(AccountToken.objects.filter(expires_at__lte=now), size):
+            with transaction.atomic():
+                tokens += AccountToken.objects.filter(pk__in=ids)._raw_delete(AccountToken.objects.db)
+        self.stdout.write(f'  expired tokens removed: {tokens}')
+
+        accounts = 0
+        if options['inactive_days'] > 0:
+            stale = (User.objects
+                     .filter(is_active=False, is_staff=False, last_login__isnull=True,
+                             date_joined__lt=now - timezone.timedelta(days=options['inactive_days']))
+                     .exclude(username=GHOST_USERNAME)
+                     # Still holding a live activation link, or a deactivated account awaiting its deletion job
+                     .exclude(Exists(AccountToken.objects.filter(user=OuterRef('pk'))))
+                     .exclude(Exists(AccountDeletionJob.objects.filter(user=OuterRef('pk')))))
+            for ids in batches(stale, size):
+                with transaction.atomic():
+                    # Never-activated accounts own no projects or donations; the collector only meets their stats rows
+                    User.objects.filter(pk__in=ids).delete()
+                accounts += len(ids)
+        self.stdout.write(f'  stale inactive accounts removed: {accounts}')
+
+        self.stdout.write(self.style.SUCCESS(f'Purged {tokens} tokens and {accounts} accounts'))
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from importlib import import_module
+import time
+from accounts.deletion import batches
+
+
+class Command(BaseCommand):
+    help = "Delete expired sessions in bounded batches (a chunked clearsessions; run from cron or with --loop)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Session rows deleted per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep purging on a schedule')
+        parser.add_argument('--interval', type=int, default=3600, help='Seconds between passes with --loop')
+
+    def handle(self, *args, **options):
+        size = max(1, options['batch_size'])
+        engine = import_module(settings.SESSION_ENGINE)
+        while True:
+            if settings.SESSION_BACKEND in ('db', 'cached_db'):
+                self.stdout.write(self.style.SUCCESS(f'Removed {self.purge_table(size)} expired sessions'))
+            else:
+                # Cache and cookie sessions expire on their own
+                engine.SessionStore.clear_expired()
+                self.stdout.write(f'{settings.SESSION_BACKEND} sessions need no purge')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def purge_table(self, size):
+        # clearsessions issues one DELETE over the whole table; here each batch is its own short transaction
+        removed = 0
+        now = timezone.now()
+        for keys in batches(Session.objects.filter(expire_date__lt=now), size):
+            with transaction.atomic():
+                removed += Session.objects.filter(pk__in=keys)._raw_delete(Session.objects.db)
+        return removed
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum, Count
+from accounts.models import User, UserStats
+from projects.models import Project, Donation, ArchivedDonation
+from projects.management.commands.rebuild_leaderboards import id_chunks
+
+
+class Command(BaseCommand):
+    help = "Recompute the UserStats rows (donated, backed, created, raised) from donations and projects in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Users recomputed per transaction')
+
+    def handle(self, *args, **options):
+        size = max(1, options['chunk_size'])
+        done = 0
+        for ids in id_chunks(User.objects.all(), size):
+            stats = {pk: UserStats(user_id=pk) for pk in ids}
+            # A project's donations are either all live or all archived, so the counts simply add up
+            for model in (Donation, ArchivedDonation):
+                for row in (model.objects.filter(user_id__in=ids).values('user_id')
+                            .annotate(total=Sum('amount'), backed=Count('project_id', distinct=True)).order_by()):
+                    stats[row['user_id']].total_donated += row['total']
+                    stats[row['user_id']].projects_backed += row['backed']
+            for row in Project.objects.filter(creator_id__in=ids).values('creator_id').annotate(n=Count('id')):
+                stats[row['creator_id']].projects_created = row['n']
+            for row in (Donation.objects.filter(project__creator_id__in=ids).values('project__creator_id')
+                        .annotate(total=Sum('amount'))):
+                stats[row['project__creator_id']].total_raised = row['total']
+            for row in (Project.objects.filter(creator_id__in=ids, archived_raised__gt=0).values('creator_id')
+                        .annotate(total=Sum('archived_raised')).order_by()):
+                stats[row['creator_id']].total_raised += row['total']
+            with transaction.atomic():
+                UserStats.objects.filter(user_id__in=ids).delete()
+                UserStats.objects.bulk_create(stats.values())
+            done += len(ids)
+            self.stdout.write(f'  {done} users done')
+        self.stdout.write(self.style.SUCCESS(f'User stats rebuilt for {done} users'))
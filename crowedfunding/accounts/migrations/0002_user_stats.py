@@ -0,0 +1,48 @@
+# Generated by Django 5.1.1 on 2026-10-18 22:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_stats(apps, schema_editor):
+    # Same totals as rebuild_user_stats: the signal handlers only add to and subtract from them
+    UserStats = apps.get_model('accounts', 'UserStats')
+    Donation = apps.get_model('projects', 'Donation')
+    Project = apps.get_model('projects', 'Project')
+    stats = {}
+
+    def row(user_id):
+        return stats.setdefault(user_id, UserStats(user_id=user_id))
+
+    for r in (Donation.objects.values('user_id')
+              .annotate(total=Sum('amount'), backed=Count('project_id', distinct=True)).order_by()):
+        row(r['user_id']).total_donated, row(r['user_id']).projects_backed = r['total'], r['backed']
+    for r in Project.objects.values('creator_id').annotate(n=Count('id')).order_by():
+        row(r['creator_id']).projects_created = r['n']
+    for r in Donation.objects.values('project__creator_id').annotate(total=Sum('amount')).order_by():
+        row(r['project__creator_id']).total_raised = r['total']
+    UserStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('projects', '0002_alter_donation_unique_together_project_slug_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_donated', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('projects_backed', models.PositiveIntegerField(default=0)),
+                ('projects_created', models.PositiveIntegerField(default=0)),
+                ('total_raised', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.1 on 2026-10-18 23:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+import hashlib
+
+
+def carry_over_pending_tokens(apps, schema_editor):
+    # Live plaintext tokens become hashed rows; inactive users were awaiting activation, active ones a reset.
+    User = apps.get_model('accounts', 'User')
+    AccountToken = apps.get_model('accounts', 'AccountToken')
+    pending = (User.objects.exclude(activation_token__isnull=True).exclude(activation_token='')
+               .filter(activation_token_expires__isnull=False)
+               .values_list('pk', 'is_active', 'activation_token', 'activation_token_expires'))
+    AccountToken.objects.bulk_create(
+        AccountToken(user_id=pk, purpose='reset' if is_active else 'activate',
+                     token_hash=hashlib.sha256(token.encode()).hexdigest(), expires_at=expires)
+        for pk, is_active, token, expires in pending.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_account_deletion_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.CharField(choices=[('activate', 'Account activation'), ('reset', 'Password reset')], max_length=10)),
+                ('token_hash', models.CharField(max_length=64, unique=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(carry_over_pending_tokens, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='user',
+            name='activation_token',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='activation_token_expires',
+        ),
+    ]
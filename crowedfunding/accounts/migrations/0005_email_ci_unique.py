@@ -0,0 +1,45 @@
+# Generated by Django 5.1.1 on 2026-10-18 23:02
+
+import accounts.models
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def deduplicate_emails(apps, schema_editor):
+    # Keep one account per case-insensitive email: the active one that logged in most recently
+    # (then the oldest); the others are deactivated and their email rewritten so it stays traceable.
+    User = apps.get_model('accounts', 'User')
+    duplicated = (User.objects.exclude(email='').annotate(email_lower=Lower('email'))
+                  .values('email_lower').annotate(n=Count('pk')).filter(n__gt=1)
+                  .values_list('email_lower', flat=True))
+    for email_lower in list(duplicated):
+        accounts = list(User.objects.annotate(email_lower=Lower('email')).filter(email_lower=email_lower)
+                        .order_by('-is_active', models.F('last_login').desc(nulls_last=True), 'pk'))
+        for user in accounts[1:]:
+            user.email = f'duplicate-{user.pk}+{user.email}'
+            user.is_active = False
+            user.save(update_fields=['email', 'is_active'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_account_tokens'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', accounts.models.UserManager()),
+            ],
+        ),
+        migrations.RunPython(deduplicate_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), condition=models.Q(('email', ''), _negated=True), name='user_email_ci_unique'),
+        ),
+    ]
@@ -1,6 +1,17 @@
-from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
 from django.core.validators import RegexValidator
+import hashlib
+import secrets
+
+class UserManager(BaseUserManager):
+    def by_email(self, email):
+        """Case-insensitive email match written as LOWER(email) = ... so it uses the functional unique index."""
+        # The exclude repeats the partial index's condition; SQLite only uses the index when it does
+        return self.alias(email_lower=Lower('email')).filter(email_lower=email.lower()).exclude(email='')
 
 class User(AbstractUser):
     phone_regex = RegexValidator(regex=r'^01[0-2,5]{1}[0-9]{8}$', message="Egyptian phone number is required")
@@ -9,8 +20,110 @@ class User(AbstractUser):
     birthdate = models.DateField(null=True, blank=True)
     facebook_profile = models.URLField(null=True, blank=True)
     country = models.CharField(max_length=100, null=True, blank=True)
-    activation_token = models.CharField(max_length=100, blank=True)
-    activation_token_expires = models.DateTimeField(null=True, blank=True)
+
+    objects = UserManager()
+
+    class Meta(AbstractUser.Meta):
+        swappable = 'AUTH_USER_MODEL'
+        constraints = [
+            # Emails identify accounts at login; blank ones (e.g. createsuperuser without email) are exempt
+            models.UniqueConstraint(Lower('email'), condition=~Q(email=''), name='user_email_ci_unique'),
+        ]
+
+    def __str__(self):
+        return self.email
+
+class UserStats(models.Model):
+    """Per-user totals shown on the profile page, kept current by the projects signal handlers."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    total_donated = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    projects_backed = models.PositiveIntegerField(default=0)
+    projects_created = models.PositiveIntegerField(default=0)
+    total_raised = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"Stats for {self.user.email}"
+
+    @classmethod
+    def for_user(cls, user):
+        """The user's stats row, or an unsaved all-zero one (avoids a write on read-only pages)."""
+        return cls.objects.filter(user=user).first() or cls(user=user)
+
+    @classmethod
+    def bump(cls, user_id, create=True, **deltas):
+        """Atomically add ``deltas`` (field -> amount) to the user's row, creating it if needed.
+
+        Decrements pass ``create=False``: they run from delete cascades, where
+        inserting a row for a user that is itself being deleted would fail.
+        """
+        update = {field: F(field) + value for field, value in deltas.items()}
+        if cls.objects.filter(user_id=user_id).update(**update) or not create:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(user_id=user_id, **deltas)
+        except IntegrityError:
+            cls.objects.filter(user_id=user_id).update(**update)
+
+class AccountDeletionJob(models.Model):
+    """Queued deletion of a deactivated account, processed in bounded batches by accounts.deletion."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    email = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
+    stage = models.CharField(max_length=20, blank=True)
+    processed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Deletion of {self.email} ({self.status})"
+
+class AccountToken(models.Model):
+    """Single-use emailed token (activation or password reset), stored only as a SHA-256 hash."""
+    PURPOSE_ACTIVATE = 'activate'
+    PURPOSE_RESET = 'reset'
+    PURPOSE_CHOICES = [
+        (PURPOSE_ACTIVATE, 'Account activation'),
+        (PURPOSE_RESET, 'Password reset'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tokens')
+    purpose = models.CharField(max_length=10, choices=PURPOSE_CHOICES)
+    # Unique index: a link is resolved with one indexed equality lookup
+    token_hash = models.CharField(max_length=64, unique=True)
+    # Indexed for the purge_expired range scan
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return self.email
\ No newline at end of file
+        return f"{self.get_purpose_display()} token for {self.user.email}"
+
+    @staticmethod
+    def hash(raw_token):
+        return hashlib.sha256(raw_token.encode()).hexdigest()
+
+    @classmethod
+    def issue(cls, user, purpose, lifetime):
+        """Replace the user's outstanding token for ``purpose``; returns the raw token to email."""
+        raw_token = secrets.token_urlsafe(32)
+        with transaction.atomic():
+            cls.objects.filter(user=user, purpose=purpose).delete()
+            cls.objects.create(user=user, purpose=purpose, token_hash=cls.hash(raw_token),
+                               expires_at=timezone.now() + lifetime)
+        return raw_token
+
+    @classmethod
+    def lookup(cls, purpose, raw_token):
+        """The live token matching ``raw_token`` (with its user), or None."""
+        return (cls.objects.select_related('user')
+                .filter(token_hash=cls.hash(raw_token), purpose=purpose, expires_at__gt=timezone.now())
+                .first())
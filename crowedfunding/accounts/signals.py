@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import User
+from .backends import forget_missing
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    # A newly registered (or re-addressed) email must be able to log in straight away
+    forget_missing(instance.email)
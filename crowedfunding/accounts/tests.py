@@ -1,3 +1,113 @@
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+
+from crowedfunding.query_budget import QueryBudgetTestCase, SMALL, LARGE
+from projects.models import Category, Project, Donation, Comment, Rating, DonorGlobalTotal
+from projects.tests import leaderboards, make_project, make_user, user_stats
+from . import deletion
+from .models import User, UserStats
+
+
+class AccountBudgets:
+    """The profile reads maintained totals and paginates both histories."""
+
+    def test_profile(self):
+        self.request(7, 'get', reverse('profile'))
+
+    def test_profile_later_pages(self):
+        self.request(7, 'get', reverse('profile'), {'projects_page': 2, 'donations_page': 2})
+
+    def test_edit_profile(self):
+        self.request(4, 'post', reverse('edit_profile'), {
+            'first_name': 'Mona', 'last_name': 'Adel', 'mobile_phone': '01099999999', 'country': 'Egypt',
+        }, status=302)
+        self.data.member.refresh_from_db()
+        self.assertEqual(self.data.member.first_name, 'Mona')
+
+    def test_login(self):
+        self.client.logout()
+        self.request(9, 'post', reverse('login'), {'email': 'visitor0@example.com', 'password': 'password123'},
+                     status=302)
+
+
+class SmallFixtureAccountTests(AccountBudgets, QueryBudgetTestCase):
+    scale = SMALL
+
+
+class LargeFixtureAccountTests(AccountBudgets, QueryBudgetTestCase):
+    scale = LARGE
+    time_ceiling = 0.5
+
+
+class AccountDeletionTests(TestCase):
+    """The chunked deletion leaves every counter where a full rebuild would put it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.leaving, cls.other, cls.backer = make_user('leaving'), make_user('other'), make_user('backer')
+        cls.art = Category.objects.create(name='Art')
+        cls.own = make_project(cls.leaving, cls.art, 'Own')
+        for amount in (50, 50):
+            Donation.objects.create(user=cls.backer, project=cls.own, amount=Decimal(amount))
+        Comment.objects.create(user=cls.other, project=cls.own, content='On the deleted project')
+        cls.theirs = make_project(cls.other, cls.art, 'Theirs')
+        cls.gift = Donation.objects.create(user=cls.leaving, project=cls.theirs, amount=Decimal(30))
+        Donation.objects.create(user=cls.backer, project=cls.theirs, amount=Decimal(20))
+        Rating.objects.create(user=cls.leaving, project=cls.theirs, value=4)
+        cls.thread = Comment.objects.create(user=cls.leaving, project=cls.theirs, content='Question')
+        cls.reply = Comment.objects.create(user=cls.other, project=cls.theirs, parent=cls.thread, content='Answer')
+
+    def assertDeleted(self, job):
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.user_id), ('done', None))
+        self.assertFalse(User.objects.filter(pk=self.leaving.pk).exists())
+        self.assertEqual(list(Project.objects.all()), [self.theirs])
+        self.assertEqual(Category.objects.get(pk=self.art.pk).active_project_count, 1)
+
+        ghost = deletion.get_ghost_user()
+        self.assertEqual(Comment.objects.get(pk=self.thread.pk).user, ghost)
+        self.assertEqual(Comment.objects.get(pk=self.reply.pk).parent_id, self.thread.pk)
+        self.assertEqual(Donation.objects.get(pk=self.gift.pk).user, ghost)
+        self.assertEqual(Project.objects.get(pk=self.theirs.pk).total_donations, 50)
+        self.assertFalse(Rating.objects.exists())
+
+        # The backer no longer backs the deleted project
+        total = DonorGlobalTotal.objects.get(user=self.backer)
+        self.assertEqual((total.amount, total.count), (20, 1))
+        stats = UserStats.objects.get(user=self.backer)
+        self.assertEqual((stats.total_donated, stats.projects_backed), (20, 1))
+
+        maintained = leaderboards(), user_stats()
+        call_command('rebuild_leaderboards', stdout=StringIO())
+        call_command('rebuild_user_stats', stdout=StringIO())
+        self.assertEqual(maintained, (leaderboards(), user_stats()))
+
+    def test_enqueue_deactivates(self):
+        job = deletion.enqueue(self.leaving)
+        self.assertEqual((job.status, job.email), ('pending', 'leaving@example.com'))
+        self.assertFalse(User.objects.get(pk=self.leaving.pk).is_active)
+        self.assertEqual(deletion.enqueue(self.leaving), job)
+
+    def test_process(self):
+        job = deletion.enqueue(self.leaving)
+        deletion.process(job, batch_size=1)
+        self.assertDeleted(job)
+
+    def test_resume_after_failed_stage(self):
+        job = deletion.enqueue(self.leaving)
+        with mock.patch.object(deletion.DeletionRunner, 'stage_comments', side_effect=RuntimeError('lock timeout')):
+            with self.assertRaisesMessage(RuntimeError, 'lock timeout'):
+                deletion.process(job, batch_size=1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.stage), ('failed', 'comments'))
+        self.assertIn('lock timeout', job.error)
+        # The stages before the failure are not repeated
+        self.assertFalse(Project.objects.filter(pk=self.own.pk).exists())
 
-# Create your tests here.
+        deletion.process(job, batch_size=1)
+        self.assertDeleted(job)
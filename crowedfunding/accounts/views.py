@@ -9,8 +9,9 @@ from django.http import HttpResponse
 from django.template.loader import render_to_string
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
-import secrets
-from .models import User
+from django.core.paginator import Paginator
+from .models import User, UserStats, AccountToken
+from . import deletion
 from .forms import UserRegistrationForm, UserLoginForm, UserUpdateForm, PasswordResetForm, PasswordResetConfirmForm
 
 def register(request):
@@ -19,16 +20,15 @@ def register(request):
         if form.is_valid():
             user = form.save(commit=False)
             user.is_active = False
-            user.activation_token = secrets.token_urlsafe(32)
-            user.activation_token_expires = timezone.now() + timezone.timedelta(hours=24)
             user.save()
+            token = AccountToken.issue(user, AccountToken.PURPOSE_ACTIVATE, timezone.timedelta(hours=24))
             
             subject = 'Activate Your Account'
             message = render_to_string('accounts/activation_email.html', {
                 'user': user,
                 'domain': request.get_host(),
                 'uid': urlsafe_base64_encode(force_bytes(user.pk)),
-                'token': user.activation_token,
+                'token': token,
             })
             
             send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [user.email])
@@ -39,18 +39,25 @@ def register(request):
         form = UserRegistrationForm()
     return render(request, 'accounts/register.html', {'form': form})
 
-def activate_account(request, uidb64, token):
+def _token_for_link(purpose, uidb64, token):
+    """Resolve an emailed link to its live AccountToken via the hashed-token index."""
     try:
-        uid = force_str(urlsafe_base64_decode(uidb64))
-        user = User.objects.get(pk=uid)
-    except (TypeError, ValueError, OverflowError, User.DoesNotExist):
-        user = None
+        uid = int(force_str(urlsafe_base64_decode(uidb64)))
+    except (TypeError, ValueError, OverflowError):
+        return None
+    account_token = AccountToken.lookup(purpose, token)
+    if account_token is None or account_token.user_id != uid:
+        return None
+    return account_token
+
+def activate_account(request, uidb64, token):
+    account_token = _token_for_link(AccountToken.PURPOSE_ACTIVATE, uidb64, token)
     
-    if user is not None and user.activation_token == token and user.activation_token_expires > timezone.now():
+    if account_token is not None:
+        user = account_token.user
         user.is_active = True
-        user.activation_token = None
-        user.activation_token_expires = None
-        user.save()
+        user.save(update_fields=['is_active'])
+        account_token.delete()
         messages.success(request, 'Account activated successfully. You can now login.')
         return redirect('login')
     else:
@@ -63,7 +70,7 @@ def user_login(request):
         if form.is_valid():
             email = form.cleaned_data['email']
             password = form.cleaned_data['password']
-            user = authenticate(request, username=email, password=password)
+            user = authenticate(request, email=email, password=password)
             
             if user is not None:
                 if user.is_active:
@@ -83,9 +90,20 @@ def user_logout(request):
     messages.success(request, 'You have been logged out successfully.')
     return redirect('home')
 
+PROFILE_PAGE_SIZE = 10
+
 @login_required
 def profile(request):
-    return render(request, 'accounts/profile.html')
+    # Totals come from the maintained UserStats row and both histories are
+    # paginated, so the query count does not grow with the account's size.
+    user = request.user
+    projects = user.projects.with_raised().order_by('-created_at')
+    donations = user.donations.select_related('project').order_by('-donated_at')
+    return render(request, 'accounts/profile.html', {
+        'stats': UserStats.for_user(user),
+        'projects_page': Paginator(projects, PROFILE_PAGE_SIZE).get_page(request.GET.get('projects_page')),
+        'donations_page': Paginator(donations, PROFILE_PAGE_SIZE).get_page(request.GET.get('donations_page')),
+    })
 
 @login_required
 def edit_profile(request):
@@ -102,8 +120,10 @@ def edit_profile(request):
 @login_required
 def delete_account(request):
     if request.method == 'POST':
-        request.user.delete()
-        messages.success(request, 'Your account has been deleted successfully.')
+        # Deactivate now; the related rows are removed in batches by process_account_deletions
+        deletion.enqueue(request.user)
+        logout(request)
+        messages.success(request, 'Your account has been deactivated and will be permanently deleted shortly.')
         return redirect('home')
     return render(request, 'accounts/delete_account.html')
 
@@ -113,11 +133,8 @@ def password_reset(request):
         if form.is_valid():
             email = form.cleaned_data['email']
             try:
-                user = User.objects.get(email=email)
-                token = secrets.token_urlsafe(32)
-                user.activation_token = token
-                user.activation_token_expires = timezone.now() + timezone.timedelta(hours=1)
-                user.save()
+                user = User.objects.by_email(email).get()
+                token = AccountToken.issue(user, AccountToken.PURPOSE_RESET, timezone.timedelta(hours=1))
                 
                 subject = 'Password Reset Request'
                 message = render_to_string('accounts/password_reset_email.html', {
@@ -137,13 +154,9 @@ def password_reset(request):
     return render(request, 'accounts/password_reset.html', {'form': form})
 
 def password_reset_confirm(request, uidb64, token):
-    try:
-        uid = force_str(urlsafe_base64_decode(uidb64))
-        user = User.objects.get(pk=uid)
-    except (TypeError, ValueError, OverflowError, User.DoesNotExist):
-        user = None
+    account_token = _token_for_link(AccountToken.PURPOSE_RESET, uidb64, token)
     
-    if user is None or user.activation_token != token or user.activation_token_expires < timezone.now():
+    if account_token is None:
         messages.error(request, 'Password reset link is invalid or has expired.')
         return redirect('login')
     
@@ -151,10 +164,10 @@ def password_reset_confirm(request, uidb64, token):
         form = PasswordResetConfirmForm(request.POST)
         if form.is_valid():
             password = form.cleaned_data['password1']
+            user = account_token.user
             user.set_password(password)
-            user.activation_token = None
-            user.activation_token_expires = None
-            user.save()
+            user.save(update_fields=['password'])
+            account_token.delete()
             messages.success(request, 'Password reset successfully. You can now login with your new password.')
             return redirect('login')
     else:
@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crowedfunding.settings')
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
-application = get_asgi_application()
+from crowedfunding.staticfiles import StaticFilesASGI
+
+# Serves collected (hashed, precompressed) files under STATIC_URL before Django sees the request
+application = StaticFilesASGI(get_asgi_application())
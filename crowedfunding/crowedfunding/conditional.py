@@ -0,0 +1,67 @@
+"""
+Conditional GET for pages that are rendered per user.
+
+``conditional_page(etag_func)`` works like Django's ``condition(etag_func=...)``
+but fits the pages here: the ETag also covers the user and CSRF cookie (the
+page shows both), requests carrying a flash message are always rendered (a
+304 would leave the message undisplayed), and ``etag_func`` runs in a worker
+thread for async views so it may use the ORM.  Responses are marked
+``private, no-cache`` so browsers revalidate on every visit and shared caches
+never store them.
+"""
+import functools
+import hashlib
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def _etag(request, etag_func, args, kwargs):
+    if request.method not in SAFE_METHODS or CookieStorage.cookie_name in request.COOKIES:
+        return None
+    parts = etag_func(request, *args, **kwargs)
+    if parts is None:
+        return None
+    parts = (parts, request.user.pk, request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''))
+    return 'W/"%s"' % hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def _finish(response, etag):
+    if etag is not None:
+        response.headers.setdefault('ETag', etag)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def conditional_page(etag_func):
+    """Answer 304 without running the view when ``etag_func(request, ...)`` still matches If-None-Match.
+
+    ``etag_func`` returns any repr()-able value describing the page's data, or
+    None to skip conditional handling for that request.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                # The ETag covers the user: load it once here, where the view's auser() finds it cached
+                request.user = await request.auser()
+                etag = await sync_to_async(_etag)(request, etag_func, args, kwargs)
+                response = get_conditional_response(request, etag=etag) if etag else None
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _finish(response, etag)
+        else:
+            @functools.wraps(view)
+            def wrapper(request, *args, **kwargs):
+                etag = _etag(request, etag_func, args, kwargs)
+                response = get_conditional_response(request, etag=etag) if etag else None
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                return _finish(response, etag)
+        return wrapper
+    return decorator
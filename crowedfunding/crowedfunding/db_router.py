@@ -0,0 +1,111 @@
+"""
+Primary/replica database routing.
+
+Writes always go to ``default``.  Reads go to the optional ``replica`` alias
+only inside views decorated with ``read_from_replica`` and only for safe
+methods.  ``PrimaryPinMiddleware`` drops a short-lived cookie after every
+unsafe request (donate, comment, rate, ...) so that the same browser reads
+from the primary until the replica has had time to catch up.
+
+``ArchiveRouter`` sends the archive tables written by ``archive_campaigns``
+to the optional ``archive`` database; without one they stay in ``default``.
+"""
+import contextvars
+import functools
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+REPLICA_ALIAS = 'replica'
+ARCHIVE_ALIAS = 'archive'
+ARCHIVE_MODELS = {'projects.archiveddonation', 'projects.archivedcomment', 'projects.archivedrating'}
+PIN_COOKIE = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def archive_configured():
+    return ARCHIVE_ALIAS in settings.DATABASES
+
+
+class ArchiveRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower in ARCHIVE_MODELS and archive_configured():
+            return ARCHIVE_ALIAS
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not archive_configured():
+            return None
+        is_archive = f'{app_label}.{model_name}' in ARCHIVE_MODELS
+        if db == ARCHIVE_ALIAS:
+            # Only the archive tables; data migrations (no model_name) never run there
+            return is_archive
+        return False if is_archive else None
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Follow relations on the database the instance was loaded from
+            return instance._state.db
+        if _use_replica.get() and replica_configured():
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+def _wants_replica(request):
+    return request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES
+
+
+def read_from_replica(view):
+    """Route the ORM reads of a safe request to the replica unless the client is pinned to the primary."""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            token = _use_replica.set(_wants_replica(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            token = _use_replica.set(_wants_replica(request))
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+    return wrapper
+
+
+class PrimaryPinMiddleware(MiddlewareMixin):
+    """Pin the client to the primary for REPLICA_PIN_SECONDS after any write request (read-your-writes)."""
+
+    def process_response(self, request, response):
+        if replica_configured() and request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10),
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,287 @@
+"""
+Opt-in per-request profiler for staff.
+
+A staff user adds ``?_profile=1`` to any URL (or sends ``X-Profile: 1``) and
+``ProfilerMiddleware`` runs that request under ``cProfile`` while recording
+every SQL statement it issues.  Each profile is stored in ``PROFILER_DIR`` as
+``<id>.prof`` (standard marshal stats, loadable by ``pstats`` or snakeviz)
+and ``<id>.json`` (view, URL, status, wall/CPU time, SQL log and a split of
+the profiled time into templates, ORM/database and other Python).  Only the
+newest ``PROFILER_KEEP`` profiles are kept.  The response carries the id in
+``X-Profile-Id``.
+
+``manage.py profiles`` and the staff page at ``/admin/profiles/`` list recent
+profiles and show the top functions by cumulative time.
+
+cProfile only sees the thread it runs in.  For async views the ORM runs in
+worker threads, so its time shows in the SQL log rather than the function
+table, and other requests served by the same event loop at the time are
+mixed in.  Profiling slows the request down several times.
+
+A process runs one profiler at a time: a profile request that arrives while
+another is being profiled, or while some other profiler is active (Python
+3.12+ refuses to enable a second one), is served normally with the reason in
+``X-Profile-Skipped``.
+"""
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib import admin
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+
+QUERY_PARAM = '_profile'
+HEADER = 'HTTP_X_PROFILE'
+PROFILE_ID = re.compile(r'^\d{8}-\d{9}-[0-9a-f]{6}$')
+SQL_LOG_LIMIT = 500
+
+_sql_log = contextvars.ContextVar('profiler_sql_log', default=None)
+# Held for the whole profiled request; never waited on
+_profiling = threading.Lock()
+
+
+def _record_sql(execute, sql, params, many, context):
+    log = _sql_log.get()
+    if log is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        log.append({'db': context['connection'].alias, 'sql': sql,
+                    'ms': round((time.perf_counter() - started) * 1000, 3), 'many': many})
+
+
+@receiver(connection_created)
+def _install_sql_recorder(sender, connection, **kwargs):
+    # At the bottom of the wrapper stack: execute_wrapper() blocks push and pop above it. The context
+    # variable follows the request into sync_to_async threads, so their queries are recorded too.
+    if _record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_sql)
+
+
+@contextmanager
+def recording_sql():
+    """Collect the statements run in this context, sync_to_async threads included, in the yielded list."""
+    # Connections opened before this module was imported missed connection_created
+    for connection in connections.all(initialized_only=True):
+        _install_sql_recorder(None, connection)
+    log = []
+    token = _sql_log.set(log)
+    try:
+        yield log
+    finally:
+        _sql_log.reset(token)
+
+
+def _requested(request):
+    return request.GET.get(QUERY_PARAM) == '1' or request.META.get(HEADER) == '1'
+
+
+def _bucket(func):
+    filename, _, name = func
+    if '/django/template' in filename or '/templatetags/' in filename:
+        return 'templates'
+    if '/django/db/' in filename or 'sqlite3' in name or 'psycopg' in filename or 'psycopg' in name:
+        return 'orm'
+    return 'python'
+
+
+class _Run:
+    def __init__(self, request):
+        self.request = request
+        self.profiler = cProfile.Profile()
+        self.recording = recording_sql()
+        self.skipped = None
+
+    def __enter__(self):
+        if not _profiling.acquire(blocking=False):
+            self.skipped = 'another request is being profiled'
+            return
+        self.sql = self.recording.__enter__()
+        self.started, self.cpu = time.perf_counter(), time.process_time()
+        try:
+            self.profiler.enable()
+        except ValueError:  # Python 3.12+: a profiler outside this middleware is active
+            self.recording.__exit__(None, None, None)
+            _profiling.release()
+            self.skipped = 'another profiler is active'
+
+    def __exit__(self, *exc_info):
+        if self.skipped:
+            return
+        try:
+            self.profiler.disable()
+            self.wall = time.perf_counter() - self.started
+            self.cpu = time.process_time() - self.cpu
+            self.recording.__exit__(None, None, None)
+        finally:
+            _profiling.release()
+
+    def save(self, response):
+        if self.skipped:
+            response['X-Profile-Skipped'] = self.skipped
+            return response
+        match = self.request.resolver_match
+        self.profiler.create_stats()
+        split = {'templates': 0.0, 'orm': 0.0, 'python': 0.0}
+        for func, (_, _, tottime, _, _) in self.profiler.stats.items():
+            split[_bucket(func)] += tottime
+        meta = {
+            'method': self.request.method,
+            'path': self.request.get_full_path(),
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'user': self.request.user.get_username(),
+            'started_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() - self.wall)),
+            'wall_ms': round(self.wall * 1000, 1),
+            'cpu_ms': round(self.cpu * 1000, 1),
+            'sql_count': len(self.sql),
+            'sql_ms': round(sum(query['ms'] for query in self.sql), 1),
+            'split_ms': {key: round(value * 1000, 1) for key, value in split.items()},
+            'sql': self.sql[:SQL_LOG_LIMIT],
+        }
+        response['X-Profile-Id'] = store(self.profiler, meta)
+        return response
+
+
+class ProfilerMiddleware:
+    """Profile requests that ask for it, when the user is staff; everything else passes straight through."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not (_requested(request) and request.user.is_staff):
+            return self.get_response(request)
+        run = _Run(request)
+        with run:
+            response = self.get_response(request)
+        return run.save(response)
+
+    async def __acall__(self, request):
+        if not (_requested(request) and (await request.auser()).is_staff):
+            return await self.get_response(request)
+        request.user = await request.auser()
+        run = _Run(request)
+        with run:
+            response = await self.get_response(request)
+        return run.save(response)
+
+
+# Storage: a ring of the newest PROFILER_KEEP profiles
+
+def _directory():
+    return Path(settings.PROFILER_DIR)
+
+
+def _path(profile_id, suffix):
+    if not PROFILE_ID.match(profile_id):
+        raise Http404('Unknown profile')
+    return _directory() / f'{profile_id}{suffix}'
+
+
+def store(profiler, meta):
+    directory = _directory()
+    directory.mkdir(parents=True, exist_ok=True)
+    now = time.time()
+    # Sortable by time down to the millisecond, so the ring drops the oldest
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}{int(now * 1000) % 1000:03d}-{secrets.token_hex(3)}"
+    meta = dict(meta, id=profile_id)
+    # Write then rename, so the listing never sees half a profile
+    profiler.dump_stats(directory / f'{profile_id}.prof.tmp')
+    os.replace(directory / f'{profile_id}.prof.tmp', directory / f'{profile_id}.prof')
+    (directory / f'{profile_id}.json.tmp').write_text(json.dumps(meta))
+    os.replace(directory / f'{profile_id}.json.tmp', directory / f'{profile_id}.json')
+
+    for old in sorted(directory.glob('*.json'))[:-settings.PROFILER_KEEP]:
+        old.unlink(missing_ok=True)
+        old.with_suffix('.prof').unlink(missing_ok=True)
+    return profile_id
+
+
+def recent(limit=None):
+    """Stored profiles, newest first."""
+    files = sorted(_directory().glob('*.json'), reverse=True)[:limit]
+    profiles = []
+    for path in files:
+        try:
+            profiles.append(json.loads(path.read_text()))
+        except (OSError, ValueError):  # trimmed by a concurrent request
+            continue
+    return profiles
+
+
+def load(profile_id):
+    try:
+        return json.loads(_path(profile_id, '.json').read_text())
+    except (OSError, ValueError):
+        raise Http404('Unknown profile')
+
+
+def top_functions(profile_id, sort='cumulative', limit=30):
+    stats = pstats.Stats(str(_path(profile_id, '.prof')))
+    stats.sort_stats(sort)
+    rows = []
+    for func in stats.fcn_list[:limit]:
+        primitive, calls, tottime, cumtime, _ = stats.stats[func]
+        rows.append({
+            'function': pstats.func_std_string(func),
+            'calls': calls if calls == primitive else f'{calls}/{primitive}',
+            'tottime_ms': round(tottime * 1000, 2),
+            'cumtime_ms': round(cumtime * 1000, 2),
+            'bucket': _bucket(func),
+        })
+    return rows
+
+
+# Staff pages, mounted under /admin/profiles/ with admin.site.admin_view
+
+SORTS = ('cumulative', 'tottime', 'calls')
+
+
+def profile_list(request):
+    return render(request, 'admin/profiles/list.html', {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'profiles': recent(),
+        'keep': settings.PROFILER_KEEP,
+    })
+
+
+def profile_detail(request, profile_id):
+    if request.GET.get('download'):
+        return FileResponse(_path(profile_id, '.prof').open('rb'), as_attachment=True,
+                            filename=f'{profile_id}.prof')
+    profile = load(profile_id)
+    sort = request.GET.get('sort') if request.GET.get('sort') in SORTS else 'cumulative'
+    return render(request, 'admin/profiles/detail.html', {
+        **admin.site.each_context(request),
+        'title': f"Profile {profile_id}",
+        'profile': profile,
+        'functions': top_functions(profile_id, sort, limit=50),
+        'sort': sort,
+        'sorts': SORTS,
+        'slow_queries': sorted(profile['sql'], key=lambda query: -query['ms'])[:20],
+    })
@@ -0,0 +1,190 @@
+"""
+Query-budget assertions and seeded fixtures for the view tests.
+
+``QueryBudgetTestCase.request`` runs one request against a cold cache and
+requires exactly the budgeted number of SQL queries, and, on fixtures that
+set ``time_ceiling``, a response time under that many seconds.  The view
+tests declare each budget once and run it against a small and a large
+``seed`` (see ``SMALL`` / ``LARGE``), so a template or view change whose
+query count grows with the data fails on the large one.  The failure lists
+the statements that repeat, normalized to fingerprints (literals replaced
+by ``?``), which is usually the N+1 itself.
+
+``request(..., asynchronous=True)`` serves the request from the ASGI twins
+of the views instead (``ASYNC_VIEWS``, see ``async_views``) through the async
+test client.  Statements are collected with ``profiling.recording_sql``,
+which follows the request into the ``sync_to_async`` threads the async ORM
+runs in; ``CaptureQueriesContext`` would only see this thread's connection.
+"""
+import importlib
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import clear_url_caches
+from django.utils import timezone
+
+from .profiling import recording_sql
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDERS = re.compile(r'\?(?:\s*,\s*\?)+')
+
+# Multipliers for seed(): the small fixture has one of everything, the large one ten times more
+SMALL = 1
+LARGE = 10
+
+# URLconfs that choose between sync and async views on import; included ones before the root
+SWITCHED_URLCONFS = ('home.urls', 'projects.urls', settings.ROOT_URLCONF)
+
+
+def fingerprint(sql):
+    """``sql`` with its literal values and IN lists folded, so repeats of one statement compare equal."""
+    sql = NUMBER.sub('?', STRING.sub('?', sql))
+    return ' '.join(PLACEHOLDERS.sub('?, ...', sql).split())
+
+
+def _reload_urlconfs():
+    for name in SWITCHED_URLCONFS:
+        importlib.reload(importlib.import_module(name))
+    clear_url_caches()
+
+
+@contextmanager
+def async_views():
+    """Route to the ASGI views, as a server started with ``ASYNC_VIEWS=1`` does."""
+    try:
+        with override_settings(ASYNC_VIEWS=True):
+            _reload_urlconfs()
+            yield
+    finally:
+        _reload_urlconfs()
+
+
+def budget_report(label, budget, queries):
+    repeated = [(n, sql) for sql, n in Counter(map(fingerprint, queries)).most_common() if n > 1]
+    lines = [f'{label}: {len(queries)} queries, budget {budget}.']
+    if repeated:
+        lines.append('Repeated statements:')
+        lines.extend(f'  {n}x {sql}' for n, sql in repeated)
+    lines.append('All statements:')
+    lines.extend(f'  {i}. {sql}' for i, sql in enumerate(queries, 1))
+    return '\n'.join(lines)
+
+
+def seed(scale):
+    """Users, projects and their donations, comments, ratings, tags and pictures, all growing with ``scale``.
+
+    Rows go through the ORM so the signal-maintained counters, leaderboards
+    and stats match real traffic; recommendations and the trending ranks are
+    built with their commands.  ``member`` and ``founder`` each created half
+    the projects and ``member`` backs some of the founder's, so it gets
+    recommendations; ``visitor`` has no history and is the one who writes.
+    """
+    from projects.models import Category, Tag, Project, ProjectPicture, Donation, Comment, Rating
+    from projects.recommend import Builder
+
+    User = get_user_model()
+    now = timezone.now()
+    password = make_password('password123')
+
+    def user(name, i):
+        return User.objects.create(username=f'{name}{i}', email=f'{name}{i}@example.com',
+                                   password=password, mobile_phone=f'010{User.objects.count():08d}')
+
+    member, founder, visitor = user('member', 0), user('founder', 0), user('visitor', 0)
+    backers = [user('backer', i) for i in range(2 * scale)]
+    categories = [Category.objects.create(name=f'Category {i}') for i in range(3)]
+    tags = [Tag.objects.create(name=f'tag{i}') for i in range(3 + scale)]
+
+    projects = []
+    for i in range(4 * scale):
+        project = Project.objects.create(
+            title=f'Project {i}', details='Details of the project. ' * 10, category=categories[i % 3],
+            total_target=Decimal(10000), start_time=now - timedelta(days=10), end_time=now + timedelta(days=30),
+            creator=founder if i % 2 else member, is_featured=i % 2 == 0,
+        )
+        project.tags.add(tags[i % len(tags)], tags[(i + 1) % len(tags)])
+        ProjectPicture.objects.create(project=project, image=f'project_pictures/{i}.jpg')
+        for j, backer in enumerate(backers):
+            Donation.objects.create(project=project, user=backer, amount=Decimal(10 + i + j))
+            if j < 5:
+                Rating.objects.create(project=project, user=backer, value=1 + (i + j) % 5)
+        if i % 4 == 1:
+            Donation.objects.create(project=project, user=member, amount=Decimal(25))
+        for j in range(scale):
+            comment = Comment.objects.create(project=project, user=backers[j], content=f'Comment {j}')
+            # One more reply than the detail page previews
+            for k in range(settings.COMMENT_REPLY_PREVIEW + 1):
+                Comment.objects.create(project=project, user=member, parent=comment, content=f'Reply {k}')
+        projects.append(project)
+
+    Builder().run(full=True)
+    call_command('rebuild_trending', stdout=StringIO())
+    return SimpleNamespace(member=member, founder=founder, visitor=visitor, backers=backers, categories=categories,
+                           tags=tags, projects=projects)
+
+
+# Password hashing is slow on purpose; it would dominate the login timings and the seeding
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryBudgetTestCase(TestCase):
+    """Seeds ``seed(scale)`` once per class; ``request`` checks the query budget and ``time_ceiling``."""
+    scale = SMALL
+    # Seconds a request may take, or None to not time it
+    time_ceiling = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(cls.scale)
+
+    def setUp(self):
+        self.client.force_login(self.data.member)
+
+    @contextmanager
+    def assertQueryBudget(self, budget, label='block'):
+        with recording_sql() as log:
+            yield log
+        queries = [query['sql'] for query in log]
+        if len(queries) != budget:
+            self.fail(budget_report(label, budget, queries))
+
+    @contextmanager
+    def assertFasterThan(self, seconds, label='block'):
+        started = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - started
+        if seconds is not None and elapsed > seconds:
+            self.fail(f'{label}: took {elapsed * 1000:.0f} ms, ceiling {seconds * 1000:.0f} ms')
+
+    def request(self, budget, method, path, data=None, status=200, asynchronous=False):
+        """``method`` ``path`` on a cold cache, held to ``budget`` queries; returns the response.
+
+        With ``asynchronous`` the ASGI view serves it, to the user logged in on ``self.client``.
+        """
+        # Cards, menus and facets are cached; a cold cache is the worst case and the same on every run
+        cache.clear()
+        label = f"{method.upper()} {path}{' (async)' if asynchronous else ''}"
+        if asynchronous:
+            self.async_client.cookies = self.client.cookies
+            send = async_to_sync(getattr(self.async_client, method))
+        else:
+            send = getattr(self.client, method)
+        with async_views() if asynchronous else nullcontext():
+            with self.assertQueryBudget(budget, label), self.assertFasterThan(self.time_ceiling, label):
+                response = send(path, data)
+            if asynchronous:
+                self.assertTrue(iscoroutinefunction(response.resolver_match.func), f'{label}: not an async view')
+        self.assertEqual(response.status_code, status, label)
+        return response
@@ -35,8 +35,10 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'crowedfunding.profiling.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'crowedfunding.db_router.PrimaryPinMiddleware',
 ]
 
 ROOT_URLCONF = 'crowedfunding.urls'
@@ -45,7 +47,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -53,12 +54,23 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compiled templates are kept in memory (the autoreloader clears them under runserver)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'crowedfunding.wsgi.application'
 
+# Serve the async variants of home / project_list / project_detail.
+# asgi.py turns this on by default; WSGI deployments keep the sync views.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', '0') == '1'
+
 # Database
 # Default to SQLite for local development if no DATABASE_URL is provided.
 # To use PostgreSQL set an environment variable, e.g.:
@@ -74,10 +86,59 @@ else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
         }
     }
 
+# SQLite production profile (see crowedfunding/sqlite.py): WAL, busy_timeout,
+# tuned synchronous/mmap/cache pragmas on every connection.  IMMEDIATE
+# transactions take the write lock up front so read-then-write blocks wait on
+# busy_timeout instead of failing with "database is locked" on lock upgrade.
+SQLITE_PROFILE = os.getenv('SQLITE_PROFILE', '1') == '1'
+if SQLITE_PROFILE and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE', 'timeout': 20}
+# Funnel donate/comment/rate/report writes through one writer thread with group commit
+SQLITE_WRITE_QUEUE = os.getenv('SQLITE_WRITE_QUEUE', '0') == '1'
+
+# Optional read replica, e.g. a second Postgres server or, locally, a copy of
+# the SQLite file:  REPLICA_DATABASE_URL=sqlite:///replica.sqlite3
+# Views decorated with read_from_replica send their reads there; clients are
+# pinned to the primary for REPLICA_PIN_SECONDS after any write request.
+REPLICA_DATABASE_URL = os.getenv('REPLICA_DATABASE_URL')
+if REPLICA_DATABASE_URL:
+    DATABASES['replica'] = dj_database_url.parse(REPLICA_DATABASE_URL, conn_max_age=600, ssl_require=False)
+    # Tests run against a single database; the replica mirrors it
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+# Optional separate database for the archive tables filled by archive_campaigns, e.g.
+#   ARCHIVE_DATABASE_URL=sqlite:///archive.sqlite3   (then: migrate --database archive)
+ARCHIVE_DATABASE_URL = os.getenv('ARCHIVE_DATABASE_URL')
+if ARCHIVE_DATABASE_URL:
+    DATABASES['archive'] = dj_database_url.parse(ARCHIVE_DATABASE_URL, conn_max_age=600, ssl_require=False)
+# Projects that ended more than this many days ago are archived by archive_campaigns
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '365'))
+
+DATABASE_ROUTERS = ['crowedfunding.db_router.ArchiveRouter', 'crowedfunding.db_router.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '10'))
+
+# Cache.  Per-process local memory unless REDIS_URL is set; multi-process
+# deployments using cache-backed sessions should point every worker at Redis.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+
+# Session tier: db | cached_db | cache | signed_cookies.  cached_db serves
+# session reads from the cache (same table as db, so no one is logged out when
+# switching); signed_cookies keeps the session in the browser and never touches
+# the database.  Expired rows are removed by `manage.py purge_sessions`.
+# cached_db is only the default with a shared cache: on per-process LocMemCache a
+# logout or deactivation in one worker would leave the session valid in the others.
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'cached_db' if REDIS_URL else 'db')
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + SESSION_BACKEND
+# Flash messages live in a signed cookie only, so a redirect-with-message never
+# creates or rewrites a session (the default falls back to the session store).
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -102,6 +163,20 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR,'crowedfunding/static')]
 
+# Hashed filenames plus .gz/.br siblings at collectstatic time (see
+# crowedfunding/staticfiles.py); wsgi.py/asgi.py serve them from STATIC_ROOT
+# with far-future caching.  Off by default while DEBUG so runserver and tests
+# work without running collectstatic first.
+STATIC_PIPELINE = os.getenv('STATIC_PIPELINE', '0' if DEBUG else '1') == '1'
+STORAGES = {
+    # Uploads are deduplicated by content hash; `manage.py gc_media` sweeps unreferenced files
+    'default': {'BACKEND': 'crowedfunding.storage.ContentAddressedStorage'},
+    'staticfiles': {
+        'BACKEND': 'crowedfunding.staticfiles.CompressedManifestStaticFilesStorage' if STATIC_PIPELINE
+        else 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
@@ -109,6 +184,39 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'accounts.User'
 
+# Email login through the LOWER(email) index; ModelBackend keeps username logins (admin) working
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+# How long an email with no account is remembered, so repeated guesses skip the database (0 disables)
+LOGIN_NEGATIVE_CACHE_SECONDS = int(os.getenv('LOGIN_NEGATIVE_CACHE_SECONDS', '30'))
+
+# Lifetime of cached project card HTML; edits and donations invalidate cards immediately
+PROJECT_CARD_CACHE_SECONDS = 300
+# Lifetime of the cached category sidebar; counter and category changes invalidate it on commit
+CATEGORY_MENU_CACHE_SECONDS = 60
+# Lifetime of the project list's cached facet counts (per search/category/tag selection) and how many tags it shows
+FACET_CACHE_SECONDS = 60
+FACET_TAG_LIMIT = 15
+# Replies shown per comment thread on the project page; the rest load through "show more replies"
+COMMENT_REPLY_PREVIEW = 3
+
+# Half-life of the decayed donation momentum behind the "Trending" ranking
+TRENDING_HALF_LIFE_HOURS = 72
+
+# Staff request profiler (?_profile=1, see crowedfunding/profiling.py): where profiles go and how many are kept
+PROFILER_DIR = os.getenv('PROFILER_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILER_KEEP = int(os.getenv('PROFILER_KEEP', '50'))
+
+# Search suggestions (projects/typeahead.py): per-process index, rebuilt after this many seconds
+TYPEAHEAD_MAX_AGE = 300
+# Memory/latency bounds: indexed projects (best funded first), words per title, entries scanned per lookup of a
+# prefix longer than two letters (shorter ones are ranked in full once, see typeahead.SHORT_PREFIX)
+TYPEAHEAD_MAX_PROJECTS = 50000
+TYPEAHEAD_MAX_WORDS = 12
+TYPEAHEAD_MAX_SCAN = 5000
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 #EMAIL_HOST = 'smtp.gmail.com'
 #EMAIL_PORT = 587
@@ -0,0 +1,29 @@
+"""
+SQLite production profile.
+
+Applied to every new SQLite connection through ``connection_created``:
+WAL lets readers proceed while a write is in progress and the remaining
+pragmas trade a little durability/memory for throughput.  How long a writer
+waits for the lock before "database is locked" is the connection's
+``OPTIONS['timeout']`` (settings.py), which sets SQLite's busy timeout; no
+pragma here overrides it.  Override individual values with ``SQLITE_PRAGMAS`` in settings;
+set ``SQLITE_PROFILE = False`` to leave connections untouched.
+"""
+from django.conf import settings
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',     # safe with WAL; fsync on checkpoint only
+    'mmap_size': 134217728,      # 128 MiB memory-mapped reads
+    'cache_size': -20000,        # ~20 MiB page cache (negative = KiB)
+    'temp_store': 'MEMORY',
+}
+
+
+def apply_sqlite_profile(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite' or not getattr(settings, 'SQLITE_PROFILE', True):
+        return
+    pragmas = {**DEFAULT_PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
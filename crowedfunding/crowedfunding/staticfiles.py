@@ -0,0 +1,217 @@
+"""
+Static asset pipeline.
+
+``CompressedManifestStaticFilesStorage`` is the staticfiles storage used when
+``STATIC_PIPELINE`` is on: ``collectstatic`` writes content-hashed copies
+(``style.3f2a9c1b.css``), a manifest, and ``.gz`` / ``.br`` siblings for
+every compressible file (``.br`` only when the optional ``brotli`` package is
+installed).
+
+``StaticFilesWSGI`` / ``StaticFilesASGI`` wrap the Django application and
+answer requests under ``STATIC_URL`` straight from ``STATIC_ROOT`` without
+going through Django: the best precompressed variant allowed by
+``Accept-Encoding`` is chosen, hashed names get a one-year ``immutable``
+``Cache-Control``, and ``ETag`` / ``If-None-Match`` give 304s for the rest.
+Files are indexed once at startup, so restart after ``collectstatic``.
+"""
+import asyncio
+import gzip
+import mimetypes
+import os
+from email.utils import formatdate
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are produced without it
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico')
+MIN_COMPRESS_SIZE = 256
+# Only keep a variant that saves at least this fraction of the original
+MIN_SAVING = 0.05
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+SHORT_CACHE = 'public, max-age=60'
+# Preferred first; the identity file is always the fallback
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+CHUNK_SIZE = 64 * 1024
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # The vendored Bootstrap builds reference .map files that are not shipped;
+    # only rewrite url()/@import references, not sourceMappingURL comments.
+    patterns = (
+        ('*.css', (
+            r"""(?P<matched>url\(['"]{0,1}\s*(?P<url>.*?)["']{0,1}\))""",
+            (r"""(?P<matched>@import\s*["']\s*(?P<url>.*?)["'])""", '@import url("%(url)s")'),
+        )),
+    )
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        # The manifest now maps every original name to its final hashed name
+        for name in {*paths, *self.hashed_files.values()}:
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(data, quality=11)))
+        for suffix, compressed in variants:
+            if len(compressed) <= len(data) * (1 - MIN_SAVING):
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
+
+
+def _content_type(path):
+    content_type, _ = mimetypes.guess_type(path)
+    content_type = content_type or 'application/octet-stream'
+    if content_type == 'application/javascript':
+        content_type = 'text/javascript'
+    if content_type.startswith('text/'):
+        content_type += '; charset=utf-8'
+    return content_type
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFile:
+    """One file under STATIC_ROOT and its precompressed siblings, with headers computed up front."""
+
+    def __init__(self, path, immutable):
+        self.variants = {}
+        for encoding, suffix in ENCODINGS:
+            if os.path.isfile(path + suffix):
+                self.variants[encoding] = self.describe(path + suffix, encoding)
+        self.variants[None] = self.describe(path, None)
+        self.headers = [
+            ('Content-Type', _content_type(path)),
+            ('Cache-Control', IMMUTABLE_CACHE if immutable else SHORT_CACHE),
+        ]
+        if len(self.variants) > 1:
+            self.headers.append(('Vary', 'Accept-Encoding'))
+
+    @staticmethod
+    def describe(path, encoding):
+        stat = os.stat(path)
+        etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}{"-" + encoding if encoding else ""}"'
+        return path, stat.st_size, etag, formatdate(stat.st_mtime, usegmt=True)
+
+    def negotiate(self, accept_encoding, if_none_match):
+        """Return (status, headers, path or None) for a GET of this file."""
+        accepted = _accepted_encodings(accept_encoding) if accept_encoding else set()
+        encoding = next((e for e, _ in ENCODINGS if e in self.variants and e in accepted), None)
+        path, size, etag, last_modified = self.variants[encoding]
+        headers = self.headers + [('ETag', etag), ('Last-Modified', last_modified)]
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return '304 Not Modified', headers, None
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        headers.append(('Content-Length', str(size)))
+        return '200 OK', headers, path
+
+
+class StaticFiles:
+    """Index of STATIC_ROOT keyed by URL path."""
+
+    def __init__(self, root=None, prefix=None):
+        self.root = str(root or settings.STATIC_ROOT or '')
+        self.prefix = prefix or settings.STATIC_URL
+        if not self.prefix.startswith('/'):
+            self.prefix = '/' + self.prefix
+        self.files = {}
+        if self.root and os.path.isdir(self.root):
+            self.scan()
+
+    def scan(self):
+        storage = CompressedManifestStaticFilesStorage(location=self.root)
+        hashed = set(storage.hashed_files.values())
+        compressed_suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        for directory, _, names in os.walk(self.root):
+            for filename in names:
+                if filename.endswith(compressed_suffixes):
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                self.files[self.prefix + name] = StaticFile(path, immutable=name in hashed)
+
+    def find(self, method, path):
+        if method not in ('GET', 'HEAD') or not path.startswith(self.prefix):
+            return None
+        return self.files.get(path)
+
+
+class StaticFilesWSGI:
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.static = StaticFiles(root, prefix)
+
+    def __call__(self, environ, start_response):
+        static_file = self.static.find(environ['REQUEST_METHOD'], environ.get('PATH_INFO', ''))
+        if static_file is None:
+            return self.application(environ, start_response)
+        status, headers, path = static_file.negotiate(environ.get('HTTP_ACCEPT_ENCODING', ''),
+                                                      environ.get('HTTP_IF_NONE_MATCH', ''))
+        start_response(status, headers)
+        if path is None or environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return wrapper(open(path, 'rb'), CHUNK_SIZE)
+
+
+class StaticFilesASGI:
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.static = StaticFiles(root, prefix)
+
+    async def __call__(self, scope, receive, send):
+        static_file = None
+        if scope['type'] == 'http':
+            static_file = self.static.find(scope['method'], scope['path'])
+        if static_file is None:
+            return await self.application(scope, receive, send)
+        request_headers = {key.decode('latin-1').lower(): value.decode('latin-1') for key, value in scope['headers']}
+        status, headers, path = static_file.negotiate(request_headers.get('accept-encoding', ''),
+                                                      request_headers.get('if-none-match', ''))
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split()[0]),
+            'headers': [(key.lower().encode('latin-1'), value.encode('latin-1')) for key, value in headers],
+        })
+        if path is None or scope['method'] == 'HEAD':
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        loop = asyncio.get_running_loop()
+        with open(path, 'rb') as handle:
+            while True:
+                chunk = await loop.run_in_executor(None, handle.read, CHUNK_SIZE)
+                more = len(chunk) == CHUNK_SIZE
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': more})
+                if not more:
+                    break
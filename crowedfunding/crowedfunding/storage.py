@@ -0,0 +1,70 @@
+"""
+Content-addressed media storage.
+
+Uploads are hashed (SHA-256) while they are streamed to a temporary file and
+then moved to ``blobs/<h[:2]>/<h[2:4]>/<hash><ext>``.  A blob that already
+exists is reused, so re-uploads, seeded banners and avatars shared between
+accounts are stored once no matter which ``upload_to`` directory the field
+names.
+
+Because one blob can back many rows, nothing deletes media when a row goes
+away.  ``manage.py gc_media`` is the mark-and-sweep collector: it walks
+``MEDIA_ROOT`` and removes every file that no ``MEDIA_REFERENCES`` column
+points at any more.
+"""
+import hashlib
+import os
+import secrets
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'blobs'
+TMP_DIR = 'tmp'
+# (model label, field name) pairs whose values are media names; gc_media treats everything else as garbage
+MEDIA_REFERENCES = [
+    ('projects.ProjectPicture', 'image'),
+    ('accounts.User', 'profile_picture'),
+]
+
+
+def blob_name(digest, ext):
+    return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content is hashed (see _save)
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1].lower()
+        tmp_dir = self.path(TMP_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        # Created like any other upload, so the usual umask/permissions apply
+        tmp_path = os.path.join(tmp_dir, secrets.token_hex(16))
+        try:
+            with open(tmp_path, 'xb') as tmp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            name = blob_name(digest.hexdigest(), ext)
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                # Reuse restarts gc_media's --min-age grace period, which is judged by mtime: a sweep
+                # that found the blob unreferenced must not delete it before this upload's row commits
+                os.utime(path, None)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                # Atomic on one filesystem: a concurrent identical upload just replaces it with the same bytes
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name
@@ -2,8 +2,12 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from crowedfunding import profiling
 
 urlpatterns = [
+    path('admin/profiles/', admin.site.admin_view(profiling.profile_list), name='admin_profiles'),
+    path('admin/profiles/<str:profile_id>/', admin.site.admin_view(profiling.profile_detail),
+         name='admin_profile_detail'),
     path('admin/', admin.site.urls),
     path('', include('home.urls')),
     path('accounts/', include('accounts.urls')),
@@ -13,4 +13,7 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crowedfunding.settings')
 
-application = get_wsgi_application()
+from crowedfunding.staticfiles import StaticFilesWSGI
+
+# Serves collected (hashed, precompressed) files under STATIC_URL before Django sees the request
+application = StaticFilesWSGI(get_wsgi_application())
@@ -1,3 +1,34 @@
-from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from crowedfunding.query_budget import QueryBudgetTestCase, SMALL, LARGE
+
+
+class HomeBudgets:
+    """Every home page section is a fixed number of queries, whatever the number of projects."""
+
+    def test_home(self):
+        response = self.request(12, 'get', reverse('home'))
+        self.assertContains(response, 'Recommended for You')
+
+    def test_home_anonymous(self):
+        self.client.logout()
+        self.request(8, 'get', reverse('home'))
+
+    # The ASGI twin (ASYNC_VIEWS) queries the sections concurrently, within the same budget
+
+    def test_home_async(self):
+        response = self.request(12, 'get', reverse('home'), asynchronous=True)
+        self.assertContains(response, 'Recommended for You')
+
+    def test_home_anonymous_async(self):
+        self.client.logout()
+        self.request(8, 'get', reverse('home'), asynchronous=True)
+
+
+class SmallFixtureHomeTests(HomeBudgets, QueryBudgetTestCase):
+    scale = SMALL
+
+
+class LargeFixtureHomeTests(HomeBudgets, QueryBudgetTestCase):
+    scale = LARGE
+    time_ceiling = 0.5
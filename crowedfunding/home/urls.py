@@ -1,6 +1,7 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 urlpatterns = [
-    path('', views.home, name='home'),
+    path('', views.home_async if settings.ASYNC_VIEWS else views.home, name='home'),
 ]
\ No newline at end of file
@@ -1,32 +1,63 @@
+import asyncio
+
 from django.shortcuts import render
-from projects.models import Project, Category
+from crowedfunding.db_router import read_from_replica
+from projects.categories import category_menu, acategory_menu
+from projects.models import Project, DonorGlobalTotal
+from projects import recommend
 from django.utils import timezone
-from django.db.models import Avg, Count
+from django.db.models import Avg
 
-def home(request):
+def _home_querysets():
+    """The independent home page sections, shared by the sync and async views."""
     highest_rated = Project.objects.filter(
         is_cancelled=False, 
         end_time__gt=timezone.now()
     ).annotate(
         avg_rating=Avg('ratings__value')
-    ).order_by('-avg_rating')[:5]
+    ).with_raised().prefetch_related('pictures').order_by('-avg_rating')[:5]
     
     latest_projects = Project.objects.filter(
         is_cancelled=False, 
         end_time__gt=timezone.now()
-    ).order_by('-created_at')[:5]
-    
-    featured_projects = Project.objects.filter(
-        is_featured=True, 
-        is_cancelled=False, 
-        end_time__gt=timezone.now()
-    ).order_by('-created_at')[:5]
+    ).prefetch_related('pictures').order_by('-created_at')[:5]
     
-    categories = Category.objects.annotate(project_count=Count('project'))
+    trending_projects = Project.objects.filter(
+        is_cancelled=False,
+        end_time__gt=timezone.now(),
+        trending_rank__isnull=False,
+    ).with_raised().prefetch_related('pictures').order_by('-trending_rank')[:5]
     
-    return render(request, 'home/home.html', {
+    top_backers = DonorGlobalTotal.top()
+    return highest_rated, latest_projects, trending_projects, top_backers
+
+def _recommended_queryset(user):
+    # Personal section: computed offline by build_recommendations, read in score order
+    return recommend.for_user(user) if user.is_authenticated else Project.objects.none()
+
+def _home_context(highest_rated, latest_projects, trending_projects, top_backers, categories, recommended):
+    return {
+        'recommended_projects': recommended,
         'highest_rated': highest_rated,
+        'trending_projects': trending_projects,
         'latest_projects': latest_projects,
-        'featured_projects': featured_projects,
         'categories': categories,
-    })
\ No newline at end of file
+        'top_backers': top_backers,
+    }
+
+@read_from_replica
+def home(request):
+    return render(request, 'home/home.html', _home_context(
+        *_home_querysets(), category_menu(), _recommended_queryset(request.user)))
+
+@read_from_replica
+async def home_async(request):
+    """ASGI variant of home: the home sections are queried concurrently via the async ORM."""
+    request.user = await request.auser()
+
+    async def fetch(queryset):
+        return [obj async for obj in queryset]
+
+    sections = await asyncio.gather(*(fetch(qs) for qs in _home_querysets()), acategory_menu(),
+                                    fetch(_recommended_queryset(request.user)))
+    return render(request, 'home/home.html', _home_context(*sections))
\ No newline at end of file
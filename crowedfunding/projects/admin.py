@@ -1,5 +1,11 @@
+from datetime import timedelta
+
+from django import forms
 from django.contrib import admin
-from .models import Category, Tag, Project, ProjectPicture, Donation, Comment, Rating, Report
+from django.contrib.admin import helpers
+from django.template.response import TemplateResponse
+from . import bulk
+from .models import Category, Tag, Project, ProjectPicture, Donation, Comment, Rating, Report, DonorTotal, DonorGlobalTotal, ProjectImport
 
 class ProjectPictureInline(admin.TabularInline):
     model = ProjectPicture
@@ -20,9 +26,19 @@ class RatingInline(admin.TabularInline):
     extra = 0
     readonly_fields = ('user', 'value')
 
+class ExtendEndTimeForm(forms.Form):
+    days = forms.IntegerField(min_value=1, max_value=365, help_text='Added to each selected project\'s end time.')
+
+class RecategorizeForm(forms.Form):
+    category = forms.ModelChoiceField(Category.objects.order_by('name'))
+
+class TagForm(forms.Form):
+    tag = forms.ModelChoiceField(Tag.objects.order_by('name'))
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name',)
+    list_display = ('name', 'active_project_count')
+    readonly_fields = ('active_project_count',)
     search_fields = ('name',)
 
 @admin.register(Tag)
@@ -39,7 +55,62 @@ class ProjectAdmin(admin.ModelAdmin):
     ordering = ('-created_at',)
     autocomplete_fields = ('creator', 'category', 'tags')
     inlines = [ProjectPictureInline, DonationInline, CommentInline, RatingInline]
-    readonly_fields = ('created_at', 'slug')
+    readonly_fields = ('created_at', 'slug', 'trending_score', 'trending_updated_at')
+    # Each action is one bulk statement over the selection (see projects.bulk), so "select all" scales
+    actions = ['feature', 'unfeature', 'cancel', 'extend_end_time', 'recategorize', 'add_tag', 'remove_tag']
+
+    def _done(self, request, count, what):
+        self.message_user(request, f"{count} project{'s' if count != 1 else ''} {what}.")
+
+    def _with_form(self, request, queryset, form_class, title, apply):
+        """Ask for the action's parameter on an intermediate page, then run ``apply(cleaned_data)``."""
+        form = form_class(request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            apply(form.cleaned_data)
+            return None
+        return TemplateResponse(request, 'admin/projects/project/bulk_action.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': title,
+            'form': form,
+            'count': queryset.count(),
+            'action': request.POST['action'],
+            'select_across': request.POST.get('select_across', '0'),
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
+    @admin.action(description='Feature selected projects')
+    def feature(self, request, queryset):
+        self._done(request, bulk.set_featured(queryset, True), 'featured')
+
+    @admin.action(description='Unfeature selected projects')
+    def unfeature(self, request, queryset):
+        self._done(request, bulk.set_featured(queryset, False), 'unfeatured')
+
+    @admin.action(description='Cancel selected projects')
+    def cancel(self, request, queryset):
+        self._done(request, bulk.cancel(queryset), 'cancelled')
+
+    @admin.action(description='Extend end time of selected projects')
+    def extend_end_time(self, request, queryset):
+        return self._with_form(request, queryset, ExtendEndTimeForm, 'Extend end time', lambda data: self._done(
+            request, bulk.extend(queryset, timedelta(days=data['days'])), f"extended by {data['days']} days"))
+
+    @admin.action(description='Move selected projects to another category')
+    def recategorize(self, request, queryset):
+        return self._with_form(request, queryset, RecategorizeForm, 'Change category', lambda data: self._done(
+            request, bulk.recategorize(queryset, data['category']), f"moved to {data['category']}"))
+
+    @admin.action(description='Add a tag to selected projects')
+    def add_tag(self, request, queryset):
+        return self._with_form(request, queryset, TagForm, 'Add tag', lambda data: self._done(
+            request, bulk.add_tag(queryset, data['tag']), f"tagged {data['tag']}"))
+
+    @admin.action(description='Remove a tag from selected projects')
+    def remove_tag(self, request, queryset):
+        return self._with_form(request, queryset, TagForm, 'Remove tag', lambda data: self._done(
+            request, bulk.remove_tag(queryset, data['tag']), f"untagged {data['tag']}"))
 
 @admin.register(Donation)
 class DonationAdmin(admin.ModelAdmin):
@@ -70,4 +141,22 @@ class ReportAdmin(admin.ModelAdmin):
     list_filter = ('report_type', 'created_at')
     search_fields = ('user__email', 'reason')
     date_hierarchy = 'created_at'
-    autocomplete_fields = ('user', 'project', 'comment')
\ No newline at end of file
+    autocomplete_fields = ('user', 'project', 'comment')
+
+@admin.register(DonorTotal)
+class DonorTotalAdmin(admin.ModelAdmin):
+    list_display = ('user', 'project', 'amount', 'count')
+    search_fields = ('user__email', 'project__title')
+    readonly_fields = ('user', 'project', 'amount', 'count')
+
+@admin.register(DonorGlobalTotal)
+class DonorGlobalTotalAdmin(admin.ModelAdmin):
+    list_display = ('user', 'amount', 'count')
+    search_fields = ('user__email',)
+    readonly_fields = ('user', 'amount', 'count')
+
+@admin.register(ProjectImport)
+class ProjectImportAdmin(admin.ModelAdmin):
+    list_display = ('source', 'position', 'imported', 'skipped', 'started_at', 'finished_at')
+    search_fields = ('source',)
+    readonly_fields = ('source', 'position', 'imported', 'skipped', 'started_at', 'updated_at', 'finished_at')
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ProjectsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'projects'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from crowedfunding.sqlite import apply_sqlite_profile
+        from . import signals  # noqa: F401
+
+        connection_created.connect(apply_sqlite_profile, dispatch_uid='sqlite_profile')
@@ -0,0 +1,191 @@
+"""
+Archival of finished campaigns.
+
+``archive_project`` moves a project's donations, ratings and comments out of
+the hot tables into ``ArchivedDonation`` / ``ArchivedRating`` /
+``ArchivedComment`` (in the ``archive`` database when one is configured, see
+``crowedfunding.db_router.ArchiveRouter``), adding their totals to the
+project's ``archived_*`` fields so ``ProjectQuerySet.with_stats`` and the
+card/detail figures do not change.  Rows are copied to the archive first and
+only then deleted from the hot table, each batch in its own transaction; the
+copy ignores rows already archived, so a run interrupted between the two
+steps is finished by the next one.  Leaderboards and profile totals are left
+as they are: archiving is not a refund.
+
+Comment threads with an open report stay in the hot table so moderators can
+still act on them.  Once ``archived_at`` is set the project no longer accepts
+comments or ratings.
+
+The detail views read archived rows back through ``with_archived_donations``,
+``with_archived_comments`` and ``archived_rating`` (plus async twins), which
+return regular, unsaved ``Donation`` / ``Comment`` / ``Rating`` instances so
+the templates do not need to know where a row came from.  They only query
+the archive for projects that have been archived.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.deletion import batches, raw_delete
+from .models import (Project, Donation, Comment, Rating,
+                     ArchivedDonation, ArchivedComment, ArchivedRating)
+
+User = get_user_model()
+
+DONATION_FIELDS = ('id', 'project_id', 'user_id', 'amount', 'donated_at')
+RATING_FIELDS = ('id', 'project_id', 'user_id', 'value')
+COMMENT_FIELDS = ('id', 'project_id', 'user_id', 'parent_id', 'content', 'created_at')
+
+
+def archive_candidates(days):
+    cutoff = timezone.now() - timezone.timedelta(days=days)
+    return Project.objects.filter(end_time__lt=cutoff, archived_at__isnull=True)
+
+
+def _move(queryset, archive_model, fields, totals, project_id, batch_size):
+    """Copy ``queryset`` to ``archive_model`` and delete it, ``batch_size`` rows per transaction.
+
+    ``totals(rows)`` returns the ``archived_*`` increments for the rows moved in a batch.
+    """
+    archive = router.db_for_write(archive_model)
+    moved = 0
+    for ids in batches(queryset, batch_size):
+        rows = list(queryset.model.objects.filter(pk__in=ids).values(*fields))
+        with transaction.atomic(using=archive):
+            archive_model.objects.using(archive).bulk_create(
+                [archive_model(**row) for row in rows], ignore_conflicts=True)
+        with transaction.atomic():
+            raw_delete(queryset.model, [row['id'] for row in rows])
+            Project.objects.filter(pk=project_id).update(
+                **{field: F(field) + value for field, value in totals(rows).items()})
+        moved += len(rows)
+    return moved
+
+
+def archive_project(project_id, batch_size=500):
+    """Move the project's donations, ratings and comments to the archive; returns the number of rows moved."""
+    moved = _move(
+        Donation.objects.filter(project_id=project_id), ArchivedDonation, DONATION_FIELDS,
+        lambda rows: {'archived_raised': sum(row['amount'] for row in rows), 'archived_donation_count': len(rows)},
+        project_id, batch_size,
+    )
+    moved += _move(
+        Rating.objects.filter(project_id=project_id), ArchivedRating, RATING_FIELDS,
+        lambda rows: {'archived_rating_sum': sum(row['value'] for row in rows), 'archived_rating_count': len(rows)},
+        project_id, batch_size,
+    )
+    # Whole threads stay behind when any of their comments is reported
+    reported = set(Comment.objects.filter(project_id=project_id, report__isnull=False)
+                   .annotate(root=Coalesce('parent_id', 'id')).values_list('root', flat=True))
+    comments = Comment.objects.filter(project_id=project_id).exclude(Q(pk__in=reported) | Q(parent_id__in=reported))
+    # Replies first: their parents must not be deleted from under them
+    for queryset in (comments.filter(parent__isnull=False), comments):
+        moved += _move(queryset, ArchivedComment, COMMENT_FIELDS,
+                       lambda rows: {'archived_comment_count': len(rows), 'comment_count': -len(rows)},
+                       project_id, batch_size)
+    # A new last_modified changes the detail page's ETag, so clients refetch the archived view
+    now = timezone.now()
+    Project.objects.filter(pk=project_id).update(archived_at=now, last_modified=now)
+    return moved
+
+
+def _donations(project, rows, users):
+    return [Donation(id=row.id, project=project, user=users.get(row.user_id), amount=row.amount,
+                     donated_at=row.donated_at) for row in rows]
+
+
+def _comment(project, row, users):
+    return Comment(id=row.id, project=project, user=users.get(row.user_id), parent_id=row.parent_id,
+                   content=row.content, created_at=row.created_at)
+
+
+def _threads(project, rows, users):
+    top, replies = [], defaultdict(list)
+    for row in rows:
+        comment = _comment(project, row, users)
+        (replies[row.parent_id] if row.parent_id else top).append(comment)
+    for comment in top:
+        # What the detail page's reply preview prefetch would have stored, oldest reply first
+        thread = sorted(replies[comment.id], key=lambda c: c.created_at)
+        comment.reply_count = len(thread)
+        comment.reply_preview = thread[:settings.COMMENT_REPLY_PREVIEW]
+    return top
+
+
+def _archived_donations_queryset(project, limit):
+    return ArchivedDonation.objects.filter(project_id=project.pk).order_by('-donated_at')[:limit]
+
+
+def _archived_comments_queryset(project):
+    return ArchivedComment.objects.filter(project_id=project.pk).order_by('-created_at')
+
+
+def with_archived_donations(project, donations, limit=5):
+    """The newest ``limit`` donations: ``donations`` (hot, newest first) topped up from the archive."""
+    donations = list(donations)
+    if project.archived_at is None or len(donations) >= limit:
+        return donations
+    rows = list(_archived_donations_queryset(project, limit - len(donations)))
+    users = User.objects.in_bulk({row.user_id for row in rows})
+    return donations + _donations(project, rows, users)
+
+
+async def awith_archived_donations(project, donations, limit=5):
+    donations = list(donations)
+    if project.archived_at is None or len(donations) >= limit:
+        return donations
+    rows = [row async for row in _archived_donations_queryset(project, limit - len(donations))]
+    users = await User.objects.ain_bulk({row.user_id for row in rows})
+    return donations + _donations(project, rows, users)
+
+
+def with_archived_comments(project, comments):
+    """Top-level ``comments`` (hot, newest first) followed by the project's archived threads."""
+    comments = list(comments)
+    if project.archived_at is None:
+        return comments
+    rows = list(_archived_comments_queryset(project))
+    users = User.objects.in_bulk({row.user_id for row in rows})
+    return comments + _threads(project, rows, users)
+
+
+async def awith_archived_comments(project, comments):
+    comments = list(comments)
+    if project.archived_at is None:
+        return comments
+    rows = [row async for row in _archived_comments_queryset(project)]
+    users = await User.objects.ain_bulk({row.user_id for row in rows})
+    return comments + _threads(project, rows, users)
+
+
+def archived_replies(project, parent_id):
+    """All archived replies to the archived comment ``parent_id``, oldest first."""
+    if project.archived_at is None:
+        return []
+    rows = list(ArchivedComment.objects.filter(project_id=project.pk, parent_id=parent_id).order_by('created_at'))
+    users = User.objects.in_bulk({row.user_id for row in rows})
+    return [_comment(project, row, users) for row in rows]
+
+
+def _archived_rating_queryset(project, user):
+    return ArchivedRating.objects.filter(project_id=project.pk, user_id=user.pk).values_list('value', flat=True)
+
+
+def archived_rating(project, user):
+    """The user's archived rating of an archived project, as an unsaved Rating (or None)."""
+    if project.archived_at is None or not user.is_authenticated:
+        return None
+    value = _archived_rating_queryset(project, user).first()
+    return None if value is None else Rating(project=project, user=user, value=value)
+
+
+async def aarchived_rating(project, user):
+    if project.archived_at is None or not user.is_authenticated:
+        return None
+    value = await _archived_rating_queryset(project, user).afirst()
+    return None if value is None else Rating(project=project, user=user, value=value)
@@ -0,0 +1,101 @@
+"""
+Set-based project edits behind the ``ProjectAdmin`` bulk actions.
+
+Each function takes any ``Project`` queryset, including the admin's "select
+all N" changelist queryset, and changes it with one UPDATE (plus one INSERT
+... SELECT or DELETE for tags) without loading the projects or running
+``Project.save``.  The UPDATE also sets a new ``last_modified``, which
+invalidates the rows' conditional-GET ETags.
+
+The bookkeeping is derived from the same queryset inside the transaction:
+the category counter deltas are counted just before the UPDATE, from the
+state each row will have after it, and the UPDATE sets ``counted_active``
+itself with a CASE.  The rows are never looked up again afterwards, since
+the changelist filters (end time, cancelled, featured) may match different
+rows once the edit is applied.  SQLite transactions start ``IMMEDIATE``, so no
+other writer runs between the counts and the UPDATE.  A changed counter
+drops the cached category menu (``projects.categories``).  Project cards do
+not show any of the fields edited here, so their cached HTML stays valid.
+"""
+from collections import Counter
+
+from django.db import connections, router, transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.utils import timezone
+
+from . import categories
+from .models import Project
+
+
+def _stamp(queryset, **changes):
+    """Apply ``changes`` and a new ``last_modified`` with one UPDATE; return the number of rows changed."""
+    return queryset.order_by().update(last_modified=timezone.now(), **changes)
+
+
+def _counts(queryset):
+    return Counter(dict(queryset.order_by().values_list('category_id').annotate(n=Count('id'))))
+
+
+@transaction.atomic
+def set_featured(queryset, featured):
+    return _stamp(queryset.exclude(is_featured=featured), is_featured=featured)
+
+
+@transaction.atomic
+def cancel(queryset):
+    queryset = queryset.filter(is_cancelled=False)
+    deltas = Counter({category_id: -n for category_id, n in _counts(queryset.filter(counted_active=True)).items()})
+    changed = _stamp(queryset, is_cancelled=True, counted_active=False)
+    categories.adjust(deltas)
+    return changed
+
+
+@transaction.atomic
+def extend(queryset, delta):
+    # Whether a row counts once its end time has moved, stated on the end time it has now
+    counts_after = Q(is_cancelled=False, end_time__gt=timezone.now() - delta)
+    deltas = _counts(queryset.filter(counts_after, counted_active=False))
+    deltas.subtract(_counts(queryset.exclude(counts_after).filter(counted_active=True)))
+    changed = _stamp(queryset, end_time=F('end_time') + delta,
+                     counted_active=Case(When(counts_after, then=Value(True)), default=Value(False)))
+    categories.adjust(deltas)
+    return changed
+
+
+@transaction.atomic
+def recategorize(queryset, category):
+    queryset = queryset.exclude(category=category)
+    # Counted projects leave their old category's counter and join the new one
+    moved = _counts(queryset.filter(counted_active=True))
+    deltas = Counter({category_id: -n for category_id, n in moved.items()})
+    deltas[category.pk] += sum(moved.values())
+    changed = _stamp(queryset, category=category)
+    categories.adjust(deltas)
+    return changed
+
+
+@transaction.atomic
+def add_tag(queryset, tag):
+    queryset = queryset.exclude(tags=tag)
+    changed = _stamp(queryset)
+    # INSERT ... SELECT: the new through rows never pass through Python
+    through = Project.tags.through
+    connection = connections[router.db_for_write(through)]
+    quote = connection.ops.quote_name
+    select, params = queryset.values('pk').distinct().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(through._meta.db_table)} '
+            f'({quote(through._meta.get_field("project").column)}, {quote(through._meta.get_field("tag").column)}) '
+            f'SELECT selected.{quote(Project._meta.pk.column)}, %s FROM ({select}) selected',
+            (tag.pk, *params),
+        )
+    return changed
+
+
+@transaction.atomic
+def remove_tag(queryset, tag):
+    queryset = queryset.filter(tags=tag)
+    changed = _stamp(queryset)
+    Project.tags.through.objects.filter(tag=tag, project__in=queryset).delete()
+    return changed
@@ -0,0 +1,75 @@
+"""
+Cached project cards.
+
+A card's HTML is cached per project and variant (``words`` / ``progress``)
+under the project's current *card version*.  Anything that changes what a
+card shows (the project itself, its pictures, a donation or comment) calls
+``invalidate``, which gives the project a new version so the old entries are
+never read again and simply expire.  The new version is stored once the
+write commits: stored earlier, a request in between would read the old rows
+and cache them under the new version.  ``render_cards`` resolves a whole page
+of cards with one ``get_many`` for the versions, one for the cards and one
+``set_many`` for the misses.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import get_template
+
+CARD_TEMPLATE = 'projects/includes/project_card.html'
+
+
+def _version_key(project_id):
+    return f'project_card:version:{project_id}'
+
+
+def _card_key(project_id, version, variant):
+    return f'project_card:{project_id}:{version}:{variant}'
+
+
+def variant(words, progress):
+    return f'{words}{"p" if progress else ""}'
+
+
+def invalidate(project_id):
+    # A fresh token rather than incr(): an evicted counter restarting at 1 could resurrect old cards
+    transaction.on_commit(lambda: cache.set(_version_key(project_id), time.time_ns(), None))
+
+
+def _versions(project_ids):
+    keys = {pk: _version_key(pk) for pk in project_ids}
+    found = cache.get_many(keys.values())
+    missing = [key for key in keys.values() if key not in found]
+    if missing:
+        # add() never replaces a token a concurrent invalidate() stored meanwhile: read back whichever won
+        for key in missing:
+            cache.add(key, time.time_ns(), None)
+        found.update(cache.get_many(missing))
+    # Still missing (evicted again, or a dummy cache): a one-off token just means rendering afresh
+    return {pk: found[key] if key in found else time.time_ns() for pk, key in keys.items()}
+
+
+def render_card(project, words, progress):
+    return get_template(CARD_TEMPLATE).render({'project': project, 'words': words, 'progress': progress})
+
+
+def render_cards(projects, words, progress):
+    """Return {project pk: card HTML} for ``projects``, rendering and caching only the misses."""
+    projects = {project.pk: project for project in projects}
+    if not projects:
+        return {}
+    kind = variant(words, progress)
+    versions = _versions(projects)
+    keys = {pk: _card_key(pk, versions[pk], kind) for pk in projects}
+    found = cache.get_many(keys.values())
+    html, fresh = {}, {}
+    for pk, key in keys.items():
+        if key in found:
+            html[pk] = found[key]
+        else:
+            html[pk] = fresh[key] = render_card(projects[pk], words, progress)
+    if fresh:
+        cache.set_many(fresh, getattr(settings, 'PROJECT_CARD_CACHE_SECONDS', 300))
+    return html
@@ -0,0 +1,69 @@
+"""
+Active-project counters per category and the cached category menu.
+
+``Category.active_project_count`` is the number of the category's projects
+flagged ``Project.counted_active`` (not cancelled and not yet ended).  The
+flag and the counter move together: ``projects.signals`` on every project
+save/delete, the account deletion job when it removes a campaign, and
+``manage.py expire_projects`` when end times pass.  ``expire_projects
+--rebuild`` recomputes both from scratch.
+
+``category_menu()`` / ``acategory_menu()`` return the sidebar shared by the
+home page and the project list as plain dicts, cached for
+``CATEGORY_MENU_CACHE_SECONDS``; any counter or category change drops the
+entry once its transaction commits.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Category
+
+MENU_KEY = 'category_menu'
+
+
+def is_active(project, now=None):
+    """Whether ``project`` belongs in its category's count (the rule of ProjectQuerySet.active())."""
+    return not project.is_cancelled and project.end_time > (now or timezone.now())
+
+
+def adjust(deltas):
+    """Apply ``{category_id: delta}`` to the counters with one UPDATE per changed category."""
+    changed = False
+    for category_id, delta in deltas.items():
+        if category_id is not None and delta:
+            Category.objects.filter(pk=category_id).update(active_project_count=F('active_project_count') + delta)
+            changed = True
+    if changed:
+        invalidate_menu()
+
+
+def invalidate_menu():
+    # After commit: deleting earlier would let a concurrent request re-cache the old counts
+    transaction.on_commit(lambda: cache.delete(MENU_KEY))
+
+
+def _menu_queryset():
+    return Category.objects.order_by('pk').values('id', 'name', 'active_project_count')
+
+
+def _timeout():
+    return getattr(settings, 'CATEGORY_MENU_CACHE_SECONDS', 60)
+
+
+def category_menu():
+    menu = cache.get(MENU_KEY)
+    if menu is None:
+        menu = list(_menu_queryset())
+        cache.set(MENU_KEY, menu, _timeout())
+    return menu
+
+
+async def acategory_menu():
+    menu = await cache.aget(MENU_KEY)
+    if menu is None:
+        menu = [row async for row in _menu_queryset()]
+        await cache.aset(MENU_KEY, menu, _timeout())
+    return menu
@@ -0,0 +1,107 @@
+"""
+Facet counts for the project list sidebar.
+
+For the current search and tag selection, ``facets()`` / ``afacets()`` count
+the matching active projects per category, ignoring the selected category so
+the other categories show what switching would give.  They also return the
+most used tags within the full result set.  Each facet is a single grouped
+query.  When there is no search and no tag selection, the category counts
+are the ``Category.active_project_count`` counters from the cached menu
+and cost no query.
+
+Results are cached for ``FACET_CACHE_SECONDS`` per normalized filter
+(case-folded search text, category, sorted tag ids), so counts may lag
+edits by that long.  The category names always come from the live menu.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .categories import category_menu, acategory_menu
+from .models import Project
+
+Through = Project.tags.through
+
+
+def parse_tags(values):
+    """Selected tag ids from ``?tag=`` values: digits only, deduplicated, sorted."""
+    return sorted({int(value) for value in values if value.isdigit()})
+
+
+def search_filter(queryset, search_query, tag_ids):
+    """Apply the search text and the selected tags (a project must carry all of them).
+
+    Both are ``pk IN (subquery)`` filters, so no join multiplies the rows and
+    the counts need no DISTINCT.
+    """
+    if search_query:
+        queryset = queryset.filter(
+            Q(title__icontains=search_query) |
+            Q(pk__in=Through.objects.filter(tag__name__icontains=search_query).values('project_id'))
+        )
+    if tag_ids:
+        queryset = queryset.filter(pk__in=Through.objects.filter(tag_id__in=tag_ids)
+                                   .values('project_id').annotate(n=Count('tag_id'))
+                                   .filter(n=len(tag_ids)).values('project_id'))
+    return queryset
+
+
+def _key(search_query, category_id, tag_ids):
+    raw = '|'.join([(search_query or '').casefold(), str(category_id or ''), ','.join(map(str, tag_ids))])
+    return 'facets:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _category_counts_queryset(search_query, tag_ids):
+    return (search_filter(Project.objects.active(), search_query, tag_ids)
+            .order_by().values_list('category_id').annotate(n=Count('id')))
+
+
+def _tag_counts_queryset(search_query, category_id, tag_ids):
+    projects = search_filter(Project.objects.active(), search_query, tag_ids)
+    if category_id:
+        projects = projects.filter(category_id=category_id)
+    return (Through.objects.filter(project_id__in=projects.values('pk'))
+            .values_list('tag_id', 'tag__name').annotate(n=Count('project_id'))
+            .order_by('-n', 'tag__name')[:settings.FACET_TAG_LIMIT])
+
+
+def _assemble(menu, cached):
+    counts = cached['category_counts']
+    categories = [
+        dict(row, count=row['active_project_count'] if counts is None else counts.get(row['id'], 0))
+        for row in menu
+    ]
+    return categories, cached['tags']
+
+
+def facets(search_query, category_id, tag_ids):
+    """(categories with ``count``, [{'id', 'name', 'count'}] of the top tags) for the filtered list."""
+    key = _key(search_query, category_id, tag_ids)
+    cached = cache.get(key)
+    if cached is None:
+        filtered = bool(search_query or tag_ids)
+        cached = {
+            'category_counts': dict(_category_counts_queryset(search_query, tag_ids)) if filtered else None,
+            'tags': [{'id': pk, 'name': name, 'count': n}
+                     for pk, name, n in _tag_counts_queryset(search_query, category_id, tag_ids)],
+        }
+        cache.set(key, cached, settings.FACET_CACHE_SECONDS)
+    return _assemble(category_menu(), cached)
+
+
+async def afacets(search_query, category_id, tag_ids):
+    key = _key(search_query, category_id, tag_ids)
+    cached = await cache.aget(key)
+    if cached is None:
+        counts = None
+        if search_query or tag_ids:
+            counts = {pk: n async for pk, n in _category_counts_queryset(search_query, tag_ids)}
+        cached = {
+            'category_counts': counts,
+            'tags': [{'id': pk, 'name': name, 'count': n}
+                     async for pk, name, n in _tag_counts_queryset(search_query, category_id, tag_ids)],
+        }
+        await cache.aset(key, cached, settings.FACET_CACHE_SECONDS)
+    return _assemble(await acategory_menu(), cached)
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from projects.models import Donation, Comment, Rating
+from projects.management.commands.rebuild_leaderboards import id_chunks
+from projects import archive
+
+
+class Command(BaseCommand):
+    help = ("Move the donations, ratings and comments of projects that ended more than --days ago "
+            "into the archive tables in batches (see projects/archive.py).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help='Archive projects whose end time is at least this many days old')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows moved per transaction')
+        parser.add_argument('--limit', type=int, default=0, help='Stop after this many projects (0 = no limit)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be archived')
+
+    def handle(self, *args, **options):
+        candidates = archive.archive_candidates(options['days'])
+        if options['dry_run']:
+            ids = candidates.values('pk')
+            rows = sum(model.objects.filter(project__in=ids).aggregate(n=Count('id'))['n']
+                       for model in (Donation, Rating, Comment))
+            self.stdout.write(f'{candidates.count()} projects with {rows} donations, ratings and comments would be archived')
+            return
+
+        limit, size = options['limit'], max(1, options['batch_size'])
+        projects = moved = 0
+        for ids in id_chunks(candidates, 100):
+            for project_id in (ids[:limit - projects] if limit else ids):
+                moved += archive.archive_project(project_id, batch_size=size)
+                projects += 1
+            self.stdout.write(f'  {projects} projects archived')
+            if limit and projects >= limit:
+                break
+        self.stdout.write(self.style.SUCCESS(f'{projects} projects archived, {moved} rows moved'))
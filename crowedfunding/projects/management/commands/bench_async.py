@@ -0,0 +1,101 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.test import Client, AsyncClient, override_settings
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from projects.models import Project
+
+MODES = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = "Benchmark sync (WSGI) vs async (ASGI) throughput of home, project_list and project_detail at rising concurrency."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,4,16,64', help='Comma-separated concurrency levels to test')
+        parser.add_argument('--requests', type=int, default=200, help='Requests issued per concurrency level')
+        parser.add_argument('--mode', choices=MODES, help='Run a single mode in-process and print JSON (used internally)')
+
+    def handle(self, *args, **options):
+        levels = [int(c) for c in options['concurrency'].split(',') if c.strip()]
+        total = options['requests']
+        if options['mode']:
+            self.stdout.write(json.dumps(self.run_mode(options['mode'], levels, total)))
+            return
+
+        # Each mode runs in its own interpreter because the URLconf picks sync/async views at import time.
+        results = {}
+        for mode in MODES:
+            env = dict(os.environ, ASYNC_VIEWS='1' if mode == 'asgi' else '0')
+            proc = subprocess.run(
+                [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'bench_async', '--mode', mode,
+                 '--concurrency', options['concurrency'], '--requests', str(total)],
+                env=env, capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                raise CommandError(f'{mode} run failed:\n{proc.stderr}')
+            results[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+        self.stdout.write(f"{'concurrency':>11} | {'wsgi req/s':>10} | {'asgi req/s':>10} | {'wsgi p95 ms':>11} | {'asgi p95 ms':>11}")
+        for level in levels:
+            w, a = results['wsgi'][str(level)], results['asgi'][str(level)]
+            self.stdout.write(f"{level:>11} | {w['rps']:>10.1f} | {a['rps']:>10.1f} | {w['p95_ms']:>11.1f} | {a['p95_ms']:>11.1f}")
+
+    def target_paths(self):
+        project = Project.objects.active().order_by('-created_at').first()
+        if project is None:
+            raise CommandError('No active projects found; run the seed command first.')
+        return ['/', '/projects/', f'/projects/{project.slug}/']
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def run_mode(self, mode, levels, total):
+        paths = self.target_paths()
+        results = {}
+        for level in levels:
+            if mode == 'wsgi':
+                latencies, elapsed = self.run_wsgi(paths, level, total)
+            else:
+                latencies, elapsed = asyncio.run(self.run_asgi(paths, level, total))
+            latencies.sort()
+            results[level] = {
+                'rps': len(latencies) / elapsed,
+                'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+            }
+        return results
+
+    def run_wsgi(self, paths, concurrency, total):
+        """Thread-per-request, like a threaded WSGI server with ``concurrency`` workers."""
+        def fetch(i):
+            client = Client()
+            started = time.perf_counter()
+            response = client.get(paths[i % len(paths)])
+            if response.status_code != 200:
+                raise CommandError(f'{paths[i % len(paths)]} returned {response.status_code}')
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(fetch, range(total)))
+        return latencies, time.perf_counter() - started
+
+    async def run_asgi(self, paths, concurrency, total):
+        """All requests on one event loop through the ASGI handler, bounded by a semaphore."""
+        gate = asyncio.Semaphore(concurrency)
+        client = AsyncClient()
+
+        async def fetch(i):
+            async with gate:
+                started = time.perf_counter()
+                response = await client.get(paths[i % len(paths)])
+                if response.status_code != 200:
+                    raise CommandError(f'{paths[i % len(paths)]} returned {response.status_code}')
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(fetch(i) for i in range(total)))
+        return list(latencies), time.perf_counter() - started
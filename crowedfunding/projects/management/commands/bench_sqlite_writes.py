@@ -0,0 +1,109 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db import OperationalError, connection, close_old_connections
+from django.utils import timezone
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from projects.models import Category, Project, Donation, Comment
+from projects.write_queue import run_write
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+# (label, SQLITE_PROFILE, SQLITE_WRITE_QUEUE)
+PROFILES = [
+    ('baseline', '0', '0'),
+    ('profile', '1', '0'),
+    ('profile+queue', '1', '1'),
+]
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent donation/comment writes on SQLite: throughput and 'database is locked' rate before and after the SQLite profile and write queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent writer threads (simulated request workers)')
+        parser.add_argument('--writes', type=int, default=800, help='Total write requests per run')
+        parser.add_argument('--worker', action='store_true', help='Run one configuration against SQLITE_PATH and print JSON (used internally)')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self.stdout.write(json.dumps(self.run_worker(options['threads'], options['writes'])))
+            return
+
+        rows = []
+        with tempfile.TemporaryDirectory() as tmp:
+            for label, profile, use_queue in PROFILES:
+                env = dict(os.environ, SQLITE_PATH=os.path.join(tmp, f'{label}.sqlite3'),
+                           SQLITE_PROFILE=profile, SQLITE_WRITE_QUEUE=use_queue)
+                env.pop('DATABASE_URL', None)
+                proc = subprocess.run(
+                    [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'bench_sqlite_writes', '--worker',
+                     '--threads', str(options['threads']), '--writes', str(options['writes'])],
+                    env=env, capture_output=True, text=True,
+                )
+                if proc.returncode != 0:
+                    raise CommandError(f'{label} run failed:\n{proc.stderr}')
+                rows.append((label, json.loads(proc.stdout.strip().splitlines()[-1])))
+
+        self.stdout.write(f"{'config':<14} | {'writes/s':>9} | {'ok':>6} | {'locked':>6} | {'lock %':>6}")
+        for label, r in rows:
+            self.stdout.write(f"{label:<14} | {r['wps']:>9.1f} | {r['ok']:>6} | {r['locked']:>6} | {r['lock_pct']:>6.1f}")
+
+    def run_worker(self, threads, writes):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark targets the SQLite backend.')
+        call_command('migrate', verbosity=0)
+        creator = User.objects.create_user(username='bench', email='bench@example.com', password='x', mobile_phone='01000000000')
+        category = Category.objects.create(name='Bench')
+        now = timezone.now()
+        project = Project.objects.create(
+            title='Bench project', details='-', category=category, total_target=Decimal('100000'),
+            start_time=now, end_time=now + timezone.timedelta(days=30), creator=creator,
+        )
+        donors = [
+            User.objects.create_user(username=f'donor{i}', email=f'donor{i}@example.com', password='x',
+                                     mobile_phone=f'0101{i:07d}')
+            for i in range(threads)
+        ]
+
+        counts = {'ok': 0, 'locked': 0}
+        lock = threading.Lock()
+
+        def request(i):
+            # Mirrors donate/add_comment: read the project, then write
+            user = donors[i % len(donors)]
+            try:
+                target = Project.objects.get(pk=project.pk)
+                if i % 2:
+                    run_write(Donation(project=target, user=user, amount=Decimal('10')).save)
+                else:
+                    run_write(Comment(project=target, user=user, content='benchmark').save)
+                outcome = 'ok'
+            except OperationalError as exc:
+                if 'locked' not in str(exc):
+                    raise
+                outcome = 'locked'
+            finally:
+                close_old_connections()
+            with lock:
+                counts[outcome] += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(request, range(writes)))
+        elapsed = time.perf_counter() - started
+        return {
+            'wps': counts['ok'] / elapsed,
+            'ok': counts['ok'],
+            'locked': counts['locked'],
+            'lock_pct': 100 * counts['locked'] / writes,
+        }
@@ -0,0 +1,75 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from projects.models import Project
+from projects import typeahead
+
+WORDS = ('solar', 'garden', 'school', 'water', 'music', 'film', 'games', 'robot', 'library', 'bike',
+         'clinic', 'coffee', 'studio', 'forest', 'ocean', 'bridge', 'market', 'theatre', 'kitchen', 'camera')
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {p: samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1e6 for p in (50, 95, 99)}
+
+
+class Command(BaseCommand):
+    help = ("Microbenchmark the typeahead prefix index: build time, memory and lookup latency by prefix length, "
+            "next to the icontains query the search box used to run.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookups', type=int, default=5000, help='Lookups per prefix length')
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help='Index this many generated titles instead of the database projects')
+
+    def build(self, synthetic):
+        if not synthetic:
+            return typeahead.build()
+        rng = random.Random(0)
+        index = typeahead.PrefixIndex()
+        index.load(('p', pk, ' '.join(rng.choices(WORDS, k=4)) + f' {pk}', rng.random() * 1000, f'p-{pk}')
+                   for pk in range(synthetic))
+        return index
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        index = self.build(options['synthetic'])
+        build = time.perf_counter() - started
+        # Measured on a second build: tracing allocations slows the first one down several times
+        tracemalloc.start()
+        self.build(options['synthetic'])
+        memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if not index.items:
+            raise CommandError('Nothing to index; run the seed command first or pass --synthetic N.')
+        self.stdout.write(f'{len(index.items)} items, {len(index.entries)} entries: built in {build * 1000:.1f} ms, '
+                          f'peak {memory / 2**20:.1f} MiB')
+
+        vocabulary = sorted({entry[0] for entry in index.entries})
+        rng = random.Random(1)
+        self.stdout.write(f"{'prefix':>6} | {'p50 us':>8} | {'p95 us':>8} | {'p99 us':>8}")
+        for length in (1, 2, 3, 5):
+            queries = [word[:length] for word in rng.choices(vocabulary, k=options['lookups'])]
+            # Short prefixes are ranked on first use: time the steady state, not those one-off ranks
+            for query in queries:
+                index.search(query)
+            samples = []
+            for query in queries:
+                t = time.perf_counter()
+                index.search(query)
+                samples.append(time.perf_counter() - t)
+            p = percentiles(samples)
+            self.stdout.write(f'{length:>6} | {p[50]:>8.1f} | {p[95]:>8.1f} | {p[99]:>8.1f}')
+
+        if not options['synthetic']:
+            samples = []
+            for query in rng.choices(vocabulary, k=50):
+                t = time.perf_counter()
+                list(Project.objects.active().filter(Q(title__icontains=query) | Q(tags__name__icontains=query))
+                     .distinct().values_list('pk', flat=True)[:8])
+                samples.append(time.perf_counter() - t)
+            p = percentiles(samples)
+            self.stdout.write(f'icontains query: p50 {p[50]:.1f} us, p95 {p[95]:.1f} us')
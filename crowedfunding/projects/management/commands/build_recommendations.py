@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+from projects.recommend import Builder
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the "backers also supported" and per-user recommendations from donations and ratings '
+            '(see projects/recommend.py). Only rows affected by activity since the last run are recomputed '
+            'unless --full is given.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every project and user')
+        parser.add_argument('--top-k', type=int, default=10, help='Recommendations kept per project and per user')
+
+    def handle(self, *args, **options):
+        progress = self.stdout.write if options['verbosity'] > 1 else None
+        started = time.perf_counter()
+        projects, users = Builder(top_k=max(1, options['top_k']), progress=progress).run(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Recommendations rebuilt for {projects} projects and {users} users '
+            f'in {time.perf_counter() - started:.1f}s'))
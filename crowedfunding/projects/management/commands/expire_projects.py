@@ -0,0 +1,72 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from projects.models import Category, Project
+from projects.management.commands.rebuild_leaderboards import id_chunks
+from projects import categories
+
+
+class Command(BaseCommand):
+    help = ("Take projects whose end time has passed out of their category's active-project counter "
+            "(run from cron), or recompute every counter with --rebuild.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Projects updated per transaction')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute counted_active and every category counter from scratch')
+        parser.add_argument('--loop', action='store_true', help='Keep sweeping instead of exiting after one pass')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds between passes with --loop')
+
+    def handle(self, *args, **options):
+        size = max(1, options['batch_size'])
+        if options['rebuild']:
+            self.rebuild(size)
+            return
+        while True:
+            expired = self.expire(size)
+            if expired or options['verbosity'] > 1:
+                self.stdout.write(f'{expired} projects expired')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def expire(self, size):
+        done = 0
+        # The flag is cleared batch by batch, so the same filter walks forward through the backlog
+        for ids in id_chunks(Project.objects.filter(counted_active=True, end_time__lte=timezone.now()), size):
+            with transaction.atomic():
+                rows = (Project.objects.filter(pk__in=ids, counted_active=True)
+                        .values('category_id').annotate(n=Count('id')).order_by())
+                deltas = {row['category_id']: -row['n'] for row in rows}
+                Project.objects.filter(pk__in=ids).update(counted_active=False)
+                categories.adjust(deltas)
+            done += len(ids)
+        return done
+
+    def rebuild(self, size):
+        now = timezone.now()
+        active = Q(is_cancelled=False, end_time__gt=now)
+        changed = 0
+        for ids in id_chunks(Project.objects.all(), size):
+            with transaction.atomic():
+                chunk = Project.objects.filter(pk__in=ids)
+                changed += chunk.filter(active, counted_active=False).update(counted_active=True)
+                changed += chunk.exclude(active).filter(counted_active=True).update(counted_active=False)
+
+        counts = Counter(dict(
+            Project.objects.filter(counted_active=True).values_list('category_id')
+            .annotate(n=Count('id')).order_by()
+        ))
+        with transaction.atomic():
+            stale = [category for category in Category.objects.only('pk', 'active_project_count')
+                     if category.active_project_count != counts[category.pk]]
+            for category in stale:
+                category.active_project_count = counts[category.pk]
+            Category.objects.bulk_update(stale, ['active_project_count'], batch_size=size)
+            categories.invalidate_menu()
+        self.stdout.write(self.style.SUCCESS(
+            f'{changed} project flags and {len(stale)} category counters corrected'))
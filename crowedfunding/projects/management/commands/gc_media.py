@@ -0,0 +1,109 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+import os
+import time
+from crowedfunding.storage import BLOB_DIR, MEDIA_REFERENCES
+
+
+def scan_files(root, relative=''):
+    """Yield (name, DirEntry) for every file under ``root``, walking it with os.scandir."""
+    with os.scandir(os.path.join(root, relative)) as entries:
+        for entry in entries:
+            name = f'{relative}/{entry.name}' if relative else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan_files(root, name)
+            elif entry.is_file(follow_symlinks=False):
+                yield name, entry
+
+
+class Command(BaseCommand):
+    help = "Mark-and-sweep garbage collection for MEDIA_ROOT: delete files that no database row references."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows read from the database per query')
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Only sweep files older than this many seconds (protects uploads whose row is not saved yet)')
+        parser.add_argument('--dry-run', action='store_true', help='Report orphans without deleting them')
+        parser.add_argument('--rehome', action='store_true',
+                            help='First move referenced files stored before content addressing into the blob store')
+
+    def handle(self, *args, **options):
+        size = max(1, options['batch_size'])
+        self.references = [(apps.get_model(label), field) for label, field in MEDIA_REFERENCES]
+        # Field defaults (e.g. the stock avatar) are referenced implicitly by every new row
+        self.protected = {
+            model._meta.get_field(field).default for model, field in self.references
+            if isinstance(model._meta.get_field(field).default, str)
+        }
+        if options['rehome']:
+            self.rehome(size, options['dry_run'])
+
+        root = str(settings.MEDIA_ROOT)
+        if not os.path.isdir(root):
+            self.stdout.write('MEDIA_ROOT does not exist; nothing to do')
+            return
+        cutoff = self.cutoff = time.time() - options['min_age']
+        # Mark: rows saved from here on reference files newer than the cutoff, or re-uploads that refresh the mtime
+        live = self.referenced(size) | self.protected
+        scanned = removed = freed = 0
+        for name, entry in scan_files(root):
+            scanned += 1
+            if name in live:
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime < cutoff and self.remove(entry.path, options['dry_run']):
+                removed += 1
+                freed += stat.st_size
+
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {removed} of {scanned} files ({freed / 1048576:.1f} MiB)'
+        ))
+
+    def referenced(self, size):
+        """Every file name a row references, read once."""
+        # The file fields are not indexed: looking names up batch by batch would scan each table once per batch
+        found = set()
+        for model, field in self.references:
+            found.update(model.objects.exclude(**{field: ''}).values_list(field, flat=True).iterator(chunk_size=size))
+        return found
+
+    def remove(self, path, dry_run):
+        if dry_run:
+            return True
+        try:
+            # Re-uploads refresh the mtime (ContentAddressedStorage._save): skip blobs reused since the mark
+            if os.stat(path).st_mtime >= self.cutoff:
+                return False
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def rehome(self, size, dry_run):
+        moved = 0
+        for model, field in self.references:
+            last = ''
+            while True:
+                names = list(model.objects.filter(**{f'{field}__gt': last})
+                             .exclude(**{f'{field}__startswith': BLOB_DIR + '/'})
+                             .order_by(field).values_list(field, flat=True).distinct()[:size])
+                if not names:
+                    break
+                last = names[-1]
+                for name in names:
+                    if name in self.protected or not default_storage.exists(name):
+                        continue
+                    moved += 1
+                    if dry_run:
+                        continue
+                    with default_storage.open(name) as content:
+                        new_name = default_storage.save(name, content)
+                    # The same legacy file may back rows of several models
+                    with transaction.atomic():
+                        for ref_model, ref_field in self.references:
+                            ref_model.objects.filter(**{ref_field: name}).update(**{ref_field: new_name})
+        self.stdout.write(f"  {'would move' if dry_run else 'moved'} {moved} legacy files into {BLOB_DIR}/")
@@ -0,0 +1,254 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+from accounts.models import UserStats
+from projects.models import Category, Tag, Project, ProjectPicture, ProjectImport
+from projects import categories
+
+User = get_user_model()
+
+MAX_TARGET = Decimal('99999999.99')
+SLUG_PREFIXES_PER_QUERY = 200
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(path, fmt):
+    """Stream (row number, dict) pairs from a CSV file with a header row or a JSON Lines file."""
+    with open(path, newline='', encoding='utf-8') as handle:
+        if fmt == 'csv':
+            for number, row in enumerate(csv.DictReader(handle), 1):
+                yield number, row
+        else:
+            for number, line in enumerate(handle, 1):
+                if line.strip():
+                    try:
+                        yield number, json.loads(line)
+                    except ValueError as exc:
+                        yield number, exc
+
+
+def _list(value):
+    # JSONL rows carry lists, CSV cells are "|"-separated
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split('|')
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def _datetime(row, field):
+    raw = str(row.get(field) or '').strip()
+    value = parse_datetime(raw)
+    if value is None:
+        raise RowError(f'{field}: expected an ISO 8601 date-time, got {raw!r}')
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+class Command(BaseCommand):
+    help = ("Bulk-import projects from CSV or JSON Lines (title, details, category, creator email, total_target, "
+            "start_time, end_time, tags, pictures) in checkpointed batches; rerunning resumes after the last batch.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with header) or .jsonl file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows committed per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Validate every row and report errors without writing')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint of an earlier run of this file')
+        parser.add_argument('--no-create', action='store_true', help='Reject rows with unknown categories or tags instead of creating them')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'No such file: {path}')
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        self.batch_size = max(1, options['batch_size'])
+        self.dry_run = options['dry_run']
+        self.create_missing = not options['no_create']
+        self.errors = 0
+
+        # Lookup maps, loaded once; rows never query for their creator, category or tags
+        self.users = {email: pk for email, pk in User.objects.exclude(email='').annotate(email_lower=Lower('email'))
+                      .values_list('email_lower', 'pk').iterator(chunk_size=5000)}
+        self.categories = {name.lower(): pk for pk, name in Category.objects.order_by('-pk').values_list('pk', 'name')}
+        self.tags = {name.lower(): pk for pk, name in Tag.objects.values_list('pk', 'name')}
+
+        checkpoint = None
+        if not self.dry_run:
+            checkpoint, _ = ProjectImport.objects.get_or_create(source=os.path.abspath(path))
+            if options['restart']:
+                checkpoint.position = checkpoint.imported = checkpoint.skipped = 0
+                checkpoint.finished_at = None
+                checkpoint.save()
+            elif checkpoint.finished_at:
+                raise CommandError(f'{path} was fully imported on {checkpoint.finished_at:%Y-%m-%d %H:%M}; '
+                                   'pass --restart to import it again.')
+            elif checkpoint.position:
+                self.stdout.write(f'Resuming after row {checkpoint.position}')
+        start = checkpoint.position if checkpoint else 0
+        self.skipped_before = checkpoint.skipped if checkpoint else 0
+
+        started = time.perf_counter()
+        batch, position, valid, read = [], start, 0, 0
+        for number, row in read_rows(path, fmt):
+            if number <= start:
+                continue
+            read += 1
+            position = number
+            try:
+                if isinstance(row, Exception):
+                    raise RowError(f'invalid JSON: {row}')
+                if not isinstance(row, dict):
+                    raise RowError('expected a JSON object')
+                batch.append(self.parse(row))
+                valid += 1
+            except RowError as exc:
+                self.errors += 1
+                self.stderr.write(f'row {number}: {exc}')
+            if len(batch) >= self.batch_size:
+                self.flush(batch, checkpoint, position)
+                batch = []
+        if checkpoint:
+            self.flush(batch, checkpoint, position, finished=True)
+
+        elapsed = time.perf_counter() - started
+        summary = (f'{read} rows read, {valid} valid, {self.errors} rejected in {elapsed:.1f}s '
+                   f'({read / elapsed if elapsed else 0:.0f} rows/s)')
+        if self.dry_run:
+            summary = 'Dry run: ' + summary
+        self.stdout.write(self.style.SUCCESS(summary) if not self.errors else self.style.WARNING(summary))
+
+    def parse(self, row):
+        title = str(row.get('title') or '').strip()
+        details = str(row.get('details') or '').strip()
+        if not title or len(title) > 200:
+            raise RowError('title: required, at most 200 characters')
+        if not details:
+            raise RowError('details: required')
+        email = str(row.get('creator') or row.get('creator_email') or '').strip().lower()
+        creator_id = self.users.get(email)
+        if creator_id is None:
+            raise RowError(f'creator: no account with email {email!r}')
+        category = str(row.get('category') or '').strip()
+        if not category or len(category) > 100:
+            raise RowError('category: required, at most 100 characters')
+        if category.lower() not in self.categories and not self.create_missing:
+            raise RowError(f'category: unknown {category!r}')
+        try:
+            target = Decimal(str(row.get('total_target') or '').strip())
+        except InvalidOperation:
+            raise RowError(f"total_target: not a number: {row.get('total_target')!r}")
+        if not target.is_finite() or not Decimal(1) <= target <= MAX_TARGET:
+            raise RowError(f'total_target: must be between 1 and {MAX_TARGET}')
+        start_time, end_time = _datetime(row, 'start_time'), _datetime(row, 'end_time')
+        if end_time <= start_time:
+            raise RowError('end_time: must be later than start_time')
+        tags = _list(row.get('tags'))
+        for tag in tags:
+            if len(tag) > 50:
+                raise RowError(f'tags: {tag!r} is longer than 50 characters')
+            if tag.lower() not in self.tags and not self.create_missing:
+                raise RowError(f'tags: unknown {tag!r}')
+        pictures = _list(row.get('pictures'))
+        for name in pictures:
+            if not default_storage.exists(name):
+                raise RowError(f'pictures: {name!r} is not in media storage')
+        return {
+            'project': Project(
+                title=title, details=details, creator_id=creator_id, total_target=target.quantize(Decimal('0.01')),
+                start_time=start_time, end_time=end_time,
+                is_featured=str(row.get('is_featured') or '').strip().lower() in ('1', 'true', 'yes'),
+            ),
+            'category': category,
+            'tags': tags,
+            'pictures': pictures,
+        }
+
+    def flush(self, batch, checkpoint, position, finished=False):
+        if self.dry_run:
+            return
+        with transaction.atomic():
+            if batch:
+                self.write(batch)
+            # Committed with the rows it describes, so a rerun continues exactly after this batch
+            checkpoint.position = position
+            checkpoint.imported += len(batch)
+            checkpoint.skipped = self.skipped_before + self.errors
+            if finished:
+                checkpoint.finished_at = timezone.now()
+            checkpoint.save()
+        self.stdout.write(f'  {checkpoint.imported} imported (row {position})')
+
+    def resolve(self, lookup, model, names):
+        missing = {name.lower(): name for name in names if name.lower() not in lookup}
+        if missing:
+            created = model.objects.bulk_create([model(name=name) for name in missing.values()])
+            lookup.update((obj.name.lower(), obj.pk) for obj in created)
+
+    def write(self, batch):
+        self.resolve(self.categories, Category, [item['category'] for item in batch])
+        self.resolve(self.tags, Tag, [tag for item in batch for tag in item['tags']])
+        projects = [item['project'] for item in batch]
+        for project, slug in zip(projects, self.allocate_slugs([p.title for p in projects])):
+            project.slug = slug
+        now = timezone.now()
+        for project, item in zip(projects, batch):
+            project.category_id = self.categories[item['category'].lower()]
+            project.counted_active = project.end_time > now
+        Project.objects.bulk_create(projects, batch_size=self.batch_size)
+
+        through = Project.tags.through
+        through.objects.bulk_create(
+            [through(project_id=project.pk, tag_id=tag_id) for project, item in zip(projects, batch)
+             for tag_id in {self.tags[tag.lower()] for tag in item['tags']}],
+            batch_size=self.batch_size,
+        )
+        ProjectPicture.objects.bulk_create(
+            [ProjectPicture(project=project, image=name) for project, item in zip(projects, batch)
+             for name in item['pictures']],
+            batch_size=self.batch_size,
+        )
+
+        # bulk_create skips the save signals: apply what they would have maintained, once per batch
+        categories.adjust(Counter(project.category_id for project in projects if project.counted_active))
+        for creator_id, count in Counter(project.creator_id for project in projects).items():
+            UserStats.bump(creator_id, projects_created=count)
+
+    def allocate_slugs(self, titles):
+        """Slugs as Project.save() would pick them (base, base-1, base-2, ...), with a few queries per batch."""
+        bases = [slugify(title)[:200] or 'project' for title in titles]
+        taken = set(Project.objects.filter(slug__in=set(bases)).values_list('slug', flat=True))
+        seen = Counter(bases)
+        # Numbered variants only matter for bases that are already in use; SQLite caps the
+        # expression depth, so the prefix ORs are sent in groups
+        crowded = sorted({base for base in bases if base in taken or seen[base] > 1})
+        for i in range(0, len(crowded), SLUG_PREFIXES_PER_QUERY):
+            group = crowded[i:i + SLUG_PREFIXES_PER_QUERY]
+            prefixes = Q(*[Q(slug__startswith=f'{base}-') for base in group], _connector=Q.OR)
+            taken.update(Project.objects.filter(prefixes).values_list('slug', flat=True))
+        slugs = []
+        for base in bases:
+            slug, counter = base, 1
+            while slug in taken:
+                slug = f'{base}-{counter}'
+                counter += 1
+            taken.add(slug)
+            slugs.append(slug)
+        return slugs
@@ -0,0 +1,327 @@
+import asyncio
+import json
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from projects.models import Project
+
+User = get_user_model()
+
+DEFAULT_MIX = 'home=3,search=3,paginate=2,detail=6,donate=1,comment=1,rate=1'
+WRITE_ACTIONS = ('donate', 'comment', 'rate')
+LOCKED = re.compile(rb'database (table )?is locked')
+
+
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1000 if samples else 0.0
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Session:
+    """One virtual user's keep-alive HTTP/1.1 connection and cookie jar (stdlib asyncio only)."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+        self.cookies = {}
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def request(self, method, path, data=None):
+        body = urlencode(data).encode() if data is not None else b''
+        headers = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Connection: keep-alive',
+                   'Accept-Encoding: identity']
+        if self.cookies:
+            headers.append('Cookie: ' + '; '.join(f'{k}={v}' for k, v in self.cookies.items()))
+        if method == 'POST':
+            headers += ['Content-Type: application/x-www-form-urlencoded',
+                        f'X-CSRFToken: {self.cookies.get("csrftoken", "")}']
+        headers.append(f'Content-Length: {len(body)}')
+        raw = ('\r\n'.join(headers) + '\r\n\r\n').encode() + body
+        for attempt in (1, 2):
+            fresh = self.writer is None
+            if fresh:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                self.writer.write(raw)
+                await self.writer.drain()
+                return await self._response()
+            except (ConnectionError, asyncio.IncompleteReadError, HTTPError):
+                await self.close()
+                # A kept-alive connection the server has already closed: retry once on a new one
+                if fresh or attempt == 2:
+                    raise
+
+    async def _response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise HTTPError('connection closed')
+        status = int(status_line.split()[1])
+        headers = defaultdict(list)
+        while (line := await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()].append(value.strip())
+        if 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length'][0]))
+        elif 'chunked' in headers.get('transfer-encoding', [''])[0]:
+            body = b''
+            while size := int((await self.reader.readline()).split(b';')[0], 16):
+                body += await self.reader.readexactly(size)
+                await self.reader.readline()
+            await self.reader.readline()
+        else:
+            body = await self.reader.read()
+            headers['connection'] = ['close']
+        for cookie in headers.get('set-cookie', []):
+            name, _, value = cookie.split(';')[0].partition('=')
+            self.cookies[name.strip()] = value.strip()
+        if headers.get('connection', [''])[0].lower() == 'close':
+            await self.close()
+        return status, headers, body
+
+
+class Recorder:
+    def __init__(self):
+        self.stage = 0
+        self.samples = defaultdict(list)         # url name -> latencies
+        self.stage_samples = defaultdict(list)   # stage -> latencies
+        self.errors = defaultdict(int)
+        self.stage_errors = defaultdict(int)
+        self.locked = 0
+
+    def record(self, name, elapsed, ok, body=b''):
+        self.samples[name].append(elapsed)
+        self.stage_samples[self.stage].append(elapsed)
+        if not ok:
+            self.errors[name] += 1
+            self.stage_errors[self.stage] += 1
+            if LOCKED.search(body):
+                self.locked += 1
+
+
+class Command(BaseCommand):
+    help = ("End-to-end load test: virtual users browse home, search and paginate the project list, open "
+            "projects, log in, donate, comment and rate against a locally started server (or --url), "
+            "through a concurrency ramp. Reports throughput, p50/p95/p99 per URL name, errors and "
+            "'database is locked' errors. Write actions change the database: run it against a copy.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Target an already running server instead of starting runserver')
+        parser.add_argument('--stages', default='10:20,25:20,50:20',
+                            help='Concurrency ramp as users:seconds pairs, e.g. 10:30,50:60')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help='Action weights (home, search, paginate, detail, '
+                                                               'donate, comment, rate)')
+        parser.add_argument('--think', type=float, default=1.0,
+                            help='Mean think time between actions in seconds (exponential; 0 = none)')
+        parser.add_argument('--password', default='password123', help='Password of the accounts used to log in '
+                                                                      '(the seed command default)')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            self.stages = [(int(users), float(seconds)) for users, seconds in
+                           (stage.split(':') for stage in options['stages'].split(','))]
+            self.mix = {name: float(weight) for name, weight in
+                        (item.split('=') for item in options['mix'].split(','))}
+        except ValueError:
+            raise CommandError('--stages takes users:seconds pairs and --mix name=weight pairs')
+        unknown = set(self.mix) - set(DEFAULT_MIX.replace('=', ',').split(',')[::2])
+        if unknown:
+            raise CommandError(f'Unknown actions in --mix: {", ".join(sorted(unknown))}')
+        self.think = options['think']
+        self.as_json = options['json']
+        self.password = options['password']
+
+        # Test data comes from the database up front, so the journeys themselves are pure HTTP
+        self.slugs = list(Project.objects.active().values_list('slug', flat=True)[:500])
+        if not self.slugs:
+            raise CommandError('No active projects; run the seed command first.')
+        self.words = sorted({word for title in Project.objects.active().values_list('title', flat=True)[:500]
+                             for word in title.split() if len(word) > 3}) or ['project']
+        self.emails = []
+        if any(self.mix.get(action) for action in WRITE_ACTIONS):
+            self.emails = list(User.objects.filter(is_active=True, is_superuser=False)
+                               .exclude(email='').values_list('email', flat=True)[:1000])
+            if not self.emails:
+                raise CommandError('Write actions need active accounts; run the seed command first.')
+
+        server, self.server_locked = None, 0
+        if options['url']:
+            parts = urlsplit(options['url'])
+            self.host, self.port = parts.hostname, parts.port or 80
+        else:
+            server = self.start_server()
+        try:
+            recorder = asyncio.run(self.run())
+        finally:
+            if server:
+                server.terminate()
+                server.wait(timeout=10)
+        self.report(recorder)
+
+    # Server
+
+    def start_server(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.host, self.port = '127.0.0.1', sock.getsockname()[1]
+        server = subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'runserver', f'{self.host}:{self.port}',
+             '--noreload'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+
+        def watch():
+            # Tracebacks are logged here even when DEBUG hides them from the response
+            for line in server.stderr:
+                if LOCKED.search(line):
+                    self.server_locked += 1
+        threading.Thread(target=watch, daemon=True).start()
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('runserver exited during startup')
+            try:
+                socket.create_connection((self.host, self.port), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError('runserver did not start within 30s')
+
+    # Journeys
+
+    async def timed(self, recorder, name, session, method, path, expect, data=None):
+        started = time.perf_counter()
+        try:
+            status, headers, body = await session.request(method, path, data)
+        except (OSError, HTTPError, asyncio.IncompleteReadError) as exc:
+            recorder.record(name, time.perf_counter() - started, False)
+            return None, str(exc).encode()
+        # A redirect to the login page means the session was lost, not that the action succeeded
+        to_login = headers.get('location', [''])[0].startswith(settings.LOGIN_URL)
+        recorder.record(name, time.perf_counter() - started, status in expect and not to_login, body)
+        return status, body
+
+    async def login(self, recorder, session, email):
+        await self.timed(recorder, 'login_form', session, 'GET', '/accounts/login/', (200,))
+        status, _ = await self.timed(recorder, 'login', session, 'POST', '/accounts/login/', (302,),
+                                     {'email': email, 'password': self.password})
+        return status == 302
+
+    async def action(self, recorder, session, name):
+        slug = random.choice(self.slugs)
+        if name == 'home':
+            await self.timed(recorder, 'home', session, 'GET', '/', (200,))
+        elif name == 'search':
+            query = urlencode({'q': random.choice(self.words)})
+            await self.timed(recorder, 'project_list', session, 'GET', f'/projects/?{query}', (200,))
+        elif name == 'paginate':
+            page = random.randint(1, 3)
+            await self.timed(recorder, 'project_list_page', session, 'GET', f'/projects/?page={page}', (200,))
+        elif name == 'detail':
+            await self.timed(recorder, 'project_detail', session, 'GET', f'/projects/{slug}/', (200,))
+        elif name == 'donate':
+            await self.timed(recorder, 'donate', session, 'POST', f'/projects/{slug}/donate/', (302,),
+                             {'amount': random.choice(['5', '10', '25', '50'])})
+        elif name == 'comment':
+            await self.timed(recorder, 'add_comment', session, 'POST', f'/projects/{slug}/comment/', (302,),
+                             {'content': 'Load test comment'})
+        elif name == 'rate':
+            await self.timed(recorder, 'rate_project', session, 'POST', f'/projects/{slug}/rate/', (302,),
+                             {'value': random.randint(1, 5)})
+
+    async def user(self, number, recorder):
+        session = Session(self.host, self.port)
+        names, weights = zip(*[(name, weight) for name, weight in self.mix.items() if weight > 0])
+        try:
+            await asyncio.sleep(random.uniform(0, self.think))
+            logged_in = not self.emails or await self.login(recorder, session, self.emails[number % len(self.emails)])
+            while number < self.target:
+                name = random.choices(names, weights)[0]
+                if name in WRITE_ACTIONS and not logged_in:
+                    name = 'detail'
+                await self.action(recorder, session, name)
+                if self.think:
+                    await asyncio.sleep(random.expovariate(1 / self.think))
+        finally:
+            await session.close()
+
+    async def run(self):
+        recorder = Recorder()
+        tasks = {}
+        self.stage_results = []
+        for index, (users, seconds) in enumerate(self.stages):
+            recorder.stage = index
+            # Users numbered at or above the target finish their current action and leave
+            self.target = users
+            for number in range(users):
+                if number not in tasks or tasks[number].done():
+                    tasks[number] = asyncio.create_task(self.user(number, recorder))
+            started = time.perf_counter()
+            await asyncio.sleep(seconds)
+            elapsed = time.perf_counter() - started
+            self.stage_results.append((users, elapsed))
+            if not self.as_json:
+                self.stdout.write(f'  stage {index + 1}: {users} users, '
+                                  f'{len(recorder.stage_samples[index]) / elapsed:.1f} req/s')
+        # Requests still in flight when the last stage ends are not counted
+        recorder.stage = len(self.stages)
+        self.target = 0
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return recorder
+
+    # Report
+
+    def report(self, recorder):
+        stages = []
+        for index, (users, elapsed) in enumerate(self.stage_results):
+            samples = sorted(recorder.stage_samples[index])
+            stages.append({
+                'users': users, 'requests': len(samples), 'rps': round(len(samples) / elapsed, 1),
+                'p95_ms': round(percentile(samples, 95), 1),
+                'error_pct': round(100 * recorder.stage_errors[index] / len(samples), 2) if samples else 0.0,
+            })
+        total_time = sum(elapsed for _, elapsed in self.stage_results)
+        urls = {}
+        for name, samples in sorted(recorder.samples.items()):
+            samples = sorted(samples)
+            urls[name] = {
+                'requests': len(samples), 'rps': round(len(samples) / total_time, 1),
+                'p50_ms': round(percentile(samples, 50), 1), 'p95_ms': round(percentile(samples, 95), 1),
+                'p99_ms': round(percentile(samples, 99), 1), 'errors': recorder.errors[name],
+                'error_pct': round(100 * recorder.errors[name] / len(samples), 2),
+            }
+        locked = max(recorder.locked, self.server_locked)
+        if self.as_json:
+            self.stdout.write(json.dumps({'stages': stages, 'urls': urls, 'locked_errors': locked}))
+            return
+
+        self.stdout.write(f"\n{'users':>6} | {'requests':>8} | {'req/s':>7} | {'p95 ms':>7} | {'errors %':>8}")
+        for stage in stages:
+            self.stdout.write(f"{stage['users']:>6} | {stage['requests']:>8} | {stage['rps']:>7} | "
+                              f"{stage['p95_ms']:>7} | {stage['error_pct']:>8}")
+        self.stdout.write(f"\n{'url name':<18} | {'requests':>8} | {'req/s':>6} | {'p50 ms':>7} | {'p95 ms':>7} | "
+                          f"{'p99 ms':>7} | {'errors':>6}")
+        for name, row in urls.items():
+            self.stdout.write(f"{name:<18} | {row['requests']:>8} | {row['rps']:>6} | {row['p50_ms']:>7} | "
+                              f"{row['p95_ms']:>7} | {row['p99_ms']:>7} | {row['errors']:>6}")
+        summary = f'\n"database is locked" errors: {locked}'
+        self.stdout.write(self.style.WARNING(summary) if locked else summary)
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.http import Http404
+from crowedfunding import profiling
+
+
+class Command(BaseCommand):
+    help = ("List the request profiles recorded by the staff profiler (?_profile=1), "
+            "or show one profile's top functions and slowest queries.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile_id', nargs='?', help='Profile to show (default: list recent profiles)')
+        parser.add_argument('--limit', type=int, default=25, help='Profiles listed, or functions shown')
+        parser.add_argument('--sort', choices=profiling.SORTS, default='cumulative', help='Function table order')
+
+    def handle(self, *args, **options):
+        if options['profile_id']:
+            self.show(options['profile_id'], options['sort'], options['limit'])
+            return
+        profiles = profiling.recent(options['limit'])
+        if not profiles:
+            self.stdout.write('No profiles recorded.')
+            return
+        self.stdout.write(f"{'id':<22} {'status':>6} {'wall ms':>9} {'sql':>5} {'sql ms':>8} "
+                          f"{'tmpl ms':>8} {'orm ms':>8} {'py ms':>8}  request")
+        for p in profiles:
+            split = p['split_ms']
+            self.stdout.write(f"{p['id']:<22} {p['status']:>6} {p['wall_ms']:>9} {p['sql_count']:>5} {p['sql_ms']:>8} "
+                              f"{split['templates']:>8} {split['orm']:>8} {split['python']:>8}  "
+                              f"{p['method']} {p['path']} ({p['view']})")
+
+    def show(self, profile_id, sort, limit):
+        try:
+            profile = profiling.load(profile_id)
+            functions = profiling.top_functions(profile_id, sort, limit)
+        except Http404:
+            raise CommandError(f'No profile {profile_id!r}')
+        split = profile['split_ms']
+        self.stdout.write(f"{profile['method']} {profile['path']} -> {profile['status']} ({profile['view']}) "
+                          f"by {profile['user']} at {profile['started_at']}")
+        self.stdout.write(f"wall {profile['wall_ms']} ms, cpu {profile['cpu_ms']} ms, "
+                          f"{profile['sql_count']} queries in {profile['sql_ms']} ms; own time: templates "
+                          f"{split['templates']} ms, ORM/db {split['orm']} ms, other Python {split['python']} ms\n")
+        self.stdout.write(f"{'calls':>10} {'own ms':>9} {'cum ms':>9}  {'area':<9} function")
+        for row in functions:
+            self.stdout.write(f"{row['calls']!s:>10} {row['tottime_ms']:>9} {row['cumtime_ms']:>9}  "
+                              f"{row['bucket']:<9} {row['function']}")
+        slowest = sorted(profile['sql'], key=lambda query: -query['ms'])[:5]
+        if slowest:
+            self.stdout.write('\nslowest queries:')
+            for query in slowest:
+                self.stdout.write(f"  {query['ms']:>8} ms  {query['sql'][:200]}")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from projects.models import Project, Comment
+from .rebuild_leaderboards import id_chunks
+
+
+def _count(field):
+    return Coalesce(Subquery(Comment.objects.filter(**{field: OuterRef('pk')})
+                             .order_by().values(field).annotate(n=Count('id')).values('n')), 0)
+
+
+class Command(BaseCommand):
+    help = "Recount Project.comment_count and Comment.reply_count from the comment table in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Projects recounted per transaction')
+
+    def handle(self, *args, **options):
+        size = max(1, options['chunk_size'])
+        done = 0
+        for ids in id_chunks(Project.objects.all(), size):
+            with transaction.atomic():
+                Project.objects.filter(pk__in=ids).update(comment_count=_count('project'))
+                Comment.objects.filter(project_id__in=ids).update(reply_count=_count('parent'))
+            done += len(ids)
+            self.stdout.write(f'  {done} projects done')
+        self.stdout.write(self.style.SUCCESS(f'Comment counters rebuilt for {done} projects'))
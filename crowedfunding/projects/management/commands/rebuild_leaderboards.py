@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum, Count
+from projects.models import Project, Donation, DonorTotal, DonorGlobalTotal, ArchivedDonation
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+
+def id_chunks(queryset, size):
+    """Yield lists of primary keys in ascending order, ``size`` at a time (keyset pagination)."""
+    last = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True)[:size])
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def merge_totals(groupings):
+    """Sum amount and count per group over several ``values(...)`` querysets (hot and archived donations)."""
+    totals = {}
+    for grouping in groupings:
+        for row in grouping.annotate(total=Sum('amount'), n=Count('id')).order_by():
+            key = tuple(value for field, value in row.items() if field not in ('total', 'n'))
+            amount, n = totals.get(key, (0, 0))
+            totals[key] = (amount + row['total'], n + row['n'])
+    return totals
+
+
+class Command(BaseCommand):
+    help = "Regenerate the donor leaderboard tables (DonorTotal, DonorGlobalTotal) from the donation history (live and archived) in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Projects (or users) aggregated per transaction')
+
+    def handle(self, *args, **options):
+        size = max(1, options['chunk_size'])
+
+        per_project = 0
+        for ids in id_chunks(Project.objects.all(), size):
+            totals = merge_totals(
+                model.objects.filter(project_id__in=ids).values('user_id', 'project_id')
+                for model in (Donation, ArchivedDonation)
+            )
+            with transaction.atomic():
+                DonorTotal.objects.filter(project_id__in=ids).delete()
+                DonorTotal.objects.bulk_create(
+                    DonorTotal(user_id=user_id, project_id=project_id, amount=amount, count=n)
+                    for (user_id, project_id), (amount, n) in totals.items()
+                )
+            per_project += len(ids)
+            self.stdout.write(f'  project totals: {per_project} projects done')
+
+        per_user = 0
+        for ids in id_chunks(User.objects.all(), size):
+            totals = merge_totals(
+                model.objects.filter(user_id__in=ids).values('user_id')
+                for model in (Donation, ArchivedDonation)
+            )
+            with transaction.atomic():
+                DonorGlobalTotal.objects.filter(user_id__in=ids).delete()
+                DonorGlobalTotal.objects.bulk_create(
+                    DonorGlobalTotal(user_id=user_id, amount=amount, count=n)
+                    for (user_id,), (amount, n) in totals.items()
+                )
+            per_user += len(ids)
+            self.stdout.write(f'  global totals: {per_user} users done')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Leaderboards rebuilt: {DonorTotal.objects.count()} project rows, "
+            f"{DonorGlobalTotal.objects.count()} user rows"
+        ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from projects.models import Project, Donation
+from projects.management.commands.rebuild_leaderboards import id_chunks
+from projects import trending
+
+
+class Command(BaseCommand):
+    help = "Recompute every project's decayed trending score by replaying its donation history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Projects replayed per transaction')
+
+    def handle(self, *args, **options):
+        size = max(1, options['chunk_size'])
+        done = 0
+        for ids in id_chunks(Project.objects.all(), size):
+            state = {pk: (0.0, None, None) for pk in ids}
+            history = (Donation.objects.filter(project_id__in=ids)
+                       .order_by('project_id', 'donated_at')
+                       .values_list('project_id', 'amount', 'donated_at'))
+            for project_id, amount, at in history.iterator(chunk_size=2000):
+                score, updated_at, _ = state[project_id]
+                score, rank = trending.fold(score, updated_at, amount, at)
+                state[project_id] = (score, at, rank)
+
+            projects = [
+                Project(pk=pk, trending_score=score, trending_updated_at=at, trending_rank=rank)
+                for pk, (score, at, rank) in state.items()
+            ]
+            with transaction.atomic():
+                Project.objects.bulk_update(projects, ['trending_score', 'trending_updated_at', 'trending_rank'])
+            done += len(ids)
+            self.stdout.write(f'  {done} projects replayed')
+
+        self.stdout.write(self.style.SUCCESS(f'Trending scores rebuilt for {done} projects'))
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.1 on 2026-10-18 22:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_totals(apps, schema_editor):
+    # Same aggregation as rebuild_leaderboards: without it forget() would decrement rows that never
+    # counted the donations made before the upgrade
+    Donation = apps.get_model('projects', 'Donation')
+    DonorTotal = apps.get_model('projects', 'DonorTotal')
+    DonorGlobalTotal = apps.get_model('projects', 'DonorGlobalTotal')
+    pairs = Donation.objects.values('user_id', 'project_id').annotate(total=Sum('amount'), n=Count('id')).order_by()
+    DonorTotal.objects.bulk_create(
+        (DonorTotal(user_id=row['user_id'], project_id=row['project_id'], amount=row['total'], count=row['n'])
+         for row in pairs.iterator()), batch_size=500)
+    users = Donation.objects.values('user_id').annotate(total=Sum('amount'), n=Count('id')).order_by()
+    DonorGlobalTotal.objects.bulk_create(
+        (DonorGlobalTotal(user_id=row['user_id'], amount=row['total'], count=row['n']) for row in users.iterator()),
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('projects', '0002_alter_donation_unique_together_project_slug_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DonorGlobalTotal',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='donor_global_total', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-amount'], name='donorglobal_amount_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DonorTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='donor_totals', to='projects.project')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='donor_totals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project', '-amount'], name='donortotal_project_amount_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'project'), name='donortotal_user_project_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
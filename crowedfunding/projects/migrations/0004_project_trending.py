@@ -0,0 +1,54 @@
+# Generated by Django 5.1.1 on 2026-10-18 22:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+from projects import trending
+
+
+def replay_donations(apps, schema_editor):
+    # What rebuild_trending does, so existing projects rank by their donation history right after deploy
+    Project = apps.get_model('projects', 'Project')
+    Donation = apps.get_model('projects', 'Donation')
+    state = {}
+    history = Donation.objects.order_by('project_id', 'donated_at').values_list('project_id', 'amount', 'donated_at')
+    for project_id, amount, at in history.iterator(chunk_size=2000):
+        score, updated_at, _ = state.get(project_id, (0.0, None, None))
+        score, rank = trending.fold(score, updated_at, amount, at)
+        state[project_id] = (score, at, rank)
+    Project.objects.bulk_update(
+        [Project(pk=pk, trending_score=score, trending_updated_at=at, trending_rank=rank)
+         for pk, (score, at, rank) in state.items()],
+        ['trending_score', 'trending_updated_at', 'trending_rank'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_donor_leaderboards'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='trending_rank',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='trending_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='trending_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['-trending_rank'], name='project_trending_idx'),
+        ),
+        migrations.RunPython(replay_donations, migrations.RunPython.noop),
+    ]
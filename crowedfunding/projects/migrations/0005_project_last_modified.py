@@ -0,0 +1,25 @@
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def start_from_created_at(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    Project.objects.update(last_modified=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_project_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='last_modified',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(start_from_created_at, migrations.RunPython.noop),
+    ]
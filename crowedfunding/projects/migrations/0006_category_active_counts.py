@@ -0,0 +1,40 @@
+# Generated by Django 5.1.1 on 2026-10-18 23:18
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def count_active_projects(apps, schema_editor):
+    Category = apps.get_model('projects', 'Category')
+    Project = apps.get_model('projects', 'Project')
+    Project.objects.filter(is_cancelled=False, end_time__gt=timezone.now()).update(counted_active=True)
+    counted = (Project.objects.filter(counted_active=True, category=OuterRef('pk'))
+               .order_by().values('category').annotate(n=Count('id')).values('n'))
+    Category.objects.update(active_project_count=Coalesce(Subquery(counted), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_project_last_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='active_project_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='counted_active',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['counted_active', 'end_time'], name='project_counted_end_idx'),
+        ),
+        migrations.RunPython(count_active_projects, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.1.1 on 2026-10-18 23:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0007_project_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='archived_comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='archived_donation_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='archived_raised',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='archived_rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='archived_rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ArchivedComment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('project_id', models.IntegerField()),
+                ('user_id', models.IntegerField(db_index=True)),
+                ('parent_id', models.BigIntegerField(blank=True, null=True)),
+                ('content', models.TextField()),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project_id', '-created_at'], name='archcomment_project_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedDonation',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('project_id', models.IntegerField()),
+                ('user_id', models.IntegerField(db_index=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('donated_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project_id', '-donated_at'], name='archdonation_project_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedRating',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('project_id', models.IntegerField()),
+                ('user_id', models.IntegerField(db_index=True)),
+                ('value', models.IntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project_id', 'user_id'], name='archrating_project_user_idx')],
+            },
+        ),
+    ]
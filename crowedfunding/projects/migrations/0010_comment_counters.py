@@ -0,0 +1,38 @@
+# Generated by Django 5.1.1 on 2026-10-18 23:46
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_comments(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    Comment = apps.get_model('projects', 'Comment')
+    comments = (Comment.objects.filter(project=OuterRef('pk'))
+                .order_by().values('project').annotate(n=Count('id')).values('n'))
+    replies = (Comment.objects.filter(parent=OuterRef('pk'))
+               .order_by().values('parent').annotate(n=Count('id')).values('n'))
+    Project.objects.update(comment_count=Coalesce(Subquery(comments), 0))
+    # Every comment, as rebuild_comment_counts does: replies to replies are counted too
+    Comment.objects.update(reply_count=Coalesce(Subquery(replies), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0009_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+    ]
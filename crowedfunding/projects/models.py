@@ -1,6 +1,10 @@
-from django.db import models
+from decimal import Decimal
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, OuterRef, Subquery, Sum, Count
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -8,6 +12,9 @@ class Category(models.Model):
     # Indexed for faster filtering/grouping by category name in listings & admin
     name = models.CharField(max_length=100, db_index=True)
     description = models.TextField(blank=True)
+    # Projects currently flagged Project.counted_active; maintained by projects.signals,
+    # the account deletion job and expire_projects, read via projects.categories.category_menu()
+    active_project_count = models.PositiveIntegerField(default=0, editable=False)
     
     def __str__(self):
         return self.name
@@ -18,6 +25,42 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+def _related_aggregate(model, expression, default=None):
+    """Correlated subquery aggregating ``model`` rows that belong to the outer project."""
+    subquery = Subquery(
+        model.objects.filter(project=OuterRef('pk'))
+        .order_by()
+        .values('project')
+        .annotate(value=expression)
+        .values('value')
+    )
+    return Coalesce(subquery, default) if default is not None else subquery
+
+class ProjectQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(is_cancelled=False, end_time__gt=timezone.now())
+
+    def with_raised(self):
+        # Subqueries (not joins) so several aggregates can be combined without row multiplication
+        return self.annotate(
+            raised_total=_related_aggregate(Donation, Sum('amount'), Decimal(0)) + F('archived_raised'))
+
+    def trending(self):
+        return self.order_by(models.F('trending_rank').desc(nulls_last=True), '-created_at')
+
+    def touch(self):
+        """Mark the matched projects as changed (see Project.last_modified) without a save()."""
+        return self.update(last_modified=timezone.now())
+
+    def with_stats(self):
+        rating_count = _related_aggregate(Rating, Count('id'), 0) + F('archived_rating_count')
+        rating_sum = _related_aggregate(Rating, Sum('value'), 0) + F('archived_rating_sum')
+        return self.with_raised().annotate(
+            donation_count=_related_aggregate(Donation, Count('id'), 0) + F('archived_donation_count'),
+            avg_rating=Cast(rating_sum, models.FloatField()) / NullIf(rating_count, 0),
+            rating_count=rating_count,
+        )
+
 class Project(models.Model):
     title = models.CharField(max_length=200)
     details = models.TextField()
@@ -31,13 +74,39 @@ class Project(models.Model):
     is_cancelled = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     slug = models.SlugField(max_length=220, unique=True, blank=True)
+    # Decayed donation momentum, maintained per donation by projects.trending
+    trending_score = models.FloatField(default=0)
+    trending_updated_at = models.DateTimeField(null=True, blank=True)
+    trending_rank = models.FloatField(null=True, blank=True, editable=False)
+    # Anything shown on the detail page or a listing card changed: the project itself
+    # (auto_now) or, via projects.signals, its donations, comments, ratings and pictures.
+    # Drives the conditional-GET ETags in projects.views.
+    last_modified = models.DateTimeField(auto_now=True)
+    # Whether the project is included in its category's active_project_count; set on save
+    # and cleared by the expire_projects sweep once end_time passes
+    counted_active = models.BooleanField(default=False, editable=False)
+    # Set by archive_campaigns once the project's donations, ratings and comments have moved to
+    # the archive tables (projects.archive); the archived_* totals are added to the live aggregates
+    archived_at = models.DateTimeField(null=True, blank=True, editable=False)
+    archived_raised = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    archived_donation_count = models.PositiveIntegerField(default=0, editable=False)
+    archived_rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    archived_rating_count = models.PositiveIntegerField(default=0, editable=False)
+    archived_comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # Comments and replies still in the hot table; maintained by projects.signals and archive_project
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ProjectQuerySet.as_manager()
     
     def __str__(self):
         return self.title
     
     @property
     def total_donations(self):
-        return self.donations.aggregate(total=models.Sum('amount'))['total'] or 0
+        # Listing/detail querysets annotate ``raised_total`` (see ProjectQuerySet) to skip the per-row aggregate
+        if 'raised_total' in self.__dict__:
+            return self.raised_total or 0
+        return (self.donations.aggregate(total=models.Sum('amount'))['total'] or 0) + self.archived_raised
     
     @property
     def donation_percentage(self):
@@ -47,8 +116,15 @@ class Project(models.Model):
     
     @property
     def average_rating(self):
-        avg = self.ratings.aggregate(avg_rating=models.Avg('value'))['avg_rating']
-        return avg if avg else 0
+        if 'avg_rating' in self.__dict__:
+            return self.avg_rating or 0
+        live = self.ratings.aggregate(total=models.Sum('value'), count=models.Count('id'))
+        count = live['count'] + self.archived_rating_count
+        return ((live['total'] or 0) + self.archived_rating_sum) / count if count else 0
+
+    @property
+    def total_comments(self):
+        return self.comment_count + self.archived_comment_count
 
     def clean(self):
         from django.core.exceptions import ValidationError
@@ -76,7 +152,11 @@ class Project(models.Model):
         ]
         indexes = [
             # Speeds up queries filtering active/cancelled and ordering or filtering by end_time
-            models.Index(fields=['is_cancelled', 'end_time'], name='project_cancel_end_idx')
+            models.Index(fields=['is_cancelled', 'end_time'], name='project_cancel_end_idx'),
+            # "Trending" section and ?sort=trending read projects in rank order
+            models.Index(fields=['-trending_rank'], name='project_trending_idx'),
+            # expire_projects finds counted projects whose end_time has passed
+            models.Index(fields=['counted_active', 'end_time'], name='project_counted_end_idx'),
         ]
 
 class ProjectPicture(models.Model):
@@ -95,16 +175,97 @@ class Donation(models.Model):
     def __str__(self):
         return f"{self.user.email} donated {self.amount} to {self.project.title}"
 
+def _upsert_increment(model, lookup, amount, count=1):
+    """Add ``amount``/``count`` to the row matching ``lookup``, inserting it if missing.
+
+    Returns True when the row was inserted.
+    """
+    delta = {'amount': F('amount') + amount, 'count': F('count') + count}
+    if model.objects.filter(**lookup).update(**delta):
+        return False
+    try:
+        with transaction.atomic():
+            model.objects.create(amount=amount, count=count, **lookup)
+        return True
+    except IntegrityError:
+        # Lost the insert race to a concurrent donation; the row exists now
+        model.objects.filter(**lookup).update(**delta)
+        return False
+
+class DonorTotal(models.Model):
+    """Running donation total per (user, project); backs the per-project "top backers" list."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='donor_totals')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='donor_totals')
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'project'], name='donortotal_user_project_uniq')
+        ]
+        indexes = [
+            # Top-N per project is a single range read in amount order
+            models.Index(fields=['project', '-amount'], name='donortotal_project_amount_idx')
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} gave {self.amount} to {self.project.title}"
+
+    @classmethod
+    def record(cls, donation):
+        """Add the donation to the running totals; returns True for the donor's first gift to the project."""
+        first = _upsert_increment(cls, {'user_id': donation.user_id, 'project_id': donation.project_id}, donation.amount)
+        _upsert_increment(DonorGlobalTotal, {'user_id': donation.user_id}, donation.amount)
+        return first
+
+    @classmethod
+    def forget(cls, donation):
+        """Remove the donation from the running totals; returns True if the donor no longer backs the project."""
+        pair = cls.objects.filter(user_id=donation.user_id, project_id=donation.project_id)
+        pair.update(amount=F('amount') - donation.amount, count=F('count') - 1)
+        DonorGlobalTotal.objects.filter(user_id=donation.user_id).update(
+            amount=F('amount') - donation.amount, count=F('count') - 1)
+        return not pair.filter(count__gt=0).exists()
+
+    @classmethod
+    def top_for_project(cls, project, limit=5):
+        return cls.objects.filter(project=project, count__gt=0).select_related('user').order_by('-amount')[:limit]
+
+class DonorGlobalTotal(models.Model):
+    """Running donation total per user across all projects; backs the site-wide leaderboard."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='donor_global_total')
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-amount'], name='donorglobal_amount_idx')
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} gave {self.amount} in total"
+
+    @classmethod
+    def top(cls, limit=5):
+        return cls.objects.filter(count__gt=0).select_related('user').order_by('-amount')[:limit]
+
 class Comment(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    # Direct replies, maintained by projects.signals
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
     
     def __str__(self):
         return f"Comment by {self.user.email} on {self.project.title}"
 
+    @property
+    def more_replies(self):
+        """Replies left out of the ``reply_preview`` list the detail page prefetches."""
+        return self.reply_count - len(getattr(self, 'reply_preview', ()))
+
 class Rating(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='ratings')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ratings')
@@ -133,4 +294,95 @@ class Report(models.Model):
         if self.report_type == 'project':
             return f"Report on {self.project.title} by {self.user.email}"
         else:
-            return f"Report on comment by {self.user.email}"
\ No newline at end of file
+            return f"Report on comment by {self.user.email}"
+
+class ProjectImport(models.Model):
+    """Checkpoint of an ``import_projects`` run: rows consumed so far, committed with each batch."""
+    source = models.CharField(max_length=255, unique=True)
+    position = models.PositiveIntegerField(default=0)
+    imported = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Import of {self.source} ({self.position} rows read)"
+
+class ArchivedDonation(models.Model):
+    """A Donation moved out of the hot table by archive_campaigns (same pk; plain ids, as the
+    archive tables may live in a separate database)."""
+    id = models.BigIntegerField(primary_key=True)
+    project_id = models.IntegerField()
+    user_id = models.IntegerField(db_index=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    donated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project_id', '-donated_at'], name='archdonation_project_idx'),
+        ]
+
+class ArchivedComment(models.Model):
+    """A Comment moved out of the hot table by archive_campaigns; ``parent_id`` points at another archived comment."""
+    id = models.BigIntegerField(primary_key=True)
+    project_id = models.IntegerField()
+    user_id = models.IntegerField(db_index=True)
+    parent_id = models.BigIntegerField(null=True, blank=True)
+    content = models.TextField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project_id', '-created_at'], name='archcomment_project_idx'),
+        ]
+
+class ArchivedRating(models.Model):
+    """A Rating moved out of the hot table by archive_campaigns."""
+    id = models.BigIntegerField(primary_key=True)
+    project_id = models.IntegerField()
+    user_id = models.IntegerField(db_index=True)
+    value = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project_id', 'user_id'], name='archrating_project_user_idx'),
+        ]
+
+class ProjectRecommendation(models.Model):
+    """Top-K "backers also supported" neighbours of a project, written by build_recommendations."""
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='recommended_by')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'recommended'], name='projectrec_pair_uniq')
+        ]
+        indexes = [
+            # A project's neighbours are one range read in score order
+            models.Index(fields=['project', '-score'], name='projectrec_project_score_idx')
+        ]
+
+class UserRecommendation(models.Model):
+    """Top-K projects recommended to a user from the projects they backed or rated."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recommendations')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='user_recommendations')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'project'], name='userrec_pair_uniq')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-score'], name='userrec_user_score_idx')
+        ]
+
+class RecommendationRun(models.Model):
+    """High-water marks of the last build_recommendations run (a single row)."""
+    last_donation_id = models.PositiveIntegerField(default=0)
+    last_rating_id = models.PositiveIntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Recommendations built up to donation {self.last_donation_id}"
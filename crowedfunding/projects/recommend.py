@@ -0,0 +1,231 @@
+"""
+Co-donation recommendations ("backers also supported").
+
+Donations and ratings, live and archived, form a sparse user x project
+matrix.  A donation weighs 1.0, a rating ``value / 5``, and the larger of
+the two is kept when a user did both.  Project-project similarity is the
+cosine between project columns, and a user's score for a project ``j`` is
+``sum_i w(user, i) * sim(i, j)`` over the projects ``i`` they interacted
+with.  ``build_recommendations`` keeps the top K of each row:
+``ProjectRecommendation`` for the detail page and ``UserRecommendation`` for
+the home page.  Only active projects are recommended, never one the user
+created or already supports.
+
+NumPy/SciPy are optional.  With them the rows are sparse matrix products;
+without them the same sums run over dicts, which is fine for development
+data.
+
+Incremental runs only recompute what donations and ratings newer than the
+``RecommendationRun`` watermarks can have changed.  A new interaction with
+project ``t`` changes ``t``'s column and so its similarity to every project
+sharing a backer with it: those projects' rows are rebuilt along with
+``t``'s, and so are the lists of everyone who backed or rated any of them.
+"""
+import heapq
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import (Project, Donation, Rating, ArchivedDonation, ArchivedRating,
+                     ProjectRecommendation, UserRecommendation, RecommendationRun)
+
+ROW_CHUNK = 500
+
+
+def _sparse_modules():
+    try:
+        import numpy
+        import scipy.sparse
+    except ImportError:  # optional: the dict backend computes the same rows
+        return None
+    return numpy, scipy.sparse
+
+
+def load_interactions():
+    """{(user_id, project_id): weight} over live and archived donations and ratings."""
+    weights = {}
+    for model in (Donation, ArchivedDonation):
+        for pair in model.objects.values_list('user_id', 'project_id').distinct().iterator(chunk_size=5000):
+            weights[pair] = 1.0
+    for model in (Rating, ArchivedRating):
+        for user_id, project_id, value in model.objects.values_list('user_id', 'project_id', 'value').iterator(chunk_size=5000):
+            weights[user_id, project_id] = max(weights.get((user_id, project_id), 0.0), value / 5)
+    return weights
+
+
+class DictBackend:
+    def __init__(self, weights):
+        self.by_user, self.by_item = defaultdict(dict), defaultdict(dict)
+        for (user_id, project_id), weight in weights.items():
+            self.by_user[user_id][project_id] = weight
+            self.by_item[project_id][user_id] = weight
+        self.norms = {item: math.sqrt(sum(w * w for w in users.values())) for item, users in self.by_item.items()}
+        self._rows = {}
+
+    def item_row(self, item):
+        if item not in self._rows:
+            dots = defaultdict(float)
+            for user_id, weight in self.by_item[item].items():
+                for other, other_weight in self.by_user[user_id].items():
+                    dots[other] += weight * other_weight
+            norm = self.norms[item]
+            self._rows[item] = {other: dot / (norm * self.norms[other]) for other, dot in dots.items() if other != item}
+        return self._rows[item]
+
+    def item_rows(self, items):
+        return {item: self.item_row(item) for item in items}
+
+    def user_rows(self, users):
+        rows = {}
+        for user_id in users:
+            scores = defaultdict(float)
+            for item, weight in self.by_user[user_id].items():
+                for other, similarity in self.item_row(item).items():
+                    scores[other] += weight * similarity
+            rows[user_id] = scores
+        return rows
+
+
+class SparseBackend:
+    def __init__(self, weights, np, sparse):
+        self.np = np
+        users = sorted({user_id for user_id, _ in weights})
+        items = sorted({project_id for _, project_id in weights})
+        self.user_index = {user_id: i for i, user_id in enumerate(users)}
+        self.item_index = {project_id: i for i, project_id in enumerate(items)}
+        self.items = np.array(items)
+        rows = [self.user_index[user_id] for user_id, _ in weights]
+        cols = [self.item_index[project_id] for _, project_id in weights]
+        matrix = sparse.csr_matrix((list(weights.values()), (rows, cols)), shape=(len(users), len(items)))
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+        self.matrix = matrix
+        self.normalized = (matrix @ sparse.diags(1 / norms)).tocsr()
+        self.normalized_t = self.normalized.T.tocsr()
+
+    def _rows(self, product, keys, exclude_self=False):
+        out = {}
+        for key, row in zip(keys, product):
+            row = row.tocoo()
+            out[key] = {int(self.items[col]): float(value) for col, value in zip(row.col, row.data)
+                        if not (exclude_self and self.items[col] == key)}
+        return out
+
+    def item_rows(self, items):
+        rows = [self.item_index[item] for item in items]
+        return self._rows(self.normalized_t[rows] @ self.normalized, items, exclude_self=True)
+
+    def user_rows(self, users):
+        rows = [self.user_index[user_id] for user_id in users]
+        # A[u] @ An^T @ An == sum_i w(u, i) * cos(i, j)
+        return self._rows((self.matrix[rows] @ self.normalized_t) @ self.normalized, users)
+
+
+def make_backend(weights):
+    modules = _sparse_modules()
+    if modules is None or not weights:
+        return DictBackend(weights)
+    return SparseBackend(weights, *modules)
+
+
+def _top(scores, exclude, candidates, k):
+    return heapq.nlargest(k, ((score, pk) for pk, score in scores.items()
+                              if pk in candidates and pk not in exclude and score > 0))
+
+
+class Builder:
+    def __init__(self, top_k=10, progress=None):
+        self.top_k = top_k
+        self.progress = progress or (lambda message: None)
+
+    def run(self, full=False):
+        run, _ = RecommendationRun.objects.get_or_create(pk=1)
+        # Watermarks first: activity arriving during the build is picked up next time
+        last_donation = Donation.objects.aggregate(n=Max('id'))['n'] or 0
+        last_rating = Rating.objects.aggregate(n=Max('id'))['n'] or 0
+
+        weights = load_interactions()
+        backend = make_backend(weights)
+        items_of, users_of = defaultdict(set), defaultdict(set)
+        for user_id, project_id in weights:
+            items_of[user_id].add(project_id)
+            users_of[project_id].add(user_id)
+        self.active = set(Project.objects.active().values_list('pk', flat=True))
+        self.creators = dict(Project.objects.filter(pk__in=self.active).values_list('pk', 'creator_id'))
+
+        if full or not (run.last_donation_id or run.last_rating_id):
+            items, users = set(users_of), set(items_of)
+        else:
+            touched = set(Donation.objects.filter(id__gt=run.last_donation_id, id__lte=last_donation)
+                          .values_list('project_id', flat=True))
+            touched |= set(Rating.objects.filter(id__gt=run.last_rating_id, id__lte=last_rating)
+                           .values_list('project_id', flat=True))
+            # The touched projects and their co-backed neighbours, then everyone who interacted with any of them
+            backers = set().union(*(users_of[pk] for pk in touched if pk in users_of))
+            items = set().union(*(items_of[user_id] for user_id in backers))
+            users = set().union(*(users_of[pk] for pk in items))
+        self.progress(f'{len(weights)} interactions; recomputing {len(items)} projects and {len(users)} users '
+                      f'({type(backend).__name__})')
+
+        self.write_items(backend, sorted(items))
+        self.write_users(backend, sorted(users), items_of)
+        if full:
+            # Rows of projects and users that no longer have any interactions
+            self.delete_stale(ProjectRecommendation, 'project_id', items)
+            self.delete_stale(UserRecommendation, 'user_id', users)
+
+        run.last_donation_id, run.last_rating_id = last_donation, last_rating
+        run.finished_at = timezone.now()
+        run.save()
+        return len(items), len(users)
+
+    def delete_stale(self, model, field, keep):
+        stale = sorted(set(model.objects.values_list(field, flat=True).distinct()) - keep)
+        for start in range(0, len(stale), ROW_CHUNK):
+            model.objects.filter(**{f'{field}__in': stale[start:start + ROW_CHUNK]}).delete()
+
+    def write_items(self, backend, items):
+        for start in range(0, len(items), ROW_CHUNK):
+            chunk = items[start:start + ROW_CHUNK]
+            rows = [
+                ProjectRecommendation(project_id=item, recommended_id=pk, score=score)
+                for item, scores in backend.item_rows(chunk).items()
+                for score, pk in _top(scores, (), self.active, self.top_k)
+            ]
+            with transaction.atomic():
+                ProjectRecommendation.objects.filter(project_id__in=chunk).delete()
+                ProjectRecommendation.objects.bulk_create(rows)
+                # The detail page shows these, so its conditional-GET ETag must change
+                Project.objects.filter(pk__in=chunk).touch()
+            self.progress(f'  projects: {start + len(chunk)}/{len(items)}')
+
+    def write_users(self, backend, users, items_of):
+        for start in range(0, len(users), ROW_CHUNK):
+            chunk = users[start:start + ROW_CHUNK]
+            rows = []
+            for user_id, scores in backend.user_rows(chunk).items():
+                own = {pk for pk, creator_id in self.creators.items() if creator_id == user_id}
+                rows += [UserRecommendation(user_id=user_id, project_id=pk, score=score)
+                         for score, pk in _top(scores, items_of[user_id] | own, self.active, self.top_k)]
+            with transaction.atomic():
+                UserRecommendation.objects.filter(user_id__in=chunk).delete()
+                UserRecommendation.objects.bulk_create(rows)
+            self.progress(f'  users: {start + len(chunk)}/{len(users)}')
+
+
+def for_project(project, limit=4):
+    """Active projects its backers also supported: one range read on (project, -score)."""
+    return (Project.objects.active()
+            .filter(recommended_by__project=project)
+            .order_by('-recommended_by__score')
+            .with_raised()[:limit])
+
+
+def for_user(user, limit=6):
+    return (Project.objects.active()
+            .filter(user_recommendations__user=user)
+            .order_by('-user_recommendations__score')
+            .with_raised()
+            .prefetch_related('pictures')[:limit])
@@ -0,0 +1,124 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from accounts.models import UserStats
+from .models import Category, Tag, Project, ProjectPicture, Donation, Comment, Rating, DonorTotal
+from . import cards, categories, trending, typeahead
+
+
+@receiver(post_save, sender=Donation)
+def donation_saved(sender, instance, created, **kwargs):
+    if created:
+        first_gift = DonorTotal.record(instance)
+        trending.record_donation(instance)
+        UserStats.bump(instance.user_id, total_donated=instance.amount, projects_backed=int(first_gift))
+        UserStats.bump(instance.project.creator_id, total_raised=instance.amount)
+        transaction.on_commit(lambda: typeahead.donation_added(instance.project_id, instance.amount))
+    Project.objects.filter(pk=instance.project_id).touch()
+    cards.invalidate(instance.project_id)
+
+
+@receiver(post_delete, sender=Donation)
+def donation_deleted(sender, instance, **kwargs):
+    stopped_backing = DonorTotal.forget(instance)
+    UserStats.bump(instance.user_id, create=False, total_donated=-instance.amount,
+                   projects_backed=-int(stopped_backing))
+    # The creator through a subquery: loading instance.project would cost a query per donation in cascades
+    creator = Project.objects.filter(pk=instance.project_id).values('creator_id')[:1]
+    UserStats.bump(creator, create=False, total_raised=-instance.amount)
+    Project.objects.filter(pk=instance.project_id).touch()
+    cards.invalidate(instance.project_id)
+
+
+@receiver(pre_save, sender=Project)
+def project_saving(sender, instance, **kwargs):
+    # What the row counted for before this save: the category may change or the project be cancelled
+    previous = None
+    if not instance._state.adding:
+        previous = Project.objects.filter(pk=instance.pk).values_list('category_id', 'counted_active').first()
+    instance._counted_before = previous if previous and previous[1] else None
+
+
+@receiver(post_save, sender=Project)
+def project_saved(sender, instance, created, **kwargs):
+    if created:
+        UserStats.bump(instance.creator_id, projects_created=1)
+    counted_before = getattr(instance, '_counted_before', None)
+    counted = categories.is_active(instance)
+    deltas = Counter()
+    if counted_before:
+        deltas[counted_before[0]] -= 1
+    if counted:
+        deltas[instance.category_id] += 1
+    categories.adjust(deltas)
+    if counted != bool(counted_before):
+        Project.objects.filter(pk=instance.pk).update(counted_active=counted)
+    instance.counted_active = counted
+    cards.invalidate(instance.pk)
+    transaction.on_commit(lambda: typeahead.project_changed(instance))
+
+
+@receiver(post_delete, sender=Project)
+def project_deleted(sender, instance, **kwargs):
+    UserStats.bump(instance.creator_id, create=False, projects_created=-1)
+    if instance.counted_active:
+        categories.adjust({instance.category_id: -1})
+    cards.invalidate(instance.pk)
+    project_id = instance.pk
+    transaction.on_commit(lambda: typeahead.project_deleted(project_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    categories.invalidate_menu()
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: typeahead.tag_changed(instance))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    tag_id = instance.pk
+    transaction.on_commit(lambda: typeahead.tag_deleted(tag_id))
+
+
+@receiver(post_save, sender=ProjectPicture)
+@receiver(post_delete, sender=ProjectPicture)
+def picture_changed(sender, instance, **kwargs):
+    Project.objects.filter(pk=instance.project_id).touch()
+    cards.invalidate(instance.project_id)
+
+
+def _count_comment(comment, delta):
+    Project.objects.filter(pk=comment.project_id).update(
+        comment_count=F('comment_count') + delta, last_modified=timezone.now())
+    if comment.parent_id:
+        Comment.objects.filter(pk=comment.parent_id).update(reply_count=F('reply_count') + delta)
+    cards.invalidate(comment.project_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        _count_comment(instance, 1)
+    else:
+        Project.objects.filter(pk=instance.project_id).touch()
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    _count_comment(instance, -1)
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def project_feedback_changed(sender, instance, **kwargs):
+    # Shown on the detail page only, so the cached cards stay valid
+    Project.objects.filter(pk=instance.project_id).touch()
@@ -0,0 +1,26 @@
+from django import template
+from django.utils.safestring import mark_safe
+from projects import cards
+
+register = template.Library()
+
+_PRIMED = 'project_cards'
+
+
+@register.simple_tag(takes_context=True)
+def prime_project_cards(context, projects, words=20, progress=True):
+    """Fetch (or render and store) every card of ``projects`` in one batch before the loop that shows them."""
+    primed = context.render_context.setdefault(_PRIMED, {})
+    kind = cards.variant(words, progress)
+    for pk, html in cards.render_cards(projects, words, progress).items():
+        primed[pk, kind] = html
+    return ''
+
+
+@register.simple_tag(takes_context=True)
+def project_card(context, project, words=20, progress=True):
+    """The cached card for ``project``; cards primed by prime_project_cards cost no cache round trip."""
+    html = context.render_context.get(_PRIMED, {}).get((project.pk, cards.variant(words, progress)))
+    if html is None:
+        html = cards.render_cards([project], words, progress)[project.pk]
+    return mark_safe(html)
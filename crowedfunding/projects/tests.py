@@ -1,3 +1,614 @@
-from django.test import TestCase
+import csv
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import UserStats
+from crowedfunding.query_budget import QueryBudgetTestCase, SMALL, LARGE
+from . import bulk, cards, categories, typeahead
+from .management.commands import import_projects
+from .models import (Category, Tag, Project, ProjectPicture, Donation, Comment, Rating, Report, DonorTotal,
+                     DonorGlobalTotal, ProjectImport, ArchivedDonation, ArchivedComment, ProjectRecommendation,
+                     UserRecommendation)
+
+
+class ProjectReadBudgets:
+    """Pages read by a logged-in member; the same budget holds for every fixture size."""
+
+    def test_project_list(self):
+        self.request(9, 'get', reverse('project_list'))
+
+    def test_project_list_filtered(self):
+        category, tag = self.data.categories[0], self.data.tags[0]
+        self.request(10, 'get', reverse('project_list'), {'q': 'Project', 'category': category.pk, 'tag': tag.pk})
+
+    def test_project_list_second_page(self):
+        self.request(9, 'get', reverse('project_list'), {'page': 2})
+
+    def test_project_detail(self):
+        response = self.request(16, 'get', reverse('project_detail', args=[self.data.projects[0].slug]))
+        self.assertContains(response, 'Backers Also Supported')
+
+    def test_project_detail_anonymous(self):
+        self.client.logout()
+        self.request(13, 'get', reverse('project_detail', args=[self.data.projects[0].slug]))
+
+    # The ASGI twins (ASYNC_VIEWS) run the same queries, some of them concurrently
+
+    def test_project_list_async(self):
+        self.request(9, 'get', reverse('project_list'), asynchronous=True)
+
+    def test_project_list_filtered_async(self):
+        category, tag = self.data.categories[0], self.data.tags[0]
+        self.request(10, 'get', reverse('project_list'), {'q': 'Project', 'category': category.pk, 'tag': tag.pk},
+                     asynchronous=True)
+
+    def test_project_detail_async(self):
+        response = self.request(16, 'get', reverse('project_detail', args=[self.data.projects[0].slug]),
+                                asynchronous=True)
+        self.assertContains(response, 'Backers Also Supported')
+
+    def test_project_detail_anonymous_async(self):
+        self.client.logout()
+        self.request(13, 'get', reverse('project_detail', args=[self.data.projects[0].slug]), asynchronous=True)
+
+    def test_comment_replies(self):
+        comment = Comment.objects.filter(project=self.data.projects[0], parent=None).first()
+        self.request(3, 'get', reverse('comment_replies', args=[self.data.projects[0].slug, comment.pk]))
+
+    def test_dashboard(self):
+        self.request(6, 'get', reverse('dashboard'))
+
+    def test_create_project_form(self):
+        self.request(3, 'get', reverse('create_project'))
+
+
+class ProjectWriteBudgets:
+    """Writes by ``visitor``, who has no history, so every fixture size takes the same paths."""
+
+    def as_visitor(self):
+        self.client.force_login(self.data.visitor)
+        return self.data.projects[0]
+
+    def test_donate(self):
+        project = self.as_visitor()
+        self.request(22, 'post', reverse('donate', args=[project.slug]), {'amount': '50'}, status=302)
+        self.assertTrue(Donation.objects.filter(project=project, user=self.data.visitor).exists())
+
+    def test_add_comment(self):
+        project = self.as_visitor()
+        self.request(7, 'post', reverse('add_comment', args=[project.slug]), {'content': 'Nice'}, status=302)
+        project.refresh_from_db()
+        self.assertEqual(project.comment_count, project.comments.count())
+
+    def test_add_reply(self):
+        project = self.as_visitor()
+        parent = Comment.objects.filter(project=project, parent=None).first()
+        self.request(9, 'post', reverse('add_comment', args=[project.slug]),
+                     {'content': 'Agreed', 'parent_id': parent.pk}, status=302)
+        parent.refresh_from_db()
+        self.assertEqual(parent.reply_count, parent.replies.count())
+
+    def test_rate_project(self):
+        project = self.as_visitor()
+        self.request(10, 'post', reverse('rate_project', args=[project.slug]), {'value': 4}, status=302)
+        self.assertTrue(Rating.objects.filter(project=project, user=self.data.visitor, value=4).exists())
+
+    def test_report_comment(self):
+        project = self.as_visitor()
+        comment = Comment.objects.filter(project=project).first()
+        self.request(6, 'post', reverse('report_content', args=['comment', comment.pk]), {'reason': 'Spam'},
+                     status=302)
+        self.assertTrue(Report.objects.filter(comment=comment).exists())
+
+    def test_create_project(self):
+        self.as_visitor()
+        now = timezone.now()
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            self.request(22, 'post', reverse('create_project'), {
+                'title': 'A new project', 'details': 'Details', 'category': self.data.categories[0].pk,
+                'total_target': '5000', 'start_time': now.strftime('%Y-%m-%dT%H:%M'),
+                'end_time': (now + timedelta(days=20)).strftime('%Y-%m-%dT%H:%M'),
+                'tags': 'tag0, brand-new',
+                'images': SimpleUploadedFile('cover.gif', GIF, content_type='image/gif'),
+            }, status=302)
+        self.assertTrue(Project.objects.filter(title='A new project', creator=self.data.visitor).exists())
+
+    def test_edit_project(self):
+        self.as_visitor()
+        project = self.own_project()
+        self.request(19, 'post', reverse('edit_project', args=[project.slug]), {
+            'title': 'Renamed', 'details': 'Details', 'category': self.data.categories[1].pk,
+            'total_target': '5000', 'start_time': project.start_time.strftime('%Y-%m-%dT%H:%M'),
+            'end_time': project.end_time.strftime('%Y-%m-%dT%H:%M'), 'tags': 'tag1, tag2',
+        }, status=302)
+        project.refresh_from_db()
+        self.assertEqual((project.title, project.category), ('Renamed', self.data.categories[1]))
+
+    def test_cancel_project(self):
+        self.as_visitor()
+        project = self.own_project()
+        self.request(9, 'post', reverse('cancel_project', args=[project.slug]), status=302)
+        project.refresh_from_db()
+        self.assertTrue(project.is_cancelled)
+
+    def own_project(self):
+        now = timezone.now()
+        return Project.objects.create(title='Own project', details='Details', category=self.data.categories[0],
+                                      total_target=Decimal(5000), start_time=now,
+                                      end_time=now + timedelta(days=20), creator=self.data.visitor)
+
+
+# The smallest valid GIF, for the picture upload
+GIF = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+       b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;')
+
+
+class SmallFixtureProjectTests(ProjectReadBudgets, ProjectWriteBudgets, QueryBudgetTestCase):
+    scale = SMALL
+
+
+class LargeFixtureProjectTests(ProjectReadBudgets, ProjectWriteBudgets, QueryBudgetTestCase):
+    scale = LARGE
+    time_ceiling = 0.5
+
+
+class CardVersionTests(TestCase):
+    """Card versions change only once the write is visible, and readers never replace a newer one."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidate_waits_for_commit(self):
+        before = cards._versions([1])[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            cards.invalidate(1)
+            self.assertEqual(cards._versions([1])[1], before)
+        self.assertNotEqual(cards._versions([1])[1], before)
+
+    def test_missed_lookup_keeps_concurrent_token(self):
+        # The reader's lookup misses, then an invalidate() lands before it stores its own token
+        cache.set(cards._version_key(1), 'newer', None)
+        real_get_many = cache.get_many
+        with mock.patch.object(cache, 'get_many', side_effect=[{}, real_get_many([cards._version_key(1)])]):
+            self.assertEqual(cards._versions([1]), {1: 'newer'})
+        self.assertEqual(cache.get(cards._version_key(1)), 'newer')
+
+
+def make_user(name):
+    User = get_user_model()
+    return User.objects.create(username=name, email=f'{name}@example.com', mobile_phone=f'010{User.objects.count():08d}')
+
+
+def make_project(creator, category, title='Project', ends_in=timedelta(days=30), **fields):
+    now = timezone.now()
+    return Project.objects.create(title=title, details='Details', category=category, total_target=Decimal(1000),
+                                  start_time=now - timedelta(days=60), end_time=now + ends_in, creator=creator,
+                                  **fields)
+
+
+class BulkActionTests(TestCase):
+    """The admin bulk actions keep counted_active and the category counters in step with the rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = make_user('creator')
+        cls.art, cls.music = Category.objects.create(name='Art'), Category.objects.create(name='Music')
+        cls.tag = Tag.objects.create(name='green')
+        cls.active = make_project(cls.creator, cls.art, 'Active')
+        cls.ended = make_project(cls.creator, cls.art, 'Ended', ends_in=-timedelta(days=5))
+        cls.cancelled = make_project(cls.creator, cls.music, 'Cancelled', is_cancelled=True)
+        cls.tagged = make_project(cls.creator, cls.music, 'Tagged')
+        cls.tagged.tags.add(cls.tag)
+
+    def assertCountersConsistent(self):
+        now = timezone.now()
+        for project in Project.objects.all():
+            self.assertEqual(project.counted_active, categories.is_active(project, now), project.title)
+        for category in Category.objects.all():
+            self.assertEqual(category.active_project_count,
+                             Project.objects.filter(category=category, counted_active=True).count(), category.name)
+
+    def test_fixture_is_consistent(self):
+        self.assertCountersConsistent()
+
+    def test_extend_revives_ended_projects(self):
+        # Filtered like the changelist's end time filter, which the extended rows no longer match afterwards
+        ended = Project.objects.filter(end_time__lt=timezone.now())
+        self.assertEqual(bulk.extend(ended, timedelta(days=10)), 1)
+        self.ended.refresh_from_db()
+        self.assertTrue(self.ended.counted_active)
+        self.assertCountersConsistent()
+
+    def test_extend_keeps_cancelled_projects_uncounted(self):
+        self.assertEqual(bulk.extend(Project.objects.all(), timedelta(days=10)), 4)
+        self.assertCountersConsistent()
+        self.assertEqual(Category.objects.get(pk=self.music.pk).active_project_count, 1)
+
+    def test_cancel(self):
+        self.assertEqual(bulk.cancel(Project.objects.all()), 3)
+        self.assertCountersConsistent()
+        self.assertFalse(Project.objects.filter(counted_active=True).exists())
+
+    def test_recategorize_moves_counts(self):
+        self.assertEqual(bulk.recategorize(Project.objects.filter(category=self.art), self.music), 2)
+        self.assertCountersConsistent()
+        self.assertEqual(Category.objects.get(pk=self.music.pk).active_project_count, 2)
+
+    def test_set_featured_only_changes_what_differs(self):
+        self.assertEqual(bulk.set_featured(Project.objects.filter(pk=self.active.pk), True), 1)
+        self.assertEqual(bulk.set_featured(Project.objects.all(), True), 3)
+        self.assertEqual(Project.objects.filter(is_featured=True).count(), 4)
+
+    def test_add_and_remove_tag(self):
+        before = Project.objects.get(pk=self.active.pk).last_modified
+        self.assertEqual(bulk.add_tag(Project.objects.all(), self.tag), 3)
+        self.assertEqual(self.tag.project_set.count(), 4)
+        self.assertNotEqual(Project.objects.get(pk=self.active.pk).last_modified, before)
+        self.assertEqual(bulk.remove_tag(Project.objects.exclude(pk=self.tagged.pk), self.tag), 3)
+        self.assertEqual(list(self.tag.project_set.all()), [self.tagged])
+
+
+class MediaCollectionTests(TestCase):
+    """Content-addressed uploads are stored once, and gc_media only removes old unreferenced files."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.root = media_root.name
+
+    def write(self, name, age):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(name.encode())
+        os.utime(path, (time.time() - age, time.time() - age))
+        return path
+
+    def gc(self, *args):
+        call_command('gc_media', '--min-age', '3600', *args, stdout=StringIO())
+
+    def test_reupload_reuses_blob_and_refreshes_mtime(self):
+        name = default_storage.save('project_pictures/a.gif', ContentFile(GIF))
+        path = default_storage.path(name)
+        os.utime(path, (0, 0))
+        self.assertEqual(default_storage.save('project_pictures/b.gif', ContentFile(GIF)), name)
+        self.assertGreater(os.stat(path).st_mtime, time.time() - 60)
+
+    def test_sweeps_only_old_orphans(self):
+        project = make_project(make_user('owner'), Category.objects.create(name='Art'))
+        kept = self.write('blobs/aa/bb/kept.gif', age=7200)
+        ProjectPicture.objects.create(project=project, image='blobs/aa/bb/kept.gif')
+        orphan = self.write('blobs/cc/dd/orphan.gif', age=7200)
+        fresh = self.write('blobs/ee/ff/fresh.gif', age=60)
+
+        self.gc('--dry-run')
+        self.assertTrue(os.path.exists(orphan))
+        self.gc()
+        self.assertTrue(os.path.exists(kept))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(fresh))
+
+
+class TypeaheadIndexTests(SimpleTestCase):
+    """Patches keep the short-prefix rankings exact, and a rebuild never makes lookups or patches wait."""
+
+    def index(self, *titles):
+        index = typeahead.PrefixIndex()
+        index.load(('p', pk, title, popularity, f'p-{pk}') for pk, (title, popularity) in enumerate(titles, 1))
+        return index
+
+    def labels(self, index, query):
+        return [item['label'] for item in index.search(query)[0]]
+
+    def test_patches_keep_short_rankings(self):
+        index = self.index(('Solar garden', 30.0), ('Sand castle', 20.0), ('Music hall', 10.0))
+        self.assertEqual(self.labels(index, 's'), ['Solar garden', 'Sand castle'])
+        index.bump('p', 2, 25.0)
+        index.add('p', 4, 'Sun roof', 40.0, 'p-4')
+        self.assertEqual(self.labels(index, 's'), ['Sand castle', 'Sun roof', 'Solar garden'])
+        index.remove('p', 2)
+        index.add('p', 1, 'Garden of music', 30.0, 'p-1')
+        self.assertEqual(self.labels(index, 's'), ['Sun roof'])
+        self.assertEqual(self.labels(index, 'mu'), ['Garden of music', 'Music hall'])
+
+    @override_settings(TYPEAHEAD_MAX_SCAN=2)
+    def test_short_prefix_is_not_cut_off_alphabetically(self):
+        index = self.index(('Saa', 1.0), ('Sab', 1.0), ('Sac', 1.0), ('Szz', 99.0))
+        self.assertEqual(self.labels(index, 's')[0], 'Szz')
+
+    def test_rebuild_keeps_serving_and_replays_patches(self):
+        old = self.index(('Solar garden', 10.0))
+        old.built_at -= settings.TYPEAHEAD_MAX_AGE + 1
+        fresh = self.index(('Solar garden', 10.0))
+        started, release = threading.Event(), threading.Event()
+
+        def slow_build():
+            started.set()
+            release.wait(5)
+            return fresh
+
+        with mock.patch.object(typeahead, '_index', old), mock.patch.object(typeahead, 'build', slow_build):
+            rebuilder = threading.Thread(target=typeahead.get_index)
+            rebuilder.start()
+            self.assertTrue(started.wait(5))
+            # Neither waits for the build
+            self.assertIs(typeahead.get_index(), old)
+            typeahead.donation_added(1, 5)
+            release.set()
+            rebuilder.join(5)
+            self.assertIs(typeahead.get_index(), fresh)
+        self.assertEqual(old.items['p', 1]['popularity'], 15.0)
+        self.assertEqual(fresh.items['p', 1]['popularity'], 15.0)
+
+
+def leaderboards():
+    return (set(DonorTotal.objects.filter(count__gt=0).values_list('user_id', 'project_id', 'amount', 'count')),
+            set(DonorGlobalTotal.objects.filter(count__gt=0).values_list('user_id', 'amount', 'count')))
+
+
+def user_stats():
+    rows = UserStats.objects.values_list('user_id', 'total_donated', 'projects_backed', 'projects_created',
+                                         'total_raised')
+    return {row[0]: row[1:] for row in rows if any(row[1:])}
+
+
+class LeaderboardTests(TestCase):
+    """The donation signals keep DonorTotal, DonorGlobalTotal and UserStats equal to a full rebuild."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator, cls.alice, cls.bob = make_user('creator'), make_user('alice'), make_user('bob')
+        art = Category.objects.create(name='Art')
+        cls.first, cls.second = make_project(cls.creator, art, 'First'), make_project(cls.creator, art, 'Second')
+
+    def donate(self, user, project, amount):
+        return Donation.objects.create(user=user, project=project, amount=Decimal(amount))
+
+    def assertMatchesRebuild(self):
+        maintained = leaderboards(), user_stats()
+        call_command('rebuild_leaderboards', stdout=StringIO())
+        call_command('rebuild_user_stats', stdout=StringIO())
+        self.assertEqual(maintained, (leaderboards(), user_stats()))
+
+    def test_repeated_gifts_accumulate(self):
+        self.donate(self.alice, self.first, 10)
+        self.donate(self.alice, self.first, 15)
+        self.donate(self.alice, self.second, 5)
+        self.donate(self.bob, self.first, 40)
+        self.assertEqual([(row.user, row.amount, row.count) for row in DonorTotal.top_for_project(self.first)],
+                         [(self.bob, 40, 1), (self.alice, 25, 2)])
+        self.assertEqual([(row.user, row.amount, row.count) for row in DonorGlobalTotal.top()],
+                         [(self.bob, 40, 1), (self.alice, 30, 3)])
+        stats = UserStats.objects.get(user=self.alice)
+        self.assertEqual((stats.total_donated, stats.projects_backed), (30, 2))
+        self.assertEqual(UserStats.objects.get(user=self.creator).total_raised, 70)
+        self.assertMatchesRebuild()
+
+    def test_deleting_gifts_forgets_them(self):
+        small, large = self.donate(self.alice, self.first, 10), self.donate(self.alice, self.first, 15)
+        self.donate(self.alice, self.second, 5)
+        small.delete()
+        # Still a backer of the first project after one of two gifts is gone
+        self.assertEqual(UserStats.objects.get(user=self.alice).projects_backed, 2)
+        self.assertMatchesRebuild()
+        large.delete()
+        self.assertEqual(list(DonorTotal.top_for_project(self.first)), [])
+        stats = UserStats.objects.get(user=self.alice)
+        self.assertEqual((stats.total_donated, stats.projects_backed), (5, 1))
+        self.assertEqual([(row.user, row.amount, row.count) for row in DonorGlobalTotal.top()], [(self.alice, 5, 1)])
+        self.assertMatchesRebuild()
+
+
+class ImportProjectsTests(TestCase):
+    """import_projects commits each batch with its checkpoint and resumes after the last one."""
+
+    HEADER = ['title', 'details', 'category', 'creator', 'total_target', 'start_time', 'end_time', 'tags']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = make_user('owner')
+        cls.art = Category.objects.create(name='Art')
+        cls.green = Tag.objects.create(name='Green')
+
+    def setUp(self):
+        now = timezone.now()
+        start = (now - timedelta(days=10)).isoformat()
+        end, ended = (now + timedelta(days=30)).isoformat(), (now - timedelta(days=1)).isoformat()
+        rows = [
+            ['Solar Lamps', 'Lamps', 'Energy', 'Owner@example.com', '500', start, end, 'solar|green'],
+            ['Solar Lamps', 'More lamps', 'energy', 'owner@example.com', '250.5', start, end, 'Green'],
+            ['Ghost Farm', 'Nobody', 'Art', 'nobody@example.com', '100', start, end, ''],
+            ['Water Pumps', 'Pumps', 'Art', 'owner@example.com', '900', start, ended, ''],
+            ['Seeds', 'Seeds', 'art', 'owner@example.com', '50', start, end, 'GREEN'],
+        ]
+        handle = tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False)
+        with handle:
+            csv.writer(handle).writerows([self.HEADER] + rows)
+        self.path = handle.name
+        self.addCleanup(os.remove, self.path)
+
+    def run_import(self, *args):
+        stderr = StringIO()
+        call_command('import_projects', self.path, '--batch-size', '2', *args, stdout=StringIO(), stderr=stderr)
+        return stderr.getvalue()
+
+    def checkpoint(self):
+        return ProjectImport.objects.get(source=os.path.abspath(self.path))
+
+    def assertImported(self):
+        self.assertEqual(sorted(Project.objects.values_list('slug', flat=True)),
+                         ['seeds', 'solar-lamps', 'solar-lamps-1', 'water-pumps'])
+        energy = Category.objects.get(name__iexact='energy')
+        self.assertEqual(Category.objects.filter(name__iexact='energy').count(), 1)
+        self.assertEqual(energy.active_project_count, 2)
+        self.assertEqual(Category.objects.get(pk=self.art.pk).active_project_count, 1)
+        self.assertEqual(sorted(self.green.project_set.values_list('slug', flat=True)),
+                         ['seeds', 'solar-lamps', 'solar-lamps-1'])
+        self.assertEqual(Tag.objects.get(name='solar').project_set.count(), 1)
+        self.assertEqual(UserStats.objects.get(user=self.owner).projects_created, 4)
+        checkpoint = self.checkpoint()
+        self.assertEqual((checkpoint.position, checkpoint.imported, checkpoint.skipped), (5, 4, 1))
+        self.assertIsNotNone(checkpoint.finished_at)
+
+    def test_import(self):
+        errors = self.run_import()
+        self.assertIn("row 3: creator: no account with email 'nobody@example.com'", errors)
+        self.assertImported()
+        project = Project.objects.get(slug='solar-lamps-1')
+        self.assertEqual((project.total_target, project.counted_active), (Decimal('250.50'), True))
+        self.assertFalse(Project.objects.get(slug='water-pumps').counted_active)
+
+    def test_dry_run_writes_nothing(self):
+        self.assertIn('row 3:', self.run_import('--dry-run'))
+        self.assertFalse(Project.objects.exists())
+        self.assertFalse(ProjectImport.objects.exists())
+
+    def test_resume_after_failed_batch(self):
+        write, calls = import_projects.Command.write, []
+
+        def failing_write(command, batch):
+            calls.append(len(batch))
+            if len(calls) == 2:
+                raise RuntimeError('database went away')
+            return write(command, batch)
+
+        with mock.patch.object(import_projects.Command, 'write', failing_write):
+            with self.assertRaisesMessage(RuntimeError, 'database went away'):
+                self.run_import()
+        # The first batch and its checkpoint committed; the second rolled back together
+        checkpoint = self.checkpoint()
+        self.assertEqual((checkpoint.position, checkpoint.imported, checkpoint.finished_at), (2, 2, None))
+        self.assertEqual(Project.objects.count(), 2)
+
+        self.run_import()
+        self.assertImported()
+
+    def test_finished_import_needs_restart(self):
+        self.run_import()
+        with self.assertRaisesMessage(CommandError, 'pass --restart'):
+            self.run_import()
+        self.run_import('--restart')
+        self.assertEqual(Project.objects.count(), 8)
+        self.assertEqual(self.checkpoint().imported, 4)
+
+
+class ArchiveTests(TestCase):
+    """Archiving moves a finished campaign's rows out of the hot tables without changing what is shown."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator, cls.alice, cls.bob = make_user('creator'), make_user('alice'), make_user('bob')
+        cls.project = make_project(cls.creator, Category.objects.create(name='Art'), 'Old',
+                                   ends_in=-timedelta(days=40))
+        for user, amount in ((cls.alice, 10), (cls.alice, 25), (cls.bob, 40)):
+            Donation.objects.create(user=user, project=cls.project, amount=Decimal(amount))
+        Rating.objects.create(user=cls.alice, project=cls.project, value=4)
+        Rating.objects.create(user=cls.bob, project=cls.project, value=1)
+        thread = Comment.objects.create(user=cls.alice, project=cls.project, content='Great idea')
+        Comment.objects.create(user=cls.bob, project=cls.project, parent=thread, content='Agreed')
+        cls.reported = Comment.objects.create(user=cls.bob, project=cls.project, content='Spam')
+        Report.objects.create(report_type='comment', comment=cls.reported, user=cls.alice, reason='Spam')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.alice)
+
+    def page(self):
+        context = self.client.get(reverse('project_detail', args=[self.project.slug])).context
+        project = context['project']
+        return {
+            'totals': (project.total_donations, project.donation_count, project.avg_rating, project.rating_count,
+                       project.total_comments),
+            'donations': sorted((d.pk, d.user_id, d.amount) for d in context['donations']),
+            'comments': sorted((c.pk, c.content, [r.content for r in c.reply_preview]) for c in context['comments']),
+            'top_backers': [(row.user_id, row.amount) for row in context['top_backers']],
+            'user_rating': context['user_rating'].value,
+        }
+
+    def archive(self):
+        call_command('archive_campaigns', '--days', '30', '--batch-size', '1', stdout=StringIO())
+        self.project.refresh_from_db()
+
+    def test_archive_round_trip(self):
+        before, boards = self.page(), leaderboards()
+        modified = self.project.last_modified
+        self.archive()
+        self.assertIsNotNone(self.project.archived_at)
+        self.assertGreater(self.project.last_modified, modified)
+        self.assertEqual((self.project.archived_raised, self.project.archived_donation_count), (75, 3))
+        self.assertEqual((self.project.archived_rating_sum, self.project.archived_rating_count), (5, 2))
+        self.assertEqual((self.project.comment_count, self.project.archived_comment_count), (1, 2))
+        self.assertFalse(Donation.objects.filter(project=self.project).exists())
+        self.assertFalse(Rating.objects.filter(project=self.project).exists())
+        # The reported thread stays behind for the moderators
+        self.assertEqual(list(Comment.objects.filter(project=self.project)), [self.reported])
+        self.assertEqual(ArchivedComment.objects.filter(project_id=self.project.pk).count(), 2)
+        self.assertEqual(self.page(), before)
+        self.assertEqual(leaderboards(), boards)
+        call_command('rebuild_leaderboards', stdout=StringIO())
+        self.assertEqual(leaderboards(), boards)
+
+    def test_archiving_twice_moves_nothing(self):
+        self.archive()
+        before = self.page()
+        self.archive()
+        self.assertEqual(ArchivedDonation.objects.count(), 3)
+        self.assertEqual(self.page(), before)
+
+    def test_archived_project_refuses_feedback(self):
+        self.archive()
+        self.client.post(reverse('add_comment', args=[self.project.slug]), {'content': 'Late'})
+        self.client.post(reverse('rate_project', args=[self.project.slug]), {'value': 5})
+        self.assertFalse(Comment.objects.filter(content='Late').exists())
+        self.assertFalse(Rating.objects.exists())
+
+
+class RecommendationTests(TestCase):
+    """An incremental build_recommendations run ends where a full one would."""
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = make_user('creator')
+        cls.users = [make_user(f'backer{i}') for i in range(4)]
+        art = Category.objects.create(name='Art')
+        cls.projects = [make_project(creator, art, f'Project {i}') for i in range(5)]
+        for user, indexes in zip(cls.users, ([0, 1], [1, 2], [2, 3], [0])):
+            for i in indexes:
+                Donation.objects.create(user=user, project=cls.projects[i], amount=Decimal(10))
+        Rating.objects.create(user=cls.users[3], project=cls.projects[4], value=3)
+
+    def build(self, *args):
+        call_command('build_recommendations', *args, stdout=StringIO())
+        return (sorted((row.project_id, row.recommended_id, round(row.score, 9))
+                       for row in ProjectRecommendation.objects.all()),
+                sorted((row.user_id, row.project_id, round(row.score, 9)) for row in UserRecommendation.objects.all()))
+
+    def test_incremental_matches_full(self):
+        self.build('--full')
+        Donation.objects.create(user=self.users[3], project=self.projects[3], amount=Decimal(5))
+        Rating.objects.create(user=self.users[0], project=self.projects[2], value=5)
+        incremental = self.build()
+        self.assertTrue(incremental[0])
+        self.assertEqual(incremental, self.build('--full'))
+
+    def test_no_activity_changes_nothing(self):
+        full = self.build('--full')
+        self.assertEqual(self.build(), full)
@@ -0,0 +1,59 @@
+"""
+Exponentially decayed "trending" score per project.
+
+Each donation decays the stored score from ``trending_updated_at`` to the
+donation time and then adds the donated amount, so no periodic recompute
+is needed.  Stored scores were last decayed at different times and are not
+directly comparable, so an order-preserving key is kept alongside:
+
+    trending_rank = ln(score) + DECAY * seconds_since_epoch
+
+For any common "now", ``score_now = exp(trending_rank - DECAY * now)``,
+which is monotonic in ``trending_rank``; ordering by the indexed rank column
+is therefore ordering by the current decayed score.
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+
+HALF_LIFE_HOURS = getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 72)
+DECAY = math.log(2) / (HALF_LIFE_HOURS * 3600)
+EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def decay(score, since, until):
+    if not score or since is None:
+        return 0.0
+    elapsed = max(0.0, (until - since).total_seconds())
+    return score * math.exp(-DECAY * elapsed)
+
+
+def rank_key(score, at):
+    if score <= 0:
+        return None
+    return math.log(score) + DECAY * (at - EPOCH).total_seconds()
+
+
+def fold(score, updated_at, amount, at):
+    """Decay ``score`` to ``at`` and add ``amount``; returns the new (score, rank)."""
+    score = decay(score, updated_at, at) + float(amount)
+    return score, rank_key(score, at)
+
+
+def record_donation(donation):
+    from .models import Project
+
+    at = donation.donated_at
+    with transaction.atomic():
+        current = (Project.objects.select_for_update()
+                   .values('trending_score', 'trending_updated_at')
+                   .get(pk=donation.project_id))
+        score, rank = fold(current['trending_score'], current['trending_updated_at'], donation.amount, at)
+        Project.objects.filter(pk=donation.project_id).update(
+            trending_score=score, trending_updated_at=at, trending_rank=rank)
+
+
+def current_score(project, now):
+    return decay(project.trending_score, project.trending_updated_at, now)
@@ -0,0 +1,267 @@
+"""
+Process-local prefix index behind the search box suggestions.
+
+The index is one sorted list of ``(word, kind, id)`` entries: every word of an
+active project's title (kind ``'p'``) and of every tag name (``'t'``).  A
+lookup ``bisect``s to the first entry starting with the last word typed and
+scans forward while entries still match; any earlier words must each prefix
+a word of the same title or tag.  Matches are ranked by popularity: amount
+raised for projects, number of active projects for tags.
+
+One- and two-letter prefixes match far too many entries for a capped scan
+to find their most popular items, so they are ranked over their whole range
+instead, once per index on first use: ``short`` keeps each such prefix's
+``SHORT_RESULTS`` best projects and tags, and the patches below keep those
+rankings in order.
+
+Memory is bounded by ``TYPEAHEAD_MAX_PROJECTS`` (the best funded active
+projects are kept) and ``TYPEAHEAD_MAX_WORDS`` words per title, and a lookup
+of a longer prefix by ``TYPEAHEAD_MAX_SCAN`` entries.  The index is built on the first lookup and
+rebuilt once it is ``TYPEAHEAD_MAX_AGE`` seconds old.  In between, the
+handlers in ``projects.signals`` patch it on commit for project, tag and
+donation saves made by this process; other workers, bulk edits and imports
+are picked up by the next rebuild.  A rebuild runs in the one lookup that
+notices the age, without holding the patch lock: other lookups keep reading
+the old index, patches keep applying to it and are replayed onto the new one
+before it is swapped in.  (A donation committed just before the rebuild reads
+the projects may be counted twice in its popularity until the next rebuild.)
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from operator import itemgetter
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Project, Tag
+
+WORD = re.compile(r'\w+')
+LAST_CHAR = chr(0x10FFFF)
+# Prefixes up to this long answer from the precomputed rankings, up to this many results per kind
+SHORT_PREFIX = 2
+SHORT_RESULTS = 16
+
+# Guards patches and the swap to a new index
+_lock = threading.Lock()
+# Held by the one thread building a new index
+_rebuilding = threading.Lock()
+_index = None
+# Patches applied while a build runs, replayed onto the new index
+_pending = None
+
+
+def words(text):
+    """Lower-cased, accent-free words of ``text``."""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    return WORD.findall(''.join(char for char in text if not unicodedata.combining(char)))
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.entries = []
+        self.items = {}
+        # {prefix: {'p': [pk, ...], 't': [pk, ...]}}, most popular first, for the short prefixes looked up so far
+        self.short = {}
+        self.built_at = time.monotonic()
+
+    def _item(self, kind, pk, label, popularity, slug):
+        item = {'label': label, 'slug': slug, 'popularity': popularity,
+                'words': words(label)[:settings.TYPEAHEAD_MAX_WORDS]}
+        self.items[kind, pk] = item
+        return [(word, kind, pk) for word in set(item['words'])]
+
+    @staticmethod
+    def _prefixes(item):
+        return {word[:n] for word in item['words'] for n in range(1, SHORT_PREFIX + 1)}
+
+    def _rankings(self, prefix):
+        """{kind: pks} of the ``SHORT_RESULTS`` most popular items with a word starting with ``prefix``."""
+        rankings = self.short.get(prefix)
+        if rankings is None:
+            found = {'p': set(), 't': set()}
+            for _, kind, pk in self._range(prefix):
+                found[kind].add(pk)
+            rankings = self.short[prefix] = {
+                kind: heapq.nlargest(SHORT_RESULTS, pks, key=lambda pk, kind=kind: self.items[kind, pk]['popularity'])
+                for kind, pks in found.items()
+            }
+        return rankings
+
+    def load(self, rows):
+        """Bulk load ``(kind, pk, label, popularity, slug)`` rows with a single sort."""
+        for row in rows:
+            self.entries.extend(self._item(*row))
+        self.entries.sort()
+        self.short.clear()
+
+    def add(self, kind, pk, label, popularity, slug=None):
+        known = self.items.get((kind, pk))
+        if known and known['label'] == label:
+            # Same words, so the same entries: only the slug or the ranking can change
+            known.update(slug=slug, popularity=popularity)
+        else:
+            self.remove(kind, pk)
+            for entry in self._item(kind, pk, label, popularity, slug):
+                bisect.insort(self.entries, entry)
+        self._rank(kind, pk)
+
+    def bump(self, kind, pk, amount):
+        """Add ``amount`` to an item's popularity."""
+        item = self.items.get((kind, pk))
+        if item:
+            item['popularity'] += amount
+            self._rank(kind, pk)
+
+    def remove(self, kind, pk):
+        item = self.items.pop((kind, pk), None)
+        if item is None:
+            return
+        for word in set(item['words']):
+            i = bisect.bisect_left(self.entries, (word, kind, pk))
+            if i < len(self.entries) and self.entries[i] == (word, kind, pk):
+                del self.entries[i]
+        for prefix in self._prefixes(item) & self.short.keys():
+            if pk in self.short[prefix][kind]:
+                # The runner-up that moves in is not known: rank the prefix again on its next lookup
+                del self.short[prefix]
+
+    def _rank(self, kind, pk):
+        """Move ``pk`` into place in its prefixes' rankings after it was added or gained popularity."""
+        popularity = self.items[kind, pk]['popularity']
+        # Prefixes not ranked yet will see the item when they are
+        for prefix in self._prefixes(self.items[kind, pk]) & self.short.keys():
+            ranking = self.short[prefix][kind]
+            if pk in ranking:
+                ranking.remove(pk)
+            elif len(ranking) == SHORT_RESULTS and self.items[kind, ranking[-1]]['popularity'] >= popularity:
+                continue
+            keys = [-self.items[kind, other]['popularity'] for other in ranking]
+            ranking.insert(bisect.bisect_right(keys, -popularity), pk)
+            del ranking[SHORT_RESULTS:]
+
+    def _range(self, last, limit=None):
+        """Entries whose word starts with ``last``, at most ``limit`` of them."""
+        # Every word starting with ``last`` sorts between ``last`` and ``last`` + the highest code point
+        start = bisect.bisect_left(self.entries, (last,))
+        stop = len(self.entries) if limit is None else min(len(self.entries), start + limit)
+        return self.entries[start:bisect.bisect_left(self.entries, (last + LAST_CHAR,), start, stop)]
+
+    def search(self, query, limit=8):
+        """Best ``limit`` (project items, tag items) whose words are prefixed by the query's words."""
+        typed = words(query)
+        if not typed:
+            return [], []
+        *head, last = typed
+        if not head and len(last) <= SHORT_PREFIX and limit <= SHORT_RESULTS:
+            rankings = self._rankings(last)
+            # Lookups do not take the lock, so a patch may have just removed an item
+            return tuple([item for item in map(self.items.get, [(kind, pk) for pk in rankings[kind][:limit]]) if item]
+                         for kind in 'pt')
+        return self._scan(head, last, limit)
+
+    def _scan(self, head, last, limit):
+        found = {'p': set(), 't': set()}
+        for _, kind, pk in self._range(last, settings.TYPEAHEAD_MAX_SCAN):
+            found[kind].add(pk)
+        results = []
+        for kind in 'pt':
+            items = [item for item in map(self.items.get, [(kind, pk) for pk in found[kind]]) if item]
+            if head:
+                items = [item for item in items
+                         if all(any(word.startswith(prefix) for word in item['words']) for prefix in head)]
+            results.append(heapq.nlargest(limit, items, key=itemgetter('popularity')))
+        return tuple(results)
+
+
+def build():
+    now = timezone.now()
+    index = PrefixIndex()
+    projects = (Project.objects.active().with_raised().order_by('-raised_total')
+                .values_list('pk', 'title', 'raised_total', 'slug')[:settings.TYPEAHEAD_MAX_PROJECTS])
+    tags = (Tag.objects.annotate(n=Count('project', filter=Q(project__is_cancelled=False, project__end_time__gt=now)))
+            .values_list('pk', 'name', 'n'))
+    index.load([('p', pk, title, float(raised), slug) for pk, title, raised, slug in projects.iterator()])
+    index.load([('t', pk, name, n, None) for pk, name, n in tags.iterator()])
+    return index
+
+
+def _rebuild():
+    """Build a new index and swap it in; the caller holds ``_rebuilding``."""
+    global _index, _pending
+    with _lock:
+        _pending = []
+    fresh = None
+    try:
+        fresh = build()
+    finally:
+        with _lock:
+            if fresh is not None:
+                for change in _pending:
+                    change(fresh)
+                _index = fresh
+            _pending = None
+
+
+def get_index():
+    index = _index
+    if index is None:
+        # Nothing to serve yet: wait for the first build
+        with _rebuilding:
+            if _index is None:
+                _rebuild()
+    elif time.monotonic() - index.built_at > settings.TYPEAHEAD_MAX_AGE and _rebuilding.acquire(blocking=False):
+        # Other lookups keep using the old index instead of queueing behind this one
+        try:
+            if _index is index:
+                _rebuild()
+        finally:
+            _rebuilding.release()
+    return _index
+
+
+def search(query, limit=8):
+    return get_index().search(query, limit)
+
+
+# Incremental updates from projects.signals; they only touch an index that is built or being built
+
+def _patch(change):
+    with _lock:
+        if _index is not None:
+            change(_index)
+        if _pending is not None:
+            _pending.append(change)
+
+
+def project_changed(project):
+    def change(index):
+        if project.is_cancelled or project.end_time <= timezone.now():
+            index.remove('p', project.pk)
+        else:
+            known = index.items.get(('p', project.pk))
+            index.add('p', project.pk, project.title, known['popularity'] if known else 0.0, project.slug)
+    _patch(change)
+
+
+def project_deleted(project_id):
+    _patch(lambda index: index.remove('p', project_id))
+
+
+def donation_added(project_id, amount):
+    _patch(lambda index: index.bump('p', project_id, float(amount)))
+
+
+def tag_changed(tag):
+    def change(index):
+        known = index.items.get(('t', tag.pk))
+        index.add('t', tag.pk, tag.name, known['popularity'] if known else 0)
+    _patch(change)
+
+
+def tag_deleted(tag_id):
+    _patch(lambda index: index.remove('t', tag_id))
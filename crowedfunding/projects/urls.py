@@ -1,14 +1,22 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+if settings.ASYNC_VIEWS:
+    project_list, project_detail = views.project_list_async, views.project_detail_async
+else:
+    project_list, project_detail = views.project_list, views.project_detail
+
 urlpatterns = [
-    path('', views.project_list, name='project_list'),
+    path('', project_list, name='project_list'),
     path('dashboard/', views.dashboard, name='dashboard'),
-    path('<slug:slug>/', views.project_detail, name='project_detail'),
+    path('typeahead/', views.typeahead, name='project_typeahead'),
     path('create/', views.create_project, name='create_project'),
+    path('<slug:slug>/', project_detail, name='project_detail'),
     path('<slug:slug>/edit/', views.edit_project, name='edit_project'),
     path('<slug:slug>/donate/', views.donate, name='donate'),
     path('<slug:slug>/comment/', views.add_comment, name='add_comment'),
+    path('<slug:slug>/comments/<int:comment_id>/replies/', views.comment_replies, name='comment_replies'),
     path('<slug:slug>/rate/', views.rate_project, name='rate_project'),
     path('report/<str:content_type>/<int:content_id>/', views.report_content, name='report_content'),
     path('<slug:slug>/cancel/', views.cancel_project, name='cancel_project'),
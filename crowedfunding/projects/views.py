@@ -1,14 +1,30 @@
+import asyncio
+import time
+
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Avg, Count
+from django.db import transaction
+from django.db.models import Q, Avg, Count, Max, Min, Prefetch
 from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.views.decorators.cache import cache_control
 from django.utils import timezone
-from .models import Project, ProjectPicture, Donation, Comment, Rating, Report, Category, Tag
+from crowedfunding.db_router import read_from_replica
+from crowedfunding.conditional import conditional_page
+from .models import Project, ProjectPicture, Donation, Comment, Rating, Report, Tag, DonorTotal
+from .categories import category_menu
+from . import archive, facets, recommend, typeahead as typeahead_index
+from .write_queue import run_write
 from .forms import ProjectForm, ProjectPictureForm, CommentForm, RatingForm, ReportForm, DonationForm
 
-def project_list(request):
+def _listing_queryset(request):
+    """Filtered project listing shared by the sync and async list views."""
     projects = (Project.objects.filter(is_cancelled=False, end_time__gt=timezone.now())
+                .with_raised()
                 .select_related('category', 'creator')
                 .prefetch_related('tags', 'pictures'))
     
@@ -16,30 +32,124 @@ def project_list(request):
     if category_id:
         projects = projects.filter(category_id=category_id)
     
-    search_query = request.GET.get('q')
-    if search_query:
-        projects = projects.filter(
-            Q(title__icontains=search_query) | 
-            Q(tags__name__icontains=search_query)
-        ).distinct()
+    search_query = ' '.join(request.GET.get('q', '').split())
+    tag_ids = facets.parse_tags(request.GET.getlist('tag'))
+    projects = facets.search_filter(projects, search_query, tag_ids)
+
+    sort = request.GET.get('sort')
+    if sort == 'trending':
+        projects = projects.trending()
+    else:
+        sort = ''
+        projects = projects.order_by('-created_at')
+    return projects, category_id, search_query, tag_ids, sort
+
+def _tag_facets(tags, tag_ids):
+    """Tag facets with the selection each one's link toggles to (the cached rows are left alone)."""
+    selected = set(tag_ids)
+    return [dict(tag, selected=tag['id'] in selected,
+                 toggle=sorted(selected ^ {tag['id']})) for tag in tags]
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+# Relative times ("3 days left", "2 hours ago") may lag by at most this many seconds on a 304
+RELATIVE_TIME_BUCKET = 3600
+
+def _listing_etag(request):
+    """Freshness marker of the listed category: one aggregate instead of the page's queries."""
+    projects = Project.objects.active()
+    category_id = request.GET.get('category')
+    if category_id:
+        if not category_id.isdigit():
+            return None
+        projects = projects.filter(category_id=category_id)
+    # Edits/donations move the max, removals and cancellations the count,
+    # the next expiry drops a project from the list, trending updates reorder it
+    marker = projects.aggregate(
+        modified=Max('last_modified'), count=Count('id'),
+        next_end=Min('end_time'), trending=Max('trending_updated_at'),
+    )
+    # The sidebar's per-category counts come from the cached menu, so they cost no query here;
+    # the cached facet counts are only as fresh as their timeout, so the tag is not reused for longer
+    facet_bucket = int(time.time() // settings.FACET_CACHE_SECONDS)
+    return sorted(marker.items()), category_menu(), facet_bucket, request.get_full_path()
+
+def _detail_etag(request, slug):
+    row = Project.objects.filter(slug=slug).values_list('pk', 'last_modified', 'end_time').first()
+    if row is None:
+        return None
+    pk, last_modified, end_time = row
+    # The sidebar shows the progress of the similar and "backers also supported" projects
+    similar = (Project.objects.filter(Q(tags__project=pk) | Q(recommended_by__project=pk)).exclude(pk=pk)
+               .aggregate(modified=Max('last_modified'))['modified'])
+    return pk, last_modified, similar, end_time > timezone.now(), int(time.time() // RELATIVE_TIME_BUCKET)
+
+@read_from_replica
+@conditional_page(_listing_etag)
+def project_list(request):
+    projects, category_id, search_query, tag_ids, sort = _listing_queryset(request)
     
     paginator = Paginator(projects, 12)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    categories = Category.objects.all()
+    categories, tags = facets.facets(search_query, category_id, tag_ids)
     
     return render(request, 'projects/project_list.html', {
         'page_obj': page_obj,
         'categories': categories,
+        'tag_facets': _tag_facets(tags, tag_ids),
+        'selected_category': int(category_id) if category_id else None,
+        'selected_tags': tag_ids,
+        'search_query': search_query,
+        'sort': sort,
+    })
+
+@read_from_replica
+@conditional_page(_listing_etag)
+async def project_list_async(request):
+    """ASGI variant of project_list: count, page rows and facets are fetched concurrently."""
+    request.user = await request.auser()
+    projects, category_id, search_query, tag_ids, sort = _listing_queryset(request)
+
+    paginator = Paginator(projects, 12)
+    # Paginator.count is a cached_property; seed it so get_page() never issues a sync COUNT
+    paginator.count = await projects.acount()
+    page_obj = paginator.get_page(request.GET.get('page'))
+    page_obj.object_list, (categories, tags) = await asyncio.gather(
+        _alist(page_obj.object_list),
+        facets.afacets(search_query, category_id, tag_ids),
+    )
+
+    return render(request, 'projects/project_list.html', {
+        'page_obj': page_obj,
+        'categories': categories,
+        'tag_facets': _tag_facets(tags, tag_ids),
         'selected_category': int(category_id) if category_id else None,
-        'search_query': search_query or ''
+        'selected_tags': tag_ids,
+        'search_query': search_query,
+        'sort': sort,
+    })
+
+@cache_control(max_age=60)
+def typeahead(request):
+    """Search box suggestions from the in-process prefix index; no query once the index is built."""
+    projects, tags = typeahead_index.search(request.GET.get('q', '')[:100])
+    list_url = reverse('project_list')
+    return JsonResponse({
+        'projects': [{'title': item['label'], 'url': reverse('project_detail', args=[item['slug']])}
+                     for item in projects],
+        'tags': [{'name': item['label'], 'url': f"{list_url}?{urlencode({'q': item['label']})}"}
+                 for item in tags],
     })
 
 @login_required
 def dashboard(request):
     user = request.user
+    # Totals and donation counts are annotated: the template used to run two queries per project
     user_projects = (Project.objects.filter(creator=user)
+                     .with_stats()
                      .select_related('category')
                      .prefetch_related('pictures', 'tags'))
     user_donations = (Donation.objects.filter(user=user)
@@ -50,21 +160,39 @@ def dashboard(request):
         'user_donations': user_donations
     })
 
+def _detail_project_queryset():
+    return (Project.objects.with_stats()
+            .select_related('category', 'creator')
+            .prefetch_related('tags', 'pictures'))
+
+def _detail_comments_queryset(project):
+    return (Comment.objects.filter(project=project, parent=None)
+            .select_related('user')
+            # Only the first few replies per thread: Django turns the sliced prefetch into one
+            # ROW_NUMBER() OVER (PARTITION BY parent_id) query; Comment.more_replies covers the rest
+            .prefetch_related(Prefetch(
+                'replies', to_attr='reply_preview',
+                queryset=Comment.objects.select_related('user').order_by('created_at')[:settings.COMMENT_REPLY_PREVIEW]))
+            .order_by('-created_at'))
+
+def _similar_projects_queryset(project):
+    return (Project.objects.filter(
+        tags__in=[tag.id for tag in project.tags.all()],
+        is_cancelled=False,
+        end_time__gt=timezone.now()
+    ).exclude(id=project.id)
+     .with_raised()
+     .select_related('category', 'creator')
+     .prefetch_related('tags', 'pictures')
+     .distinct()[:4])
+
+@read_from_replica
+@conditional_page(_detail_etag)
 def project_detail(request, slug):
-    project = get_object_or_404(
-        Project.objects.select_related('category', 'creator')
-               .prefetch_related(
-                    'tags',
-                    'pictures',
-                    'comments__user',           # top-level comment authors
-                    'comments__replies__user',  # reply authors to avoid N+1
-                    'donations__user',
-                    'ratings'
-                ),
-        slug=slug
-    )
-    donations = project.donations.select_related('user').order_by('-donated_at')[:5]
-    comments = project.comments.select_related('user').filter(parent=None).order_by('-created_at')
+    project = get_object_or_404(_detail_project_queryset(), slug=slug)
+    donations = archive.with_archived_donations(
+        project, project.donations.select_related('user').order_by('-donated_at')[:5])
+    comments = archive.with_archived_comments(project, _detail_comments_queryset(project))
     user_rating = None
     donation_form = DonationForm()
     
@@ -72,16 +200,11 @@ def project_detail(request, slug):
         try:
             user_rating = Rating.objects.get(project=project, user=request.user)
         except Rating.DoesNotExist:
-            pass
+            user_rating = archive.archived_rating(project, request.user)
     
-    similar_projects = (Project.objects.filter(
-        tags__in=project.tags.all(),
-        is_cancelled=False,
-        end_time__gt=timezone.now()
-    ).exclude(id=project.id)
-     .select_related('category', 'creator')
-     .prefetch_related('tags', 'pictures')
-     .distinct()[:4])
+    similar_projects = _similar_projects_queryset(project)
+    also_supported = recommend.for_project(project)
+    top_backers = DonorTotal.top_for_project(project)
     
     return render(request, 'projects/project_detail.html', {
         'project': project,
@@ -89,9 +212,54 @@ def project_detail(request, slug):
         'comments': comments,
         'user_rating': user_rating,
         'similar_projects': similar_projects,
+        'also_supported': also_supported,
+        'top_backers': top_backers,
     'donation_form': donation_form,
     })
 
+@read_from_replica
+@conditional_page(_detail_etag)
+async def project_detail_async(request, slug):
+    """ASGI variant of project_detail: donations, comments, rating and similar projects load concurrently."""
+    user = request.user = await request.auser()
+    try:
+        project = await _detail_project_queryset().aget(slug=slug)
+    except Project.DoesNotExist:
+        raise Http404('No Project matches the given query.')
+
+    async def user_rating():
+        if not user.is_authenticated:
+            return None
+        rating = await Rating.objects.filter(project=project, user=user).afirst()
+        return rating or await archive.aarchived_rating(project, user)
+
+    async def recent_donations():
+        hot = await _alist(project.donations.select_related('user').order_by('-donated_at')[:5])
+        return await archive.awith_archived_donations(project, hot)
+
+    async def comment_threads():
+        return await archive.awith_archived_comments(project, await _alist(_detail_comments_queryset(project)))
+
+    donations, comments, rating, similar_projects, also_supported, top_backers = await asyncio.gather(
+        recent_donations(),
+        comment_threads(),
+        user_rating(),
+        _alist(_similar_projects_queryset(project)),
+        _alist(recommend.for_project(project)),
+        _alist(DonorTotal.top_for_project(project)),
+    )
+
+    return render(request, 'projects/project_detail.html', {
+        'project': project,
+        'donations': donations,
+        'comments': comments,
+        'user_rating': rating,
+        'similar_projects': similar_projects,
+        'also_supported': also_supported,
+        'top_backers': top_backers,
+        'donation_form': DonationForm(),
+    })
+
 @login_required
 def create_project(request):
     if request.method == 'POST':
@@ -128,7 +296,7 @@ def create_project(request):
 @login_required
 def edit_project(request, slug):
     project = get_object_or_404(Project, slug=slug, creator=request.user)
-    if project.donations.exists():
+    if project.archived_donation_count or project.donations.exists():
         messages.error(request, 'Cannot edit a project after donations have been made.')
         return redirect('project_detail', slug=project.slug)
     if request.method == 'POST':
@@ -161,23 +329,26 @@ def donate(request, slug):
     now = timezone.now()
     if project.is_cancelled or project.end_time <= now:
         messages.error(request, 'Donations are closed for this project.')
-    return redirect('project_detail', slug=project.slug)
+        return redirect('project_detail', slug=project.slug)
     if request.method == 'POST':
         form = DonationForm(request.POST)
         if form.is_valid():
             donation = form.save(commit=False)
             donation.project = project
             donation.user = request.user
-            donation.save()
+            run_write(donation.save)
             messages.success(request, 'Thank you for your donation!')
         else:
             for error in form.errors.values():
                 messages.error(request, error)
-    return redirect('project_detail', project_id=project.id)
+    return redirect('project_detail', slug=project.slug)
 
 @login_required
 def add_comment(request, slug):
     project = get_object_or_404(Project, slug=slug)
+    if project.archived_at:
+        messages.error(request, 'This campaign has been archived and no longer accepts comments.')
+        return redirect('project_detail', slug=project.slug)
     
     if request.method == 'POST':
         form = CommentForm(request.POST)
@@ -189,19 +360,35 @@ def add_comment(request, slug):
             parent_id = request.POST.get('parent_id')
             if parent_id:
                 try:
-                    parent_comment = Comment.objects.get(id=parent_id)
+                    parent_comment = Comment.objects.get(id=parent_id, project=project, parent=None)
                     comment.parent = parent_comment
-                except Comment.DoesNotExist:
+                except (Comment.DoesNotExist, ValueError):
                     pass
             
-            comment.save()
+            # The counters (projects.signals) commit together with the comment
+            run_write(transaction.atomic(comment.save))
             messages.success(request, 'Comment added successfully.')
     
     return redirect('project_detail', slug=project.slug)
 
+@read_from_replica
+def comment_replies(request, slug, comment_id):
+    """The replies after a thread's preview, for its "show more replies" link."""
+    project = get_object_or_404(Project, slug=slug)
+    replies = (Comment.objects.filter(project=project, parent_id=comment_id)
+               .select_related('user').order_by('created_at'))
+    if not replies.exists():
+        replies = archive.archived_replies(project, comment_id)
+    return render(request, 'projects/includes/comment_replies.html', {
+        'replies': replies[settings.COMMENT_REPLY_PREVIEW:],
+    })
+
 @login_required
 def rate_project(request, slug):
     project = get_object_or_404(Project, slug=slug)
+    if project.archived_at:
+        messages.error(request, 'This campaign has been archived and no longer accepts ratings.')
+        return redirect('project_detail', slug=project.slug)
     
     if request.method == 'POST':
         form = RatingForm(request.POST)
@@ -211,7 +398,8 @@ def rate_project(request, slug):
                 return redirect('project_detail', slug=project.slug)
             rating_value = form.cleaned_data['value']
             
-            rating, created = Rating.objects.update_or_create(
+            rating, created = run_write(
+                Rating.objects.update_or_create,
                 project=project,
                 user=request.user,
                 defaults={'value': rating_value}
@@ -235,7 +423,7 @@ def report_content(request, content_type, content_id):
             else:
                 report.comment = get_object_or_404(Comment, id=content_id)
             
-            report.save()
+            run_write(report.save)
             messages.success(request, 'Report submitted successfully. Thank you for helping us keep the platform safe.')
     
     if content_type == 'project':
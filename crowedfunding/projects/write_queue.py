@@ -0,0 +1,85 @@
+"""
+In-process write coordinator for SQLite deployments.
+
+SQLite allows a single writer at a time, so concurrent POSTs from several
+request threads contend for the database lock.  When ``SQLITE_WRITE_QUEUE``
+is enabled, ``run_write`` hands the ORM write to one dedicated writer thread
+instead.  The writer drains whatever is queued (up to ``max_batch`` jobs),
+runs each job in its own savepoint and commits the batch once (group commit),
+then releases the waiting callers.  Callers block until their batch is
+committed, so a redirect issued afterwards always sees the write.
+
+With the setting off (the default, and in tests) ``run_write`` simply calls
+the function inline.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import transaction, close_old_connections
+
+
+class WriteCoordinator:
+    def __init__(self, max_batch=64):
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        if threading.current_thread() is self._thread:
+            # Nested write issued from inside a queued job
+            return fn(*args, **kwargs)
+        self._ensure_started()
+        future = Future()
+        self._queue.put((fn, args, kwargs, future))
+        return future.result()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            outcomes = []
+            try:
+                with transaction.atomic():
+                    for fn, args, kwargs, future in batch:
+                        try:
+                            with transaction.atomic():
+                                outcomes.append((future, fn(*args, **kwargs), None))
+                        except Exception as exc:
+                            outcomes.append((future, None, exc))
+            except Exception as exc:
+                # The commit itself failed: nothing in the batch was written
+                outcomes = [(future, None, exc) for *_, future in batch]
+            finally:
+                close_old_connections()
+            for future, result, exc in outcomes:
+                if exc is not None:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(result)
+
+
+coordinator = WriteCoordinator()
+
+
+def run_write(fn, *args, **kwargs):
+    """Run an ORM write, through the single-writer queue when SQLITE_WRITE_QUEUE is on."""
+    if getattr(settings, 'SQLITE_WRITE_QUEUE', False):
+        return coordinator.submit(fn, *args, **kwargs)
+    return fn(*args, **kwargs)